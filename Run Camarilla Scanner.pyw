@@ -1,8 +1,12 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import threading
-import pandas as pd
 from scanner import CamarillaScanner
+from report import build_excel, condition_sheets
+from conditions import load_conditions
+from bhav_cache import DEFAULT_CACHE_DIR
+from history_store import HistoryStore
+from profiling import ScanProfile
 import os
 import re
 import traceback
@@ -21,6 +25,8 @@ class CamarillaApp:
         self.today_path = tk.StringVar()
         self.yest_path = tk.StringVar()
         self.status_var = tk.StringVar(value="Ready")
+        # Recording into the history store (~/.camarilla_history) is opt-in
+        self.keep_history = tk.BooleanVar(value=False)
 
         self.create_widgets()
 
@@ -40,9 +46,12 @@ class CamarillaApp:
         self.create_file_input(main_frame, "Today's Bhav Copy:", self.today_path, 0)
         self.create_file_input(main_frame, "Yesterday's Bhav Copy:", self.yest_path, 1)
 
+        tk.Checkbutton(main_frame, text="Keep daily history (~/.camarilla_history)", variable=self.keep_history,
+                       bg="#f0f0f0", font=("Arial", 9)).grid(row=2, column=0, columnspan=3, sticky="w")
+
         # Scan Button
         btn_frame = tk.Frame(main_frame, bg="#f0f0f0")
-        btn_frame.grid(row=2, column=0, columnspan=3, pady=30)
+        btn_frame.grid(row=3, column=0, columnspan=3, pady=30)
         
         self.scan_btn = tk.Button(btn_frame, text="SCAN & GENERATE REPORT", 
                                   command=self.start_scan,
@@ -87,287 +96,46 @@ class CamarillaApp:
         self.status_var.set("Processing... Please wait.")
         
         # Run in thread to not freeze GUI
-        threading.Thread(target=self.run_process, args=(today, yest)).start()
+        threading.Thread(target=self.run_process, args=(today, yest, self.keep_history.get())).start()
+
+    def run_process(self, today, yest, keep_history=False):
+        # Dynamic Output Filename
+        # Extract date from Today's filename (e.g., ...20260114...)
+        basename = os.path.basename(today)
+        # Look for 8 digit date pattern
+        match = re.search(r"(\d{8})", basename)
+        if match:
+            date_str = match.group(1)
+        else:
+            date_str = "Report"
+        
+        output_file = f"Camarilla Scanner {date_str}.xlsx"
 
-    def run_process(self, today, yest):
         try:
-            scanner = CamarillaScanner()
+            profile = ScanProfile(on_stage=self.show_stage)
+            history = HistoryStore() if keep_history else None
+            # Extra rules from ~/.camarilla_conditions.txt, if present
+            scanner = CamarillaScanner(cache_dir=DEFAULT_CACHE_DIR, profile=profile, history=history,
+                                       conditions=load_conditions())
             df = scanner.process_data(today, yest)
             
             if df is not None and not df.empty:
-                # Reorder columns
-                cols = list(df.columns)
-                priority = ['Symbol', 'Expiry', 'ATM_Strike', 'Option_Type', 'Spot_Close']
-                
-                final_cols = priority + [c for c in cols if c not in priority]
-                
-                df_final = df[final_cols]
-                
-                # Filter for Sheet 2
-                df_inside_full = df[df['Is_Inside_Camarilla'] == True].copy()
-                
-                # Split CE and PE
-                # User requested ONLY: Stock Name (Symbol), Close Price (Spot_Close), Strike Price (ATM_Strike)
-                cols_to_show = ['Symbol', 'Spot_Close', 'ATM_Strike']
-                
-                df_ce = df_inside_full[df_inside_full['Option_Type'] == 'CE'][cols_to_show].copy()
-                df_pe = df_inside_full[df_inside_full['Option_Type'] == 'PE'][cols_to_show].copy()
-                
-                # Reset index to allow side-by-side concatenation
-                df_ce.reset_index(drop=True, inplace=True)
-                df_pe.reset_index(drop=True, inplace=True)
-                
-                # Construct combined dataframe
-                df_combined = pd.concat([df_ce, df_pe], axis=1)
-                
-                # Dynamic Output Filename
-                # Extract date from Today's filename (e.g., ...20260114...)
-                basename = os.path.basename(today)
-                # Look for 8 digit date pattern
-                match = re.search(r"(\d{8})", basename)
-                if match:
-                    date_str = match.group(1)
-                else:
-                    date_str = "Report"
-                
-                output_file = f"Camarilla Scanner {date_str}.xlsx"
-                
-                with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                    # Sheet 1: Main Data
-                    df_final.to_excel(writer, sheet_name='Main Data', index=False)
-                    
-                    # Sheet 2: Inside Camarilla
-                    # Write data starting from row 1 (row 2 in Excel 1-based indexing) to leave room for Top Header
-                    sheet_name = 'Narrow Camarilla'
-                    df_combined.to_excel(writer, sheet_name=sheet_name, index=False, startrow=1)
-                    
-                    # Get workbook and worksheet objects to format
-                    workbook = writer.book
-                    worksheet = writer.sheets[sheet_name]
-                    
-                    # Add Top Level Headers (Merged)
-                    from openpyxl.styles import Alignment, Font, PatternFill
-                    
-                    # Header Styles
-                    header_font = Font(bold=True, color="FFFFFF")
-                    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-                    center = Alignment(horizontal='center', vertical='center')
-                    
-                    # Merge and Write CE Header
-                    worksheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=3)
-                    cell_ce = worksheet.cell(row=1, column=1)
-                    cell_ce.value = "Narrow Camarilla CE"
-                    cell_ce.font = header_font
-                    cell_ce.fill = header_fill
-                    cell_ce.alignment = center
-                    
-                    # Merge and Write PE Header
-                    worksheet.merge_cells(start_row=1, start_column=4, end_row=1, end_column=6)
-                    cell_pe = worksheet.cell(row=1, column=4)
-                    cell_pe.value = "Narrow Camarilla PE"
-                    cell_pe.font = header_font
-                    cell_pe.fill = header_fill
-                    cell_pe.alignment = center
-                    
-                    # formatting columns width
-                    for i, col in enumerate(df_combined.columns):
-                        col_idx = i + 1 
-                        # Use iloc to select by position because names might be duplicated
-                        series = df_combined.iloc[:, i]
-                        # Simple auto-fit estimation
-                        max_len = max((series.apply(str).map(len).max() if not series.empty else 0), len(str(col))) + 2
-                        column_letter = worksheet.cell(row=2, column=col_idx).column_letter
-                        column_letter = worksheet.cell(row=2, column=col_idx).column_letter
-                        worksheet.column_dimensions[column_letter].width = max_len
-
-                    # Sheet 3: Inside Camarilla (H4/L4 Logic)
-                    df_h4_l4_full = df[df['Is_Inside_H4_L4'] == True].copy()
-                    
-                    df_ce_h4 = df_h4_l4_full[df_h4_l4_full['Option_Type'] == 'CE'][cols_to_show].copy()
-                    df_pe_h4 = df_h4_l4_full[df_h4_l4_full['Option_Type'] == 'PE'][cols_to_show].copy()
-                    
-                    df_ce_h4.reset_index(drop=True, inplace=True)
-                    df_pe_h4.reset_index(drop=True, inplace=True)
-                    
-                    df_combined_h4 = pd.concat([df_ce_h4, df_pe_h4], axis=1)
-                    
-                    sheet_name_h4 = 'Inside Camarilla'
-                    df_combined_h4.to_excel(writer, sheet_name=sheet_name_h4, index=False, startrow=1)
-                    
-                    worksheet_h4 = writer.sheets[sheet_name_h4]
-                    
-                    # Headers for Sheet 3
-                    worksheet_h4.merge_cells(start_row=1, start_column=1, end_row=1, end_column=3)
-                    cell_ce_h4 = worksheet_h4.cell(row=1, column=1)
-                    cell_ce_h4.value = "Inside Camarilla CE"
-                    cell_ce_h4.font = header_font
-                    cell_ce_h4.fill = header_fill
-                    cell_ce_h4.alignment = center
-                    
-                    worksheet_h4.merge_cells(start_row=1, start_column=4, end_row=1, end_column=6)
-                    cell_pe_h4 = worksheet_h4.cell(row=1, column=4)
-                    cell_pe_h4.value = "Inside Camarilla PE"
-                    cell_pe_h4.font = header_font
-                    cell_pe_h4.fill = header_fill
-                    cell_pe_h4.alignment = center
-                    
-                    # Formatting columns for Sheet 3
-                    for i, col in enumerate(df_combined_h4.columns):
-                        col_idx = i + 1
-                        series = df_combined_h4.iloc[:, i]
-                        max_len = max((series.apply(str).map(len).max() if not series.empty else 0), len(str(col))) + 2
-                        column_letter = worksheet_h4.cell(row=2, column=col_idx).column_letter
-                        worksheet_h4.column_dimensions[column_letter].width = max_len
-
-                    # Sheet 4: Higher Value Camarilla (Is_Higher_Value)
-                    df_higher_full = df[df['Is_Higher_Value'] == True].copy()
-                    
-                    df_ce_higher = df_higher_full[df_higher_full['Option_Type'] == 'CE'][cols_to_show].copy()
-                    df_pe_higher = df_higher_full[df_higher_full['Option_Type'] == 'PE'][cols_to_show].copy()
-                    
-                    df_ce_higher.reset_index(drop=True, inplace=True)
-                    df_pe_higher.reset_index(drop=True, inplace=True)
-                    
-                    df_combined_higher = pd.concat([df_ce_higher, df_pe_higher], axis=1)
-                    
-                    sheet_name_higher = 'Higher Value Camarilla'
-                    df_combined_higher.to_excel(writer, sheet_name=sheet_name_higher, index=False, startrow=1)
-                    
-                    worksheet_higher = writer.sheets[sheet_name_higher]
-                    
-                    # Headers
-                    worksheet_higher.merge_cells(start_row=1, start_column=1, end_row=1, end_column=3)
-                    cell_ce_h = worksheet_higher.cell(row=1, column=1)
-                    cell_ce_h.value = "Higher Value Camarilla CE"
-                    cell_ce_h.font = header_font
-                    cell_ce_h.fill = header_fill
-                    cell_ce_h.alignment = center
-                    
-                    worksheet_higher.merge_cells(start_row=1, start_column=4, end_row=1, end_column=6)
-                    cell_pe_h = worksheet_higher.cell(row=1, column=4)
-                    cell_pe_h.value = "Higher Value Camarilla PE"
-                    cell_pe_h.font = header_font
-                    cell_pe_h.fill = header_fill
-                    cell_pe_h.alignment = center
-                    
-                    # Formatting
-                    for i, col in enumerate(df_combined_higher.columns):
-                        col_idx = i + 1
-                        series = df_combined_higher.iloc[:, i]
-                        max_len = max((series.apply(str).map(len).max() if not series.empty else 0), len(str(col))) + 2
-                        column_letter = worksheet_higher.cell(row=2, column=col_idx).column_letter
-                        worksheet_higher.column_dimensions[column_letter].width = max_len
-
-                    # Sheet 5: Lower Value Camarilla (Is_Lower_Value)
-                    df_lower_full = df[df['Is_Lower_Value'] == True].copy()
-                    
-                    df_ce_lower = df_lower_full[df_lower_full['Option_Type'] == 'CE'][cols_to_show].copy()
-                    df_pe_lower = df_lower_full[df_lower_full['Option_Type'] == 'PE'][cols_to_show].copy()
-                    
-                    df_ce_lower.reset_index(drop=True, inplace=True)
-                    df_pe_lower.reset_index(drop=True, inplace=True)
-                    
-                    df_combined_lower = pd.concat([df_ce_lower, df_pe_lower], axis=1)
-                    
-                    sheet_name_lower = 'Lower Value Camarilla'
-                    df_combined_lower.to_excel(writer, sheet_name=sheet_name_lower, index=False, startrow=1)
-                    
-                    worksheet_lower = writer.sheets[sheet_name_lower]
-                    
-                    # Headers
-                    worksheet_lower.merge_cells(start_row=1, start_column=1, end_row=1, end_column=3)
-                    cell_ce_l = worksheet_lower.cell(row=1, column=1)
-                    cell_ce_l.value = "Lower Value Camarilla CE"
-                    cell_ce_l.font = header_font
-                    cell_ce_l.fill = header_fill
-                    cell_ce_l.alignment = center
-                    
-                    worksheet_lower.merge_cells(start_row=1, start_column=4, end_row=1, end_column=6)
-                    cell_pe_l = worksheet_lower.cell(row=1, column=4)
-                    cell_pe_l.value = "Lower Value Camarilla PE"
-                    cell_pe_l.font = header_font
-                    cell_pe_l.fill = header_fill
-                    cell_pe_l.alignment = center
-                    
-                    # Formatting
-                    for i, col in enumerate(df_combined_lower.columns):
-                        col_idx = i + 1
-                        series = df_combined_lower.iloc[:, i]
-                        max_len = max((series.apply(str).map(len).max() if not series.empty else 0), len(str(col))) + 2
-                        column_letter = worksheet_lower.cell(row=2, column=col_idx).column_letter
-
-                    # Sheet 6: Top 5 Output
-                    # Metrics to process
-                    metrics = [
-                        ('OpnIntrst', 'Top 5 Open Interest'),
-                        ('ChngInOpnIntrst', 'Top 5 Change in OI'),
-                        ('TtlTradgVol', 'Top 5 Volume'),
-                        ('TtlNbOfTxsExctd', 'Top 5 Transactions')
-                    ]
-                    
-                    sheet_name_top5 = 'Top 5 Output'
-                    # Initialize sheet by writing a placeholder or just accessing it via openpyxl if we want custom positions
-                    # But pandas to_excel needs to write something to create the sheet or use the writer
-                    # We will write each table at specific offsets
-                    
-                    start_row = 1
-                    start_col = 0 # 0-based for pandas to_excel? No, pandas uses startrow/startcol.
-                    
-                    # Create sheet first
-                    workbook.create_sheet(sheet_name_top5)
-                    worksheet_top5 = workbook[sheet_name_top5]
-                    
-                    current_col = 0
-                    
-                    for metric, title in metrics:
-                        # Sort and take top 5
-                        # Ensure numeric
-                        df[metric] = pd.to_numeric(df[metric], errors='coerce').fillna(0)
-                        
-                        top5_df = df.sort_values(by=metric, ascending=False).head(5).copy()
-                        
-                        # Select columns
-                        cols_top5 = ['Symbol', 'Option_Type', 'ATM_Strike', 'Spot_Close', metric]
-                        top5_display = top5_df[cols_top5].copy()
-                        
-                        # Write to Excel
-                        # pandas to_excel startcol is 0-based.
-                        top5_display.to_excel(writer, sheet_name=sheet_name_top5, index=False, startrow=start_row, startcol=current_col)
-                        
-                        # Add Header
-                        # Create a merged header above the table
-                        # Pandas writes header at start_row. So we need the title at start_row - 1.
-                        # Wait, startrow=1 means row 2. So row 1 is free.
-                        
-                        # Merge cells for title
-                        # openpyxl uses 1-based indexing for rows/cols
-                        op_col_start = current_col + 1
-                        op_col_end = current_col + len(cols_top5)
-                        
-                        worksheet_top5.merge_cells(start_row=1, start_column=op_col_start, end_row=1, end_column=op_col_end)
-                        cell_title = worksheet_top5.cell(row=1, column=op_col_start)
-                        cell_title.value = title
-                        cell_title.font = header_font
-                        cell_title.fill = header_fill
-                        cell_title.alignment = center
-                        
-                        # Formatting columns
-                        for i, col in enumerate(top5_display.columns):
-                            col_idx = op_col_start + i
-                            series = top5_display.iloc[:, i]
-                            max_len = max((series.apply(str).map(len).max() if not series.empty else 0), len(str(col))) + 2
-                            column_letter = worksheet_top5.cell(row=2, column=col_idx).column_letter
-                            worksheet_top5.column_dimensions[column_letter].width = max_len
-
-                        # Move to next block (width + 1 column gap)
-                        current_col += len(cols_top5) + 1
+                with profile.stage('report writing') as stage:
+                    build_excel(df, output_file, top_n=5, sheets=condition_sheets(scanner.conditions))
+                    stage['rows'] = len(df)
+                print(profile.summary())
 
                 self.root.after(0, lambda: self.scan_success(output_file))
             else:
                 self.root.after(0, lambda: self.scan_fail("No results found."))
         
-        except PermissionError:
-            self.root.after(0, lambda: self.scan_fail(f"Permission Denied!\nPlease close '{output_file}' and try again."))
+        except PermissionError as e:
+            if e.filename and os.path.abspath(e.filename) != os.path.abspath(output_file):
+                # The cache or history folder rather than the report
+                message = f"Permission Denied!\nCannot write to '{e.filename}'."
+            else:
+                message = f"Permission Denied!\nPlease close '{output_file}' and try again."
+            self.root.after(0, lambda: self.scan_fail(message))
                 
         except Exception as e:
             err_msg = str(e)
@@ -376,6 +144,14 @@ class CamarillaApp:
             print(traceback_str)
             self.root.after(0, lambda: self.scan_fail(f"{err_msg}\n\n{traceback_str}"))
 
+    def show_stage(self, name, event, record):
+        # Called from the worker thread; hand the update to the Tk loop
+        if event == 'start':
+            text = f"{name.capitalize()}..."
+        else:
+            text = f"{name.capitalize()} done in {record['seconds']:.2f}s"
+        self.root.after(0, lambda: self.status_var.set(text))
+
     def scan_success(self, filename):
         self.status_var.set(f"Completed! Saved to {filename}")
         self.scan_btn.config(state=tk.NORMAL, text="SCAN & GENERATE REPORT")
@@ -0,0 +1,143 @@
+import argparse
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from scanner import CamarillaScanner
+from bhav_cache import DEFAULT_CACHE_DIR, read_frame, write_frame
+from batch import find_bhav_copies, iter_scans
+
+
+def plan_chunks(files, chunk_days=20):
+    """
+    Splits dated bhav copies into chunks of up to chunk_days scan days.
+
+    Each chunk starts with the file before its first scan day, so chunks
+    overlap by one file and can be scanned independently. Chunk names are
+    derived from their first and last scan dates, which keeps them stable
+    between runs over the same files (this is what makes resuming work).
+    """
+    chunks = []
+    for i in range(1, len(files), chunk_days):
+        part = files[i - 1:i + chunk_days]
+        name = f"chunk_{part[1][0]:%Y%m%d}_{part[-1][0]:%Y%m%d}"
+        chunks.append((name, part))
+    return chunks
+
+
+def _scan_chunk(name, files, output_dir, cache_dir):
+    """
+    Worker: scans one chunk and writes its rows to output_dir/<name>.npz.
+
+    Days that could not be scanned (iter_scans skips a day when its bhav
+    copy or the previous one fails to load) are returned as `failed`, and
+    the rows of such a chunk go to <name>.incomplete.npz instead, so a
+    resumed run scans the chunk again. Only the result path, row count and
+    failed days go back to the parent process; the rows themselves stay on
+    disk in columnar form.
+    """
+    scanner = CamarillaScanner(cache_dir=cache_dir)
+    frames = []
+    scanned = set()
+    for day, prev_day, df in iter_scans(files, scanner):
+        scanned.add(day)
+        if df is None or df.empty:
+            continue
+        df.insert(0, 'Prev_Date', pd.Timestamp(prev_day))
+        df.insert(0, 'Date', pd.Timestamp(day))
+        frames.append(df)
+    result = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    failed = [day for day, _ in files[1:] if day not in scanned]
+
+    # Write atomically so an interrupted run never leaves a half chunk behind
+    done, incomplete = (os.path.join(output_dir, name + suffix) for suffix in ('.npz', '.incomplete.npz'))
+    path = incomplete if failed else done
+    fd, tmp = tempfile.mkstemp(dir=output_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write_frame(result, f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    if not failed and os.path.exists(incomplete):
+        os.remove(incomplete)
+    return name, path, len(result), failed
+
+
+def run_backtest(directory, output_dir, start=None, end=None, workers=None,
+                 chunk_days=20, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Scans every consecutive trading-day pair in directory on a process pool.
+
+    Day pairs are grouped into chunks (see plan_chunks) and spread over
+    `workers` processes (default: all cores). Every finished chunk is saved
+    under output_dir, and chunks already there are skipped, so an
+    interrupted run picks up where it stopped. Chunks with days whose bhav
+    copy failed to load are not counted as done and are scanned again on
+    the next run; their other days are still in this run's result.
+    Returns the combined result in date order regardless of which worker
+    finished first.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    files = find_bhav_copies(directory, start, end)
+    chunks = plan_chunks(files, chunk_days)
+    if not chunks:
+        print(f"Need at least two bhav copies in {directory}, found {len(files)}.")
+        return pd.DataFrame()
+
+    paths = {name: os.path.join(output_dir, name + '.npz') for name, _ in chunks}
+    todo = [(name, part) for name, part in chunks if not os.path.exists(paths[name])]
+    print(f"{len(chunks)} chunks, {len(chunks) - len(todo)} already done, {len(todo)} to scan.")
+
+    incomplete = []
+    if todo:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            futures = [pool.submit(_scan_chunk, name, part, output_dir, cache_dir) for name, part in todo]
+            for done, future in enumerate(as_completed(futures), 1):
+                name, path, rows, failed = future.result()
+                paths[name] = path
+                if failed:
+                    incomplete.append(name)
+                    days = ', '.join(f"{day:%Y%m%d}" for day in failed)
+                    print(f"[{done}/{len(todo)}] {name}: {rows} rows, could not scan {days}")
+                else:
+                    print(f"[{done}/{len(todo)}] {name}: {rows} rows")
+    if incomplete:
+        print(f"{len(incomplete)} chunk(s) had days that could not be scanned; run again to retry them.")
+
+    frames = [read_frame(paths[name]) for name, _ in chunks]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Camarilla scan over historical bhav copies in parallel.")
+    parser.add_argument("directory", help="folder containing BhavCopy*.zip files")
+    parser.add_argument("output_dir", help="folder for per-chunk results (reused to resume)")
+    parser.add_argument("--start", help="first trading day to scan (YYYYMMDD)")
+    parser.add_argument("--end", help="last trading day to scan (YYYYMMDD)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-days", type=int, default=20, help="scan days per worker task")
+    parser.add_argument("--output", help="write the combined result to this CSV")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the parsed bhav copy cache")
+    args = parser.parse_args(argv)
+
+    df = run_backtest(args.directory, args.output_dir, args.start, args.end, args.workers,
+                      args.chunk_days, None if args.no_cache else DEFAULT_CACHE_DIR)
+    if df.empty:
+        return 1
+    if args.output:
+        df.to_csv(args.output, index=False)
+        print(f"Saved {len(df)} rows to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,117 @@
+import argparse
+import datetime
+import glob
+import os
+
+import pandas as pd
+
+from scanner import CamarillaScanner
+from bhav_cache import DEFAULT_CACHE_DIR
+from history_store import trading_date
+
+
+def _as_date(value):
+    if value is None or isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(str(value).replace('-', ''), "%Y%m%d").date()
+
+
+def find_bhav_copies(directory, start=None, end=None, pattern="BhavCopy*.zip"):
+    """
+    Lists the bhav copies in directory as (date, path) pairs sorted by date.
+
+    start/end (date or 'YYYYMMDD') limit the days to scan. The last file
+    before start is kept as well, so the first day in range has a
+    "yesterday" to compare against.
+    """
+    files = []
+    for path in glob.glob(os.path.join(directory, pattern)):
+        day = trading_date(path)
+        if day is None:
+            print(f"Skipping {path}: no date in file name")
+            continue
+        files.append((day, path))
+    files.sort()
+
+    start, end = _as_date(start), _as_date(end)
+    if end is not None:
+        files = [f for f in files if f[0] <= end]
+    if start is not None:
+        before = [f for f in files if f[0] < start]
+        files = before[-1:] + [f for f in files if f[0] >= start]
+    return files
+
+
+def iter_scans(files, scanner=None, engine='vectorized'):
+    """
+    Scans every consecutive pair of (date, path) entries.
+
+    Yields (date, prev_date, result) per trading day. Each file is loaded
+    once: the frame loaded as "today" is kept and reused as "yesterday"
+    for the next day. A file that fails to load breaks the chain for the
+    days on either side of it.
+    """
+    scanner = scanner or CamarillaScanner()
+    prev_day, prev_df = None, None
+    for day, path in files:
+        print(f"Loading {day}: {path}")
+        df = scanner.load_bhav_copy(path, scanner.SCAN_COLUMNS, scanner.SCAN_INSTRUMENTS)
+        if df is not None and prev_df is not None:
+            yield day, prev_day, scanner.scan_frames(df, prev_df, engine=engine)
+        prev_day, prev_df = day, df
+
+
+def scan_directory(directory, start=None, end=None, output_dir=None, scanner=None):
+    """
+    Back-fills scans for every consecutive trading-day pair in directory.
+
+    Returns one long DataFrame with Date and Prev_Date columns in front of
+    the usual scan columns. With output_dir set, each day's result is also
+    written there as 'Camarilla Scanner YYYYMMDD.csv'.
+    """
+    files = find_bhav_copies(directory, start, end)
+    if len(files) < 2:
+        print(f"Need at least two bhav copies in {directory}, found {len(files)}.")
+        return pd.DataFrame()
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    frames = []
+    for day, prev_day, df in iter_scans(files, scanner):
+        if df is None or df.empty:
+            print(f"No results for {day}")
+            continue
+        df.insert(0, 'Prev_Date', prev_day)
+        df.insert(0, 'Date', day)
+        if output_dir:
+            df.to_csv(os.path.join(output_dir, f"Camarilla Scanner {day:%Y%m%d}.csv"), index=False)
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan every consecutive pair of bhav copies in a directory.")
+    parser.add_argument("directory", help="folder containing BhavCopy*.zip files")
+    parser.add_argument("--start", help="first trading day to scan (YYYYMMDD)")
+    parser.add_argument("--end", help="last trading day to scan (YYYYMMDD)")
+    parser.add_argument("--output", default="Camarilla Scanner Batch.csv",
+                        help="combined long table (CSV)")
+    parser.add_argument("--per-day-dir", help="also write one CSV per day into this folder")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the parsed bhav copy cache")
+    args = parser.parse_args(argv)
+
+    scanner = CamarillaScanner(cache_dir=None if args.no_cache else DEFAULT_CACHE_DIR)
+    df = scan_directory(args.directory, args.start, args.end, args.per_day_dir, scanner)
+    if df.empty:
+        return 1
+    df.to_csv(args.output, index=False)
+    print(f"Saved {len(df)} rows for {df['Date'].nunique()} days to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
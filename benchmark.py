@@ -0,0 +1,210 @@
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import synthetic
+from scanner import CamarillaScanner
+from profiling import ScanProfile
+from report import build_excel
+
+DEFAULT_SCALES = (1, 10, 100)
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "camarilla_bench")
+
+# A timing counts as a regression when it is this much slower than the
+# baseline; timings below MIN_SECONDS are too noisy to judge
+DEFAULT_THRESHOLD = 0.25
+MIN_SECONDS = 0.05
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "camarilla.py")
+# Modules a JSON-only CLI run should not import
+HEAVY_MODULES = ('openpyxl', 'tkinter', 'streamlit')
+
+
+def bench_files(scale, data_dir=DEFAULT_DATA_DIR, seed=0):
+    """
+    Returns (today, yesterday) synthetic bhav copies at `scale` times the
+    market size, generating them on first use. The generator is
+    deterministic, so files left from an earlier run are reused.
+    """
+    directory = os.path.join(data_dir, f"scale_{scale:g}_seed_{seed}")
+    days = synthetic.trading_days('2026-01-12', 2)
+    paths = [os.path.join(directory, synthetic.bhav_filename(d)) for d in days]
+    if not all(os.path.exists(p) for p in paths):
+        symbols = max(1, int(round(synthetic.MARKET_SYMBOLS * scale)))
+        print(f"Generating {scale:g}x market ({symbols} symbols) in {directory}...")
+        paths = synthetic.generate_days(directory, 2, days[0], symbols=symbols, seed=seed)
+    return paths[1], paths[0]
+
+
+def _best_of(repeat, func):
+    """Runs func repeat times; returns (fastest seconds, last result)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 6), result
+
+
+def bench_scale(scale, repeat=3, data_dir=DEFAULT_DATA_DIR, seed=0):
+    """Times loading, scanning and the Excel report at one market scale."""
+    today, yest = bench_files(scale, data_dir, seed)
+    scanner = CamarillaScanner()
+
+    load_s, df_today = _best_of(repeat, lambda: scanner.load_bhav_copy(
+        today, scanner.SCAN_COLUMNS, scanner.SCAN_INSTRUMENTS))
+    scan_s, result = _best_of(repeat, lambda: scanner.process_data(today, yest))
+    report_s, _ = _best_of(repeat, lambda: build_excel(result, io.BytesIO(), top_n=5))
+
+    # One extra instrumented run for the per-stage breakdown
+    profile = ScanProfile()
+    with profile:
+        CamarillaScanner(profile=profile).process_data(today, yest)
+
+    return {
+        'scale': scale,
+        'bhav_rows': len(df_today),
+        'result_rows': len(result),
+        'csv_engine': scanner.csv_engine,
+        'timings': {
+            'load_bhav_copy': load_s,
+            'process_data': scan_s,
+            'report_xlsx': report_s,
+        },
+        'stages': profile.stages,
+    }
+
+
+def _run_cli(*args):
+    subprocess.run([sys.executable, CLI, *args], check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def bench_startup(repeat=3, data_dir=DEFAULT_DATA_DIR, seed=0):
+    """
+    Times the command line entry point in a fresh interpreter each run:
+    'cli_help' (argument parsing only, no pandas) and 'cli_scan_json' (a
+    1x scan written as JSON). Also lists the HEAVY_MODULES the JSON run
+    imported, which should be none.
+    """
+    today, yest = bench_files(1, data_dir, seed)
+    output = os.path.join(data_dir, "startup.json")
+    scan = ["scan", today, yest, "--format", "json", "-o", output, "-q"]
+    help_s, _ = _best_of(repeat, lambda: _run_cli("--help"))
+    scan_s, _ = _best_of(repeat, lambda: _run_cli(*scan))
+
+    probe = (f"import sys; sys.path.insert(0, {os.path.dirname(CLI)!r}); import camarilla; "
+             f"camarilla.main({scan!r}); "
+             f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    loaded = subprocess.run([sys.executable, "-c", probe], check=True,
+                            capture_output=True, text=True).stdout.strip()
+    return {
+        'timings': {'cli_help': help_s, 'cli_scan_json': scan_s},
+        'heavy_imports': [m for m in loaded.split(',') if m],
+    }
+
+
+def run_benchmark(scales=DEFAULT_SCALES, repeat=3, data_dir=DEFAULT_DATA_DIR, seed=0):
+    """Benchmarks every scale and returns the results as a JSON-ready dict."""
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': f"{platform.system()} {platform.machine()}, {os.cpu_count()} cpus",
+        'repeat': repeat,
+        'results': [bench_scale(s, repeat, data_dir, seed) for s in scales],
+        'startup': bench_startup(repeat, data_dir, seed),
+    }
+
+
+def find_regressions(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares two run_benchmark results and returns the timings that got
+    more than `threshold` slower (as a fraction) at the same scale, as a
+    list of dicts (scale, metric, baseline, current, ratio). CLI startup
+    timings are compared under scale 'startup'.
+    """
+    base = {r['scale']: r['timings'] for r in baseline.get('results', [])}
+    entries = list(current['results'])
+    if 'startup' in current:
+        base['startup'] = baseline.get('startup', {}).get('timings', {})
+        entries.append({'scale': 'startup', 'timings': current['startup']['timings']})
+    regressions = []
+    for r in entries:
+        for metric, seconds in r['timings'].items():
+            before = base.get(r['scale'], {}).get(metric)
+            if before is None or max(before, seconds) < MIN_SECONDS:
+                continue
+            ratio = seconds / before if before else float('inf')
+            if ratio > 1 + threshold:
+                regressions.append({'scale': r['scale'], 'metric': metric,
+                                    'baseline': before, 'current': seconds,
+                                    'ratio': round(ratio, 3)})
+    return regressions
+
+
+def format_results(results):
+    lines = [f"{'scale':>6}{'bhav rows':>12}{'load':>10}{'scan':>10}{'report':>10}"]
+    for r in results['results']:
+        t = r['timings']
+        lines.append(f"{r['scale']:>5g}x{r['bhav_rows']:>12}{t['load_bhav_copy']:>10.3f}"
+                     f"{t['process_data']:>10.3f}{t['report_xlsx']:>10.3f}")
+    startup = results.get('startup')
+    if startup:
+        t = startup['timings']
+        lines.append(f"CLI startup: --help {t['cli_help']:.3f}s, 1x JSON scan {t['cli_scan_json']:.3f}s, "
+                     f"heavy imports: {', '.join(startup['heavy_imports']) or 'none'}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Camarilla scanner on synthetic bhav copies.")
+    parser.add_argument("--scales", default=",".join(str(s) for s in DEFAULT_SCALES),
+                        help="comma-separated market size multipliers (default: 1,10,100)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing; the fastest is kept")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="where synthetic files are kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="earlier --output file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown fraction that counts as a regression (default: 0.25)")
+    args = parser.parse_args(argv)
+
+    scales = [float(s) for s in args.scales.split(",") if s.strip()]
+    results = run_benchmark(scales, args.repeat, args.data_dir, args.seed)
+    print(format_results(results))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f"Saved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        for r in regressions:
+            scale = r['scale'] if r['scale'] == 'startup' else f"{r['scale']:g}x"
+            print(f"REGRESSION {scale} {r['metric']}: "
+                  f"{r['baseline']:.3f}s -> {r['current']:.3f}s ({r['ratio']:.2f}x)", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,289 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".camarilla_cache")
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+
+def content_hash(src, chunk_size=1 << 20):
+    """
+    Returns the SHA-256 hex digest of a file path or a seekable file-like
+    object (e.g. a Streamlit UploadedFile). File objects are rewound.
+    """
+    h = hashlib.sha256()
+    if isinstance(src, (str, os.PathLike)):
+        with open(src, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                h.update(chunk)
+    else:
+        src.seek(0)
+        for chunk in iter(lambda: src.read(chunk_size), b''):
+            h.update(chunk)
+        src.seek(0)
+    return h.hexdigest()
+
+
+def write_frame(df, f, meta=None):
+    """
+    Writes a DataFrame to an uncompressed NPZ archive, one array per column.
+    Categorical and object columns are stored as integer codes plus a
+    values array so they load without unpickling row by row. meta is an
+    optional dict of strings stored alongside (see read_meta).
+    """
+    arrays = {}
+    kinds = []
+    for i, col in enumerate(df.columns):
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            arrays[f'c{i}_codes'] = s.cat.codes.to_numpy()
+            arrays[f'c{i}_values'] = _values_array(s.cat.categories.to_numpy())
+            arrays[f'c{i}_ordered'] = np.array(s.cat.ordered)
+            kinds.append('cat')
+        elif s.dtype == object:
+            codes, uniques = pd.factorize(s, use_na_sentinel=True)
+            arrays[f'c{i}_codes'] = codes
+            arrays[f'c{i}_values'] = _values_array(np.asarray(uniques, dtype=object))
+            kinds.append('obj')
+        else:
+            arrays[f'c{i}'] = s.to_numpy()
+            kinds.append('raw')
+    arrays['__columns__'] = np.array([str(c) for c in df.columns], dtype=str)
+    arrays['__kinds__'] = np.array(kinds, dtype=str)
+    if meta:
+        arrays['__meta_keys__'] = np.array(list(meta), dtype=str)
+        arrays['__meta_values__'] = np.array([str(v) for v in meta.values()], dtype=str)
+    np.savez(f, **arrays)
+
+
+def read_meta(f):
+    """The meta dict stored by write_frame ({} if none); no column is read."""
+    with np.load(f) as z:
+        if '__meta_keys__' not in z.files:
+            return {}
+        return dict(zip(z['__meta_keys__'].tolist(), z['__meta_values__'].tolist()))
+
+
+def read_frame(f, columns=None, rows=None):
+    """
+    Reads a DataFrame written by write_frame. columns optionally limits
+    the result to those columns (in that order); only their arrays are
+    read from the archive. rows is an optional slice of row positions;
+    only those rows of each column are read (see _read_rows).
+    """
+    with np.load(f, allow_pickle=True) as z:
+        stored = list(z['__columns__'])
+        kinds = dict(zip(stored, z['__kinds__']))
+        columns = stored if columns is None else [c for c in columns if c in kinds]
+
+        def column(key):
+            return z[key] if rows is None else _read_rows(z, key, rows)
+
+        data = {}
+        for col in columns:
+            i, kind = stored.index(col), kinds[col]
+            if kind == 'cat':
+                data[col] = pd.Categorical.from_codes(
+                    column(f'c{i}_codes'), z[f'c{i}_values'], ordered=bool(z[f'c{i}_ordered'])
+                )
+            elif kind == 'obj':
+                codes = column(f'c{i}_codes')
+                values = z[f'c{i}_values'].astype(object)
+                col_data = np.empty(len(codes), dtype=object)
+                col_data[:] = np.nan
+                valid = codes >= 0
+                col_data[valid] = values[codes[valid]]
+                data[col] = col_data
+            else:
+                data[col] = column(f'c{i}')
+    return pd.DataFrame(data, columns=columns)
+
+
+def _read_rows(z, key, rows):
+    """
+    rows (a slice) of the 1-d array key of an open NPZ file. The members
+    are stored uncompressed, so this seeks past the rows before the slice
+    and reads only the bytes of the slice.
+    """
+    with z.zip.open(f'{key}.npy') as member:
+        version = np.lib.format.read_magic(member)
+        if version == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(member)
+        else:
+            shape, _, dtype = np.lib.format.read_array_header_2_0(member)
+        start, stop, step = rows.indices(shape[0])
+        if dtype.hasobject or step != 1:
+            return z[key][rows]
+        member.seek(start * dtype.itemsize, io.SEEK_CUR)
+        count = max(stop - start, 0)
+        return np.frombuffer(member.read(count * dtype.itemsize), dtype=dtype, count=count).copy()
+
+
+def _values_array(values):
+    """Stores all-string value arrays as fixed-width unicode (no pickling)."""
+    if all(isinstance(v, str) for v in values):
+        return np.array(values, dtype=str)
+    return np.asarray(values, dtype=object)
+
+
+class BhavCache:
+    """
+    On-disk cache of normalized bhav copy frames.
+
+    Entries are keyed by the SHA-256 of the ZIP contents (plus a loader
+    version tag), so an edited or re-downloaded file simply misses and is
+    rebuilt. Each entry is one NPZ file; the directory is kept under
+    max_bytes by evicting the least recently used entries (hits refresh
+    the file's modification time).
+    """
+
+    SUFFIX = '.npz'
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key_for(self, src, version=''):
+        return f"{content_hash(src)}{'-' + version if version else ''}"
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key + self.SUFFIX)
+
+    def get(self, key):
+        """Returns the cached frame for key, or None on a miss."""
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            df = read_frame(path)
+        except Exception as e:
+            print(f"Discarding unreadable cache entry {path}: {e}")
+            self._remove(path)
+            return None
+        os.utime(path)
+        return df
+
+    def put(self, key, df):
+        """Stores df under key and evicts old entries beyond max_bytes."""
+        path = self.path_for(key)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write_frame(df, f)
+            os.replace(tmp, path)
+        except BaseException:
+            self._remove(tmp)
+            raise
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """Removes least recently used entries until the cache fits max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(self.SUFFIX):
+                self._remove(os.path.join(self.cache_dir, name))
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def frame_nbytes(obj):
+    """Approximate memory held by a DataFrame/Series (deep), or by bytes."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    return 0
+
+
+class FrameLRU:
+    """
+    Thread-safe in-memory LRU cache for frames (and other values) with a
+    memory budget. Sizes are measured once on put with frame_nbytes;
+    least recently used entries are dropped once the total exceeds
+    max_bytes. Cached frames are shared between callers, so treat them
+    as read-only.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = frame_nbytes(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= old[1]
+            self._entries[key] = (value, size)
+            self._total += size
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self._total -= dropped
+        return value
+
+    def get_or_create(self, key, create):
+        """Returns the cached value for key, calling create() on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = create()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    @property
+    def nbytes(self):
+        return self._total
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total = 0
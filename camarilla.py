@@ -0,0 +1,172 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+# Exit codes
+EXIT_OK = 0
+EXIT_NO_RESULTS = 1
+EXIT_USAGE = 2
+EXIT_INPUT = 3
+EXIT_ERROR = 4
+
+# Mirrors report.FORMATS; listed here so parsing the command line (and
+# --help) does not import pandas
+FORMAT_CHOICES = ('xlsx', 'csv', 'json', 'parquet')
+# Mirrors CamarillaScanner.CSV_ENGINES
+CSV_ENGINE_CHOICES = ('pandas', 'arrow', 'auto')
+
+_T0 = time.perf_counter()
+
+
+def _seconds_since_start():
+    return round(time.perf_counter() - _T0, 6)
+
+
+def _output_path(today, fmt, output):
+    """The report path: output as given, or 'Camarilla Scanner YYYYMMDD.<ext>' for today's date."""
+    if output:
+        return output
+    from history_store import trading_date
+    from report import FORMATS
+
+    day = trading_date(today)
+    stamp = f"{day:%Y%m%d}" if day else os.path.splitext(os.path.basename(today))[0]
+    return os.path.join('.', f"Camarilla Scanner {stamp}.{FORMATS[fmt][1]}")
+
+
+def scan(args):
+    """The `scan` command: scans TODAY against YEST and writes one report."""
+    for path in (args.today, args.yesterday):
+        if not os.path.isfile(path):
+            print(f"camarilla: no such file: {path}", file=sys.stderr)
+            return EXIT_INPUT
+
+    to_stdout = args.output == '-'
+    # Scanner progress goes to stderr when the report itself goes to stdout
+    if args.quiet:
+        log = contextlib.redirect_stdout(io.StringIO())
+    elif to_stdout:
+        log = contextlib.redirect_stdout(sys.stderr)
+    else:
+        log = contextlib.nullcontext()
+    with log:
+        # Imported here so --help and usage errors stay fast
+        from scanner import CamarillaScanner, arrow_available
+        from bhav_cache import DEFAULT_CACHE_DIR
+        from conditions import load_conditions
+        from profiling import ScanProfile
+        from report import available_formats, build_report, condition_sheets
+
+        if args.format not in available_formats():
+            print(f"camarilla: format '{args.format}' is not available "
+                  f"(needs an optional package)", file=sys.stderr)
+            return EXIT_USAGE
+        if args.csv_engine == 'arrow' and not arrow_available():
+            print("camarilla: --csv-engine arrow needs pyarrow", file=sys.stderr)
+            return EXIT_USAGE
+
+        conditions = []
+        if args.conditions:
+            if not os.path.isfile(args.conditions):
+                print(f"camarilla: no such file: {args.conditions}", file=sys.stderr)
+                return EXIT_INPUT
+            try:
+                conditions = load_conditions(args.conditions)
+            except ValueError as e:
+                print(f"camarilla: {args.conditions}: {e}", file=sys.stderr)
+                return EXIT_USAGE
+
+        import_seconds = _seconds_since_start()
+        profile = ScanProfile()
+        try:
+            scanner = CamarillaScanner(cache_dir=None if args.no_cache else DEFAULT_CACHE_DIR, profile=profile,
+                                       conditions=conditions, csv_engine=args.csv_engine)
+        except ValueError as e:
+            # Condition names clashing with the built-ins or scan columns
+            print(f"camarilla: {args.conditions}: {e}", file=sys.stderr)
+            return EXIT_USAGE
+        with profile:
+            if args.chain:
+                result = scanner.process_chain(args.today, args.yesterday, args.strikes, args.expiries)
+            else:
+                result = scanner.process_data(args.today, args.yesterday, engine=args.engine)
+            if result is None:
+                print("camarilla: could not load the bhav copies", file=sys.stderr)
+                return EXIT_INPUT
+            if result.empty:
+                print("camarilla: the scan found no contracts", file=sys.stderr)
+                return EXIT_NO_RESULTS
+            with profile.stage('report writing'):
+                data = build_report(result, args.format, top_n=args.top_n,
+                                    sheets=condition_sheets(scanner.conditions))
+
+    if to_stdout:
+        sys.stdout.buffer.write(data)
+        sys.stdout.flush()
+        path = '<stdout>'
+    else:
+        path = _output_path(args.today, args.format, args.output)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    if args.profile:
+        print(profile.summary(), file=sys.stderr)
+        print(f"startup (imports) {import_seconds:.3f}s", file=sys.stderr)
+    if not args.quiet:
+        print(f"{len(result)} rows -> {path} in {_seconds_since_start():.2f}s", file=sys.stderr)
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="camarilla", description="Camarilla scanner for NSE F&O bhav copies.")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    p = commands.add_parser("scan", help="scan today's bhav copy against yesterday's and write a report")
+    p.add_argument("today", help="today's bhav copy (ZIP)")
+    p.add_argument("yesterday", help="the previous trading day's bhav copy (ZIP)")
+    p.add_argument("--format", choices=FORMAT_CHOICES, default='xlsx', help="report format (default: xlsx)")
+    p.add_argument("--top-n", type=int, default=5, help="rows per Top N block (default: 5)")
+    p.add_argument("-o", "--output",
+                   help="report file, or '-' for stdout (default: 'Camarilla Scanner YYYYMMDD.<ext>')")
+    p.add_argument("--engine", choices=('vectorized', 'loop'), default='vectorized', help=argparse.SUPPRESS)
+    p.add_argument("--chain", action="store_true", help="scan a strike band over several expiries")
+    p.add_argument("--strikes", type=int, default=2, help="strikes either side of ATM in chain mode")
+    p.add_argument("--expiries", type=int, default=3, help="expiries per symbol in chain mode")
+    p.add_argument("--conditions", metavar="FILE",
+                   help="extra scan conditions, one 'Name: expression' per line (see conditions.py)")
+    p.add_argument("--csv-engine", choices=CSV_ENGINE_CHOICES, default='pandas',
+                   help="bhav copy CSV parser: arrow is faster but needs about twice the memory "
+                        "(default: pandas)")
+    p.add_argument("--no-cache", action="store_true", help="do not use the parsed bhav copy cache")
+    p.add_argument("--profile", action="store_true", help="print stage timings to stderr")
+    p.add_argument("-q", "--quiet", action="store_true", help="only print errors")
+    p.set_defaults(func=scan)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit as e:
+        return EXIT_OK if e.code in (0, None) else EXIT_USAGE
+    if args.command is None:
+        parser.print_help(sys.stderr)
+        return EXIT_USAGE
+    if args.top_n < 1:
+        print("camarilla: --top-n must be at least 1", file=sys.stderr)
+        return EXIT_USAGE
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return EXIT_ERROR
+    except Exception as e:
+        print(f"camarilla: {type(e).__name__}: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
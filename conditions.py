@@ -0,0 +1,291 @@
+import ast
+import functools
+import math
+import operator
+import os
+import re
+
+import numpy as np
+
+# Optional rules file picked up by the desktop app (see load_conditions)
+DEFAULT_CONDITIONS_FILE = os.path.join(os.path.expanduser("~"), ".camarilla_conditions.txt")
+
+_COMPARE = {
+    ast.Lt: np.less, ast.LtE: np.less_equal,
+    ast.Gt: np.greater, ast.GtE: np.greater_equal,
+    ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_ARITHMETIC = {
+    ast.Add: np.add, ast.Sub: np.subtract,
+    ast.Mult: np.multiply, ast.Div: np.true_divide,
+}
+_FUNCTIONS = {'abs': np.abs, 'min': np.minimum, 'max': np.maximum}
+
+# Characters Excel does not allow in a sheet title (labels become titles)
+_LABEL_FORBIDDEN = ':\\/?*[]'
+
+# Titles of the report's own sheets ({n} is the Top N size). Excel cuts
+# titles to SHEET_TITLE_LENGTH characters and compares them ignoring case,
+# so a label cannot match one of these, or another label, after the cut
+MAIN_SHEET = 'Main Data'
+TOP_SHEET = 'Top {n} Output'
+SHEET_TITLE_LENGTH = 31
+
+
+def sheet_title_key(title):
+    """What Excel compares when it checks sheet titles for duplicates."""
+    return title[:SHEET_TITLE_LENGTH].casefold()
+
+
+_BUILTIN_SHEET = re.compile('|'.join(
+    re.escape(sheet_title_key(t)).replace(re.escape('{n}'), r'\d+') for t in (MAIN_SHEET, TOP_SHEET)))
+
+
+def _divide(a, b):
+    """a / b with NumPy's results for a zero divisor (inf, -inf or nan)."""
+    try:
+        return a / b
+    except ZeroDivisionError:
+        if a == 0 or a != a:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+
+# The same operations on single floats, for evaluating one row at a time
+# (Condition.evaluate_row); min and max return nan if either side is nan
+_SCALAR = {
+    np.less: operator.lt, np.less_equal: operator.le,
+    np.greater: operator.gt, np.greater_equal: operator.ge,
+    np.equal: operator.eq, np.not_equal: operator.ne,
+    np.add: operator.add, np.subtract: operator.sub,
+    np.multiply: operator.mul, np.true_divide: _divide,
+    np.abs: abs,
+    np.minimum: lambda a, b: a if a != a or a < b else b,
+    np.maximum: lambda a, b: a if a != a or a > b else b,
+    np.logical_and: lambda a, b: bool(a) and bool(b),
+    np.logical_or: lambda a, b: bool(a) or bool(b),
+    np.logical_not: operator.not_,
+    np.negative: operator.neg,
+}
+
+
+class Condition:
+    """
+    A named scan condition over the level, OHLC and OI columns of a scan,
+    written as a boolean expression, e.g.
+
+        Condition('Is_Inside_Camarilla', 'Today_H4 < Yest_H3 and Today_L4 > Yest_L3',
+                  label='Narrow Camarilla')
+
+    The expression is parsed once and compiled to NumPy operations, so
+    evaluating it is one vectorized pass over all rows; evaluate_row runs
+    the same expression on the floats of a single row. Allowed: column
+    names, numbers, + - * /, comparisons (chained too), and/or/not and
+    abs(), min(), max() (element-wise). Anything else raises ValueError.
+
+    `name` becomes the boolean result column and `label` the title of its
+    report sheet (name with spaces for underscores when not given).
+    """
+
+    def __init__(self, name, expression, label=None):
+        if not name.isidentifier():
+            raise ValueError(f"Condition name must be an identifier: {name!r}")
+        self.name = name
+        self.expression = expression
+        self.label = label or name.replace('_', ' ')
+        bad = sorted(set(self.label) & set(_LABEL_FORBIDDEN))
+        if bad:
+            raise ValueError(f"{name}: sheet label {self.label!r} cannot contain {' '.join(bad)}")
+        if _BUILTIN_SHEET.fullmatch(sheet_title_key(self.label)):
+            raise ValueError(f"{name}: sheet label {self.label!r} is taken by the report")
+        self.columns = set()
+        try:
+            tree = ast.parse(expression, mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"{name}: invalid expression {expression!r}: {e.msg}") from None
+        self._evaluate = self._compile(tree.body)
+        self._evaluate_row = self._compile(tree.body, _SCALAR)
+
+    def __repr__(self):
+        return f"Condition({self.name!r}, {self.expression!r})"
+
+    @property
+    def uses_yesterday(self):
+        return any(c.startswith('Yest_') for c in self.columns)
+
+    def evaluate(self, columns, rows):
+        """
+        Boolean array of length rows. columns maps column names to arrays
+        (or is a frame); comparisons with NaN are False.
+        """
+        missing = self.columns.difference(columns.keys())
+        if missing:
+            raise ValueError(f"{self.name}: unknown column(s) {', '.join(sorted(missing))}")
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = np.asarray(self._evaluate(columns), dtype=bool)
+        return np.broadcast_to(result, (rows,)).copy()
+
+    def evaluate_row(self, values):
+        """
+        The condition for one row, as a bool. values maps column names to
+        floats; the result is the same as evaluate() on that row.
+        """
+        try:
+            return bool(self._evaluate_row(values))
+        except KeyError:
+            missing = self.columns.difference(values.keys())
+            raise ValueError(f"{self.name}: unknown column(s) {', '.join(sorted(missing))}") from None
+
+    def _compile(self, node, scalar=None):
+        """
+        Turns an expression node into a function of the column mapping:
+        NumPy operations on arrays, or with scalar (the _SCALAR table)
+        their Python counterparts on floats.
+        """
+        def f(op):
+            return op if scalar is None else scalar[op]
+
+        if isinstance(node, ast.BoolOp):
+            parts = [self._compile(v, scalar) for v in node.values]
+            op = f(np.logical_and if isinstance(node.op, ast.And) else np.logical_or)
+            if len(parts) == 2:
+                first, second = parts
+                return lambda cols: op(first(cols), second(cols))
+            return lambda cols: functools.reduce(op, (p(cols) for p in parts))
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self._compile(node.operand, scalar)
+            if isinstance(node.op, ast.Not):
+                op = f(np.logical_not)
+                return lambda cols: op(operand(cols))
+            if isinstance(node.op, ast.USub):
+                op = f(np.negative)
+                return lambda cols: op(operand(cols))
+            if isinstance(node.op, ast.UAdd):
+                return operand
+
+        elif isinstance(node, ast.Compare):
+            terms = [self._compile(node.left, scalar)] + [self._compile(c, scalar) for c in node.comparators]
+            ops = []
+            for op in node.ops:
+                if type(op) not in _COMPARE:
+                    break
+                ops.append(f(_COMPARE[type(op)]))
+            else:
+                if len(ops) == 1:
+                    op, (left, right) = ops[0], terms
+                    return lambda cols: op(left(cols), right(cols))
+                both = f(np.logical_and)
+
+                def compare(cols):
+                    values = [t(cols) for t in terms]
+                    # a < b < c is (a < b) and (b < c)
+                    return functools.reduce(both, (
+                        op(values[i], values[i + 1]) for i, op in enumerate(ops)))
+                return compare
+
+        elif isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            op = f(_ARITHMETIC[type(node.op)])
+            left, right = self._compile(node.left, scalar), self._compile(node.right, scalar)
+            return lambda cols: op(left(cols), right(cols))
+
+        elif isinstance(node, ast.Call):
+            if (isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS
+                    and not node.keywords and node.args):
+                func = _FUNCTIONS[node.func.id]
+                args = [self._compile(a, scalar) for a in node.args]
+                if func is np.abs and len(args) == 1:
+                    func = f(func)
+                    return lambda cols: func(args[0](cols))
+                if func is not np.abs and len(args) >= 2:
+                    func = f(func)
+                    return lambda cols: functools.reduce(func, (a(cols) for a in args))
+
+        elif isinstance(node, ast.Name):
+            name = node.id
+            self.columns.add(name)
+            if scalar is not None:
+                return lambda cols: float(cols[name])
+            return lambda cols: np.asarray(cols[name], dtype=float)
+
+        elif isinstance(node, ast.Constant) and type(node.value) in (int, float, bool):
+            value = node.value
+            return lambda cols: value
+
+        raise ValueError(f"{self.name}: {ast.unparse(node)!r} is not allowed in a condition")
+
+
+# The built-in scan conditions, in report sheet order
+DEFAULT_CONDITIONS = [
+    Condition('Is_Inside_Camarilla', 'Today_H4 < Yest_H3 and Today_L4 > Yest_L3', 'Narrow Camarilla'),
+    Condition('Is_Inside_H4_L4', 'Today_H4 < Yest_H4 and Today_L4 > Yest_L4', 'Inside Camarilla'),
+    Condition('Is_Higher_Value', 'Today_L4 > Yest_H4', 'Higher Value Camarilla'),
+    Condition('Is_Lower_Value', 'Today_H4 < Yest_L4', 'Lower Value Camarilla'),
+]
+
+
+def evaluate_conditions(conditions, columns, rows, has_yest=None):
+    """
+    {name: boolean array} for every condition. Conditions on Yest_ columns
+    are False on rows where has_yest (a boolean mask) is False.
+    """
+    flags = {}
+    for condition in conditions:
+        mask = condition.evaluate(columns, rows)
+        if has_yest is not None and condition.uses_yesterday:
+            mask &= has_yest
+        flags[condition.name] = mask
+    return flags
+
+
+def check_conditions(conditions):
+    """
+    Raises ValueError when two conditions share a name, or labels that
+    become the same sheet title (see sheet_title_key).
+    """
+    names, titles = {}, {}
+    for c in conditions:
+        names.setdefault(c.name, []).append(c.name)
+        titles.setdefault(sheet_title_key(c.label), []).append(c.label)
+    duplicates = sorted(n for n, same in names.items() if len(same) > 1)
+    if duplicates:
+        raise ValueError(f"Duplicate condition names: {', '.join(duplicates)}")
+    shared = [' / '.join(map(repr, same)) for same in titles.values() if len(same) > 1]
+    if shared:
+        raise ValueError(f"Condition labels give the same sheet title: {'; '.join(shared)}")
+
+
+def parse_conditions(text):
+    """
+    Conditions from rule lines of the form
+
+        Name: expression
+        Name [Sheet label]: expression
+
+    Blank lines and lines starting with # are skipped. The rules are
+    checked against each other and DEFAULT_CONDITIONS (check_conditions).
+    """
+    conditions = []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        head, sep, expression = line.partition(':')
+        if '[' in head and ']' not in head:
+            problem = "sheet labels cannot contain ':'" if ']' in expression else "missing ']'"
+            raise ValueError(f"Line {number}: {problem} in {line!r}")
+        if not sep or not expression.strip():
+            raise ValueError(f"Line {number}: expected 'Name: expression', got {line!r}")
+        name, _, label = head.partition('[')
+        label = label.rstrip().rstrip(']').strip() or None
+        conditions.append(Condition(name.strip(), expression.strip(), label))
+    check_conditions(DEFAULT_CONDITIONS + conditions)
+    return conditions
+
+
+def load_conditions(path=DEFAULT_CONDITIONS_FILE):
+    """Conditions from a rules file (see parse_conditions); [] if it does not exist."""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return parse_conditions(f.read())
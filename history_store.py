@@ -0,0 +1,262 @@
+import datetime
+import os
+import re
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from bhav_cache import FrameLRU, read_frame, read_meta, write_frame
+
+DEFAULT_HISTORY_DIR = os.path.join(os.path.expanduser("~"), ".camarilla_history")
+
+# Per-contract key of the stored rows; partitions are sorted on it
+CONTRACT_KEY = ['TckrSymb', 'Strike_Ticks', 'OptnTp', 'XpryDt']
+
+DATE_PATTERN = re.compile(r"(\d{8})")
+
+
+def trading_date(path):
+    """Returns the trading date in a bhav copy file name (8-digit YYYYMMDD), or None."""
+    match = DATE_PATTERN.search(os.path.basename(str(path)))
+    if not match:
+        return None
+    try:
+        return datetime.datetime.strptime(match.group(1), "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def _as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(str(value).replace('-', ''), "%Y%m%d").date()
+
+
+def _expiry_date(value):
+    """An XpryDt string (ISO or dd-Mon-yyyy) as a date, or None if neither."""
+    for fmt in ("%Y-%m-%d", "%d-%b-%Y"):
+        try:
+            return datetime.datetime.strptime(str(value).strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+class HistoryStore:
+    """
+    Append-only, date-partitioned store of daily per-contract data.
+
+    Two tables are kept, one NPZ partition per trading day each (see
+    bhav_cache.write_frame):
+
+      contracts/YYYY/YYYYMMDD.npz  every option contract of the day with its
+                                   OHLC, OI, volume and Camarilla levels
+                                   (CamarillaScanner.contract_history),
+                                   sorted on CONTRACT_KEY
+      scans/YYYY/YYYYMMDD.npz      the scan result of the day
+
+    Partitions are written atomically and never modified in place; writing
+    a day that already exists raises FileExistsError unless overwrite=True.
+    Lookups go by day first (the partition) and then by contract key, and
+    recently read partitions are kept in memory.
+
+    Each partition records the store VERSION, its day and optionally the
+    content hash of the bhav copy it came from. Partitions of another
+    version or a different day (a moved file) are ignored on read, and
+    is_current() also tells a day stored from a different bhav copy apart.
+    """
+
+    TABLES = ('contracts', 'scans')
+
+    # Bump when the stored layout (CamarillaScanner.contract_history, the
+    # scan result columns) changes so older partitions are rebuilt
+    VERSION = 'v2'
+
+    def __init__(self, root=DEFAULT_HISTORY_DIR, memory_bytes=256 * 1024 * 1024):
+        self.root = root
+        self._frames = FrameLRU(memory_bytes)
+        for table in self.TABLES:
+            os.makedirs(os.path.join(root, table), exist_ok=True)
+
+    def path_for(self, table, day):
+        day = _as_date(day)
+        return os.path.join(self.root, table, f"{day:%Y}", f"{day:%Y%m%d}.npz")
+
+    def has_day(self, day, table='contracts'):
+        return os.path.exists(self.path_for(table, day))
+
+    def partition_info(self, day, table='contracts'):
+        """The stored meta of a partition (version, day, source), or None if missing."""
+        path = self.path_for(table, day)
+        if not os.path.exists(path):
+            return None
+        return read_meta(path)
+
+    def _is_valid(self, info, day):
+        return info.get('version') == self.VERSION and info.get('day') == f"{_as_date(day):%Y%m%d}"
+
+    def is_current(self, day, table='contracts', source=None):
+        """
+        True when day is stored in this VERSION and, given source (a
+        bhav_cache.content_hash), was stored from that same bhav copy.
+        """
+        info = self.partition_info(day, table)
+        if info is None or not self._is_valid(info, day):
+            return False
+        return source is None or info.get('source') in (None, '', source)
+
+    def days(self, table='contracts'):
+        """Sorted dates that have a partition in table."""
+        days = []
+        base = os.path.join(self.root, table)
+        for year in os.listdir(base):
+            folder = os.path.join(base, year)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if name.endswith('.npz'):
+                    try:
+                        days.append(datetime.datetime.strptime(name[:-4], "%Y%m%d").date())
+                    except ValueError:
+                        continue
+        return sorted(days)
+
+    def previous_day(self, day, table='contracts'):
+        """The latest stored day before day, or None."""
+        day = _as_date(day)
+        earlier = [d for d in self.days(table) if d < day]
+        return earlier[-1] if earlier else None
+
+    # Writing
+
+    def write(self, table, day, df, overwrite=False, source=None):
+        """
+        Stores df as the partition of table for day. source is the content
+        hash of the bhav copy it came from, if known.
+        """
+        if table == 'contracts':
+            df = df.sort_values(CONTRACT_KEY, kind='stable').reset_index(drop=True)
+        path = self.path_for(table, day)
+        if os.path.exists(path) and not overwrite:
+            raise FileExistsError(f"{table} for {_as_date(day)} is already stored")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write_frame(df, f, meta={'version': self.VERSION, 'day': f"{_as_date(day):%Y%m%d}",
+                                         'source': source or ''})
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._frames.put((table, _as_date(day)), df)
+        return path
+
+    def write_contracts(self, day, df, overwrite=False, source=None):
+        return self.write('contracts', day, df, overwrite, source)
+
+    def write_scan(self, day, df, overwrite=False, source=None):
+        return self.write('scans', day, df, overwrite, source)
+
+    # Reading
+
+    def read(self, table, day, columns=None):
+        """
+        The stored partition of table for day (None if missing or not
+        valid, see is_current). With columns, only those arrays are read
+        from disk unless the whole partition is already in memory.
+        """
+        day = _as_date(day)
+        df = self._frames.get((table, day))
+        if df is not None:
+            return df if columns is None else df[[c for c in columns if c in df.columns]]
+        key = (table, day) if columns is None else (table, day, tuple(columns))
+        df = self._frames.get(key)
+        if df is None:
+            path = self.path_for(table, day)
+            if not os.path.exists(path):
+                return None
+            info = read_meta(path)
+            if not self._is_valid(info, day):
+                print(f"Ignoring {path}: stored as {info.get('version', 'v1')} "
+                      f"for {info.get('day', 'an unknown day')}, expected {self.VERSION} for {day:%Y%m%d}")
+                return None
+            df = self._frames.put(key, read_frame(path, columns))
+        return df
+
+    def read_range(self, start=None, end=None, table='contracts', columns=None):
+        """
+        Partitions from start to end (inclusive, dates or 'YYYYMMDD')
+        concatenated with a leading 'Date' column, in date order.
+        """
+        start = _as_date(start) if start is not None else None
+        end = _as_date(end) if end is not None else None
+        frames = []
+        for day in self.days(table):
+            if (start is not None and day < start) or (end is not None and day > end):
+                continue
+            df = self.read(table, day, columns)
+            if df is None:
+                continue
+            frames.append(df.assign(Date=pd.Timestamp(day))[['Date'] + list(df.columns)])
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def ohlc_lookup(self, day):
+        """
+        The day's option OHLC indexed on CONTRACT_KEY, laid out like the
+        scanner's yesterday index (Open, High, Low, Close), or None.
+        """
+        df = self.read('contracts', day, CONTRACT_KEY + ['Open', 'High', 'Low', 'Close'])
+        if df is None:
+            return None
+        return df.set_index(CONTRACT_KEY)[['Open', 'High', 'Low', 'Close']]
+
+    def contract(self, symbol, strike=None, option_type=None, expiry=None, start=None, end=None):
+        """
+        Stored rows of one symbol's contracts over a date range, optionally
+        narrowed by key, with a leading 'Date' column as in read_range.
+
+        Only days from start to end are visited (and none after expiry, when
+        given). Partitions are sorted on CONTRACT_KEY, so the symbol's rows
+        are one block: it is located from the TckrSymb column alone and only
+        that block of the other columns is read from disk.
+        """
+        start = _as_date(start) if start is not None else None
+        end = _as_date(end) if end is not None else None
+        last = _expiry_date(expiry) if expiry is not None else None
+        if last is not None and (end is None or last < end):
+            end = last
+        frames = []
+        for day in self.days('contracts'):
+            if (start is not None and day < start) or (end is not None and day > end):
+                continue
+            symbols = self.read('contracts', day, ['TckrSymb'])
+            if symbols is None:
+                continue
+            found = np.flatnonzero((symbols['TckrSymb'] == symbol).to_numpy())
+            if not len(found):
+                continue
+            block = slice(found[0], found[-1] + 1)
+            df = self._frames.get(('contracts', day))
+            if df is not None:
+                df = df.iloc[block].reset_index(drop=True)
+            else:
+                df = read_frame(self.path_for('contracts', day), rows=block)
+            frames.append(df.assign(Date=pd.Timestamp(day))[['Date'] + list(df.columns)])
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+        mask = (df['TckrSymb'] == symbol).to_numpy()
+        if strike is not None:
+            mask &= df['Strike'] == float(strike)
+        if option_type is not None:
+            mask &= df['OptnTp'] == option_type
+        if expiry is not None:
+            mask &= df['XpryDt'] == expiry
+        return df[mask].reset_index(drop=True)
@@ -0,0 +1,295 @@
+import argparse
+import collections
+import csv
+import datetime
+import os
+import socket
+import sys
+import time
+
+import pandas as pd
+
+from scanner import CamarillaScanner
+from bhav_cache import DEFAULT_CACHE_DIR
+from conditions import load_conditions
+from history_store import DEFAULT_HISTORY_DIR, HistoryStore
+
+# A condition flag of one contract that changed with a bar
+FlagChange = collections.namedtuple(
+    'FlagChange', 'time symbol strike option_type expiry flag value close h4 l4')
+
+
+class _Contract:
+    """Running state of one contract: yesterday's values, today's high/low/close and flags."""
+
+    __slots__ = ('symbol', 'strike', 'option_type', 'expiry', 'yest',
+                 'high', 'low', 'close', 'h4', 'l4', 'flags', 'bars')
+
+    def __init__(self, symbol, strike, option_type, expiry, yest, flags):
+        self.symbol = symbol
+        self.strike = strike
+        self.option_type = option_type
+        self.expiry = expiry
+        self.yest = yest  # values of IntradayMonitor.yest_columns
+        self.high = self.low = self.close = self.h4 = self.l4 = None
+        self.flags = flags
+        self.bars = 0
+
+
+class IntradayMonitor:
+    """
+    Tracks today's Camarilla H4/L4 of option contracts from a live bar feed
+    and reports the scan conditions against yesterday's levels as they
+    change.
+
+    Yesterday's levels are loaded once (from a bhav copy or the history
+    store). Each bar updates the contract's running high, low and close,
+    recomputes its levels with the same formula as
+    CamarillaScanner.calculate_camarilla_levels and re-evaluates the
+    scanner's conditions on that one row (Condition.evaluate_row); only
+    flags that flipped are returned. An update touches one contract and
+    costs the same whatever the number of contracts watched, so the whole
+    F&O universe can be followed.
+
+    A bar feed has no spot, ATM strike, open or OI, so conditions that use
+    those columns are not watched (they are listed in `skipped`).
+
+    Contracts are keyed on (symbol, strike ticks, option type, expiry date),
+    like CONTRACT_KEY. Bars for contracts without yesterday's levels are
+    counted in `unknown` and ignored.
+    """
+
+    def __init__(self, levels, scanner=None):
+        """
+        levels: yesterday's per-contract frame with TckrSymb, Strike_Ticks,
+        OptnTp, XpryDt_Date, the Camarilla levels and optionally Open, High,
+        Low, Close (CamarillaScanner.contract_history or a HistoryStore
+        'contracts' partition). These become the conditions' Yest_ columns.
+        """
+        self.scanner = scanner or CamarillaScanner()
+        self.contracts = {}
+        self.unknown = 0
+        self.updates = 0
+        self._expiries = {}
+
+        stored = [k for k in self.scanner.LEVELS + ['Open', 'High', 'Low', 'Close'] if k in levels.columns]
+        self.yest_columns = tuple(f'Yest_{k}' for k in stored)
+        available = set(self.yest_columns).union(
+            [f'Today_{k}' for k in self.scanner.LEVELS], ['Today_High', 'Today_Low', 'Today_Close'])
+        self.conditions = [c for c in self.scanner.conditions if c.columns <= available]
+        self.skipped = [c for c in self.scanner.conditions if not c.columns <= available]
+        self.flags = tuple(c.name for c in self.conditions)
+        no_flags = (False,) * len(self.conditions)
+
+        expiries = [d.date() if d == d else None for d in levels['XpryDt_Date']]
+        rows = zip(levels['TckrSymb'].astype(str), levels['Strike_Ticks'].tolist(),
+                   levels['OptnTp'].astype(str), expiries,
+                   zip(*(levels[k].tolist() for k in stored)), levels['H4'].tolist())
+        scale = self.scanner.STRIKE_SCALE
+        for symbol, ticks, option_type, expiry, yest, y_h4 in rows:
+            if expiry is None or y_h4 != y_h4:
+                continue
+            self.contracts[(symbol, ticks, option_type, expiry)] = _Contract(
+                symbol, ticks / scale, option_type, expiry, yest, no_flags)
+
+    @classmethod
+    def from_bhav_copy(cls, path, scanner=None):
+        """Monitor with yesterday's levels computed from a bhav copy."""
+        scanner = scanner or CamarillaScanner()
+        df = scanner.load_bhav_copy(path, scanner.SCAN_COLUMNS, scanner.SCAN_INSTRUMENTS)
+        if df is None:
+            raise ValueError(f"Could not load {path}")
+        return cls(scanner.contract_history(df), scanner)
+
+    @classmethod
+    def from_history(cls, store, day, scanner=None):
+        """Monitor with yesterday's levels read from the history store."""
+        levels = store.read('contracts', day)
+        if levels is None:
+            raise ValueError(f"No contracts stored for {day}")
+        return cls(levels, scanner)
+
+    def _expiry(self, value):
+        """Expiry date of a bar's expiry string (parsed once per distinct string)."""
+        expiry = self._expiries.get(value)
+        if expiry is None:
+            for fmt in self.scanner.EXPIRY_FORMATS:
+                try:
+                    expiry = datetime.datetime.strptime(value, fmt).date()
+                    break
+                except ValueError:
+                    continue
+            self._expiries[value] = expiry
+        return expiry
+
+    def key(self, symbol, strike, option_type, expiry):
+        """Contract key of a bar's fields (strike in rupees, expiry as in the bhav copy)."""
+        return (symbol, int(round(float(strike) * self.scanner.STRIKE_SCALE)),
+                option_type, self._expiry(expiry))
+
+    def update(self, key, high, low, close, when=None):
+        """
+        Applies one bar (or a tick with high == low == close) to a contract
+        and returns the FlagChange events it caused.
+        """
+        c = self.contracts.get(key)
+        if c is None:
+            self.unknown += 1
+            return []
+        self.updates += 1
+        c.bars += 1
+        if c.high is None:
+            c.high, c.low = high, low
+        else:
+            if high > c.high:
+                c.high = high
+            if low < c.low:
+                c.low = low
+        c.close = close
+
+        # calculate_camarilla_levels for one row; a flat range gives close
+        r = c.high - c.low
+        c.h4 = close + (r * 1.1 / 2)
+        c.l4 = close - (r * 1.1 / 2)
+        values = dict(zip(self.yest_columns, c.yest))
+        values.update(Today_High=c.high, Today_Low=c.low, Today_Close=close,
+                      Today_H4=c.h4, Today_H3=close + (r * 1.1 / 4),
+                      Today_H2=close + (r * 1.1 / 6), Today_H1=close + (r * 1.1 / 12),
+                      Today_L1=close - (r * 1.1 / 12), Today_L2=close - (r * 1.1 / 6),
+                      Today_L3=close - (r * 1.1 / 4), Today_L4=c.l4)
+
+        flags = tuple([condition.evaluate_row(values) for condition in self.conditions])
+        if flags == c.flags:
+            return []
+        events = [FlagChange(when, c.symbol, c.strike, c.option_type, c.expiry,
+                             name, new, close, c.h4, c.l4)
+                  for name, old, new in zip(self.flags, c.flags, flags) if old != new]
+        c.flags = flags
+        return events
+
+    def update_bar(self, bar):
+        """update() for a parsed bar dict (see read_bars)."""
+        key = self.key(bar['Symbol'], bar['Strike'], bar['Option_Type'], bar['Expiry'])
+        return self.update(key, bar['High'], bar['Low'], bar['Close'], bar.get('Time'))
+
+    def run(self, bars, on_change=None):
+        """Feeds every bar to the monitor; on_change(event) is called per flag change."""
+        for bar in bars:
+            for event in self.update_bar(bar):
+                if on_change is not None:
+                    on_change(event)
+
+    def snapshot(self):
+        """Current state of every contract that has had a bar, as a scan-like frame."""
+        rows = []
+        for c in self.contracts.values():
+            if c.bars == 0:
+                continue
+            row = {'Symbol': c.symbol, 'Expiry': c.expiry, 'Strike': c.strike,
+                   'Option_Type': c.option_type, 'Bars': c.bars,
+                   'Today_High': c.high, 'Today_Low': c.low, 'Today_Close': c.close,
+                   'Today_H4': c.h4, 'Today_L4': c.l4}
+            yest = dict(zip(self.yest_columns, c.yest))
+            row.update(Yest_H4=yest['Yest_H4'], Yest_L4=yest['Yest_L4'])
+            row.update(zip(self.flags, c.flags))
+            rows.append(row)
+        df = pd.DataFrame(rows)
+        if not df.empty:
+            # Rounded like the scan's level columns
+            df[['Today_H4', 'Today_L4']] = df[['Today_H4', 'Today_L4']].round(2)
+            for c in ('Yest_H4', 'Yest_L4'):
+                df[c] = self.scanner.python_round(df[c], 2)
+        return df
+
+
+# Bar feeds
+
+def read_bars(lines):
+    """
+    Parses CSV bar lines (header first) into dicts. Columns: Time, Symbol,
+    Strike, Option_Type, Expiry and either High, Low, Close (minute bars)
+    or Price (ticks, used as high, low and close).
+    """
+    for row in csv.DictReader(lines):
+        try:
+            if row.get('Price') not in (None, ''):
+                high = low = close = float(row['Price'])
+            else:
+                high, low, close = float(row['High']), float(row['Low']), float(row['Close'])
+        except (KeyError, TypeError, ValueError):
+            print(f"Skipping bad bar: {row}", file=sys.stderr)
+            continue
+        yield {'Time': row.get('Time'), 'Symbol': row['Symbol'], 'Strike': row['Strike'],
+               'Option_Type': row['Option_Type'], 'Expiry': row['Expiry'],
+               'High': high, 'Low': low, 'Close': close}
+
+
+def replay_file(path, delay=0.0):
+    """Bars from a replay file, optionally sleeping `delay` seconds whenever the bar time changes."""
+    with open(path, newline='') as f:
+        last = None
+        for bar in read_bars(f):
+            if delay and last is not None and bar['Time'] != last:
+                time.sleep(delay)
+            last = bar['Time']
+            yield bar
+
+
+def socket_bars(host, port):
+    """Bars from a TCP stream of the same CSV lines (header first), until the sender closes."""
+    with socket.create_connection((host, port)) as sock:
+        with sock.makefile('r', newline='') as f:
+            yield from read_bars(f)
+
+
+def format_event(e):
+    return (f"{e.time or '':>8} {e.symbol:<12} {e.strike:>10g} {e.option_type} {e.expiry} "
+            f"{e.flag:<20} {'ON ' if e.value else 'OFF'}  close {e.close:.2f} H4 {e.h4:.2f} L4 {e.l4:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch option contracts intraday against yesterday's Camarilla levels.")
+    parser.add_argument("yesterday", help="yesterday's bhav copy (ZIP), or its date (YYYYMMDD) in the history store")
+    feed = parser.add_mutually_exclusive_group(required=True)
+    feed.add_argument("--replay", help="CSV file of minute bars or ticks to replay")
+    feed.add_argument("--connect", metavar="HOST:PORT", help="read CSV bars from a TCP socket")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait between bar times when replaying")
+    parser.add_argument("--history-dir", default=DEFAULT_HISTORY_DIR, help="history store for a date argument")
+    parser.add_argument("--snapshot", help="write the final state of every updated contract to this CSV")
+    parser.add_argument("--conditions", metavar="FILE",
+                        help="extra conditions to watch, one 'Name: expression' per line (see conditions.py)")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the parsed bhav copy cache")
+    args = parser.parse_args(argv)
+
+    conditions = load_conditions(args.conditions) if args.conditions else []
+    scanner = CamarillaScanner(cache_dir=None if args.no_cache else DEFAULT_CACHE_DIR, conditions=conditions)
+    if os.path.isfile(args.yesterday):
+        monitor = IntradayMonitor.from_bhav_copy(args.yesterday, scanner)
+    else:
+        monitor = IntradayMonitor.from_history(HistoryStore(args.history_dir), args.yesterday, scanner)
+    print(f"Watching {len(monitor.contracts)} contracts for {', '.join(monitor.flags)}")
+    for condition in monitor.skipped:
+        print(f"Not watching {condition.name}: needs {', '.join(sorted(condition.columns))}")
+
+    if args.replay:
+        bars = replay_file(args.replay, args.delay)
+    else:
+        host, _, port = args.connect.rpartition(':')
+        bars = socket_bars(host or 'localhost', int(port))
+
+    start = time.perf_counter()
+    try:
+        monitor.run(bars, on_change=lambda e: print(format_event(e)))
+    except KeyboardInterrupt:
+        print("Stopping...")
+    elapsed = time.perf_counter() - start
+    print(f"{monitor.updates} updates in {elapsed:.2f}s ({monitor.unknown} bars for unknown contracts)")
+
+    if args.snapshot:
+        monitor.snapshot().to_csv(args.snapshot, index=False)
+        print(f"Saved snapshot to {args.snapshot}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
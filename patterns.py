@@ -0,0 +1,320 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from scanner import CamarillaScanner
+from batch import find_bhav_copies
+from bhav_cache import DEFAULT_CACHE_DIR
+from conditions import DEFAULT_CONDITIONS, evaluate_conditions
+from history_store import DEFAULT_HISTORY_DIR, HistoryStore
+
+LEVELS = CamarillaScanner.LEVELS
+DEFAULT_WINDOW = 5
+
+_KEY_COLUMNS = ['TckrSymb', 'Strike', 'OptnTp', 'XpryDt_Date']
+_PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close'] + LEVELS
+
+
+def _streaks(flag, start):
+    """
+    Length of the run of True values ending at each row (0 where False).
+    Runs restart at rows where start is True (a new contract or series).
+    """
+    idx = np.arange(len(flag), dtype=np.int64)
+    reset = np.where(~flag, idx, np.where(start, idx - 1, -1))
+    return (idx - np.maximum.accumulate(reset)).astype(np.int32)
+
+
+def _trailing_mean(values, start, window):
+    """
+    Mean of the `window` values before each row within its run (rows
+    since the last start), NaN for rows with fewer than `window` before
+    them.
+    """
+    idx = np.arange(len(values))
+    position = idx - np.maximum.accumulate(np.where(start, idx, 0))
+    # window shifted adds rather than a running cumsum, so a row's mean does
+    # not depend on the rows of other contracts before it
+    total = np.zeros(len(values))
+    for k in range(1, window + 1):
+        total[k:] += values[:-k]
+    return np.where(position >= window, total / window, np.nan)
+
+
+def _contract_codes(symbol, is_put, expiry_day, strike):
+    """One int64 per contract key (symbol code, option type, expiry, strike in paise)."""
+    ticks = np.round(np.asarray(strike, dtype=float) * CamarillaScanner.STRIKE_SCALE).astype(np.int64)
+    return (((np.asarray(symbol, dtype=np.int64) << 1 | np.asarray(is_put, dtype=np.int64)) << 16
+             | np.asarray(expiry_day, dtype=np.int64)) << 30) | ticks
+
+
+def load_contracts(store, start=None, end=None, columns=_PRICE_COLUMNS, keys=None):
+    """
+    Stored contract rows from start to end as one frame sorted by contract
+    and day: Day (the position of its date among the stored trading days),
+    Symbol_Code, Is_Put, Strike, Expiry_Day (days since 1970) and the
+    requested price/level columns, plus Date, TckrSymb and OptnTp as
+    categoricals and Expiry.
+
+    Only the needed arrays are read from each partition, and symbols are
+    mapped to shared codes partition by partition, so a year of partitions
+    is concatenated without comparing strings. keys (a frame of TckrSymb,
+    Strike, OptnTp, Expiry) limits the rows to those contracts.
+    """
+    days = store.days()
+    start = pd.Timestamp(start).date() if start is not None else None
+    end = pd.Timestamp(end).date() if end is not None else None
+
+    symbols = {}
+    wanted = None
+    if keys is not None:
+        wanted = np.unique(_contract_codes(
+            [symbols.setdefault(s, len(symbols)) for s in keys['TckrSymb'].astype(str)],
+            (keys['OptnTp'].astype(str) == 'PE').to_numpy(),
+            pd.to_datetime(keys['Expiry']).to_numpy().astype('datetime64[D]').astype(np.int64),
+            keys['Strike']))
+
+    parts = []
+    for number, day in enumerate(days):
+        if (start is not None and day < start) or (end is not None and day > end):
+            continue
+        df = store.read('contracts', day, _KEY_COLUMNS + list(columns))
+        if df is None or df.empty:
+            continue
+        sym = pd.Categorical(df['TckrSymb'])
+        ids = np.array([symbols.setdefault(s, len(symbols)) for s in sym.categories], dtype=np.int32)
+        option = pd.Categorical(df['OptnTp'])
+        part = {'Day': np.full(len(df), number, dtype=np.int32),
+                'Symbol_Code': ids[sym.codes],
+                'Is_Put': np.asarray(option.categories == 'PE')[option.codes],
+                'Strike': df['Strike'].to_numpy(dtype=float),
+                'Expiry_Day': df['XpryDt_Date'].to_numpy().astype('datetime64[D]').astype(np.int32)}
+        for c in columns:
+            part[c] = df[c].to_numpy(dtype=float)
+        if wanted is not None:
+            codes = _contract_codes(part['Symbol_Code'], part['Is_Put'], part['Expiry_Day'], part['Strike'])
+            found = wanted[np.minimum(np.searchsorted(wanted, codes), len(wanted) - 1)] == codes
+            part = {c: v[found] for c, v in part.items()}
+        parts.append(part)
+
+    if not parts:
+        return pd.DataFrame()
+    order = np.lexsort(tuple(np.concatenate([p[c] for p in parts])
+                             for c in ['Day', 'Expiry_Day', 'Strike', 'Is_Put', 'Symbol_Code']))
+    df = pd.DataFrame({c: np.concatenate([p[c] for p in parts])[order] for c in parts[0]})
+    del parts
+
+    df.insert(0, 'Date', pd.Categorical.from_codes(
+        df['Day'].to_numpy(), pd.to_datetime(np.array(days, dtype='datetime64[D]')), ordered=True))
+    df.insert(1, 'TckrSymb', pd.Categorical.from_codes(df['Symbol_Code'].to_numpy(), list(symbols)))
+    df.insert(2, 'OptnTp', pd.Categorical.from_codes(df['Is_Put'].to_numpy().astype(np.int8), ['CE', 'PE']))
+    df.insert(3, 'Expiry', df['Expiry_Day'].to_numpy().astype('datetime64[D]'))
+    return df
+
+
+def contract_patterns(store, start=None, end=None, conditions=DEFAULT_CONDITIONS, window=DEFAULT_WINDOW,
+                      keys=None):
+    """
+    Multi-day patterns of every stored contract, one row per contract and
+    day, computed with whole-column operations over all days at once.
+
+    Each day is compared with the same contract on the previous stored
+    trading day (as the daily scan does); a contract that is missing on a
+    day starts a new run. Adds per condition its flag and '<name>_Streak',
+    the number of consecutive days it has held, plus
+      Range               today's H4 - L4
+      Range_Ratio         Range over the mean Range of the `window` days before
+      Contraction_Streak  consecutive days the Range has narrowed
+    Conditions can use the Today_/Yest_ OHLC and level columns; only the
+    columns they name are loaded. The store has no spot, ATM strike or OI,
+    so conditions that use other columns are skipped with a message, as the
+    intraday monitor does. keys limits the contracts (see load_contracts).
+    """
+    available = {f'{when}_{c}' for when in ('Today', 'Yest') for c in _PRICE_COLUMNS}
+    for condition in conditions:
+        if not condition.columns <= available:
+            missing = ', '.join(sorted(condition.columns - available))
+            print(f"Not evaluating {condition.name}: stored contracts have no {missing}")
+    conditions = [c for c in conditions if c.columns <= available]
+
+    used = {'H4', 'L4', 'Close'}
+    for condition in conditions:
+        used.update(c.split('_', 1)[1] for c in condition.columns if '_' in c)
+    columns = [c for c in _PRICE_COLUMNS if c in used]
+    df = load_contracts(store, start, end, columns, keys)
+    if df.empty:
+        return df
+
+    key = ['Symbol_Code', 'Is_Put', 'Strike', 'Expiry_Day']
+    same = np.ones(len(df), dtype=bool)
+    for c in key:
+        values = df[c].to_numpy()
+        same[1:] &= values[1:] == values[:-1]
+    day = df['Day'].to_numpy()
+    same[1:] &= day[1:] == day[:-1] + 1
+    same[0] = False
+    start_run = ~same
+
+    def yesterday(values):
+        shifted = np.empty_like(values)
+        shifted[0] = np.nan
+        shifted[1:] = values[:-1]
+        shifted[start_run] = np.nan
+        return shifted
+
+    namespace = {}
+    for condition in conditions:
+        for name in condition.columns:
+            if name not in namespace and '_' in name:
+                when, column = name.split('_', 1)
+                if column in df.columns and when in ('Today', 'Yest'):
+                    today = df[column].to_numpy()
+                    namespace[name] = today if when == 'Today' else yesterday(today)
+    flags = evaluate_conditions(conditions, namespace, len(df), has_yest=same)
+    del namespace
+
+    out = df[['Date', 'TckrSymb', 'Strike', 'OptnTp', 'Expiry', 'Close', 'H4', 'L4']]
+    out = out.assign(**{k: v for name, flag in flags.items()
+                        for k, v in ((name, flag), (f'{name}_Streak', _streaks(flag, start_run)))})
+
+    width = df['H4'].to_numpy() - df['L4'].to_numpy()
+    del df
+    out['Range'] = width
+    mean = _trailing_mean(width, start_run, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out['Range_Ratio'] = np.where(mean > 0, width / mean, np.nan)
+        out['Contraction_Streak'] = _streaks(same & (width < yesterday(width)), start_run)
+    return out
+
+
+def atm_patterns(store, start=None, end=None, conditions=DEFAULT_CONDITIONS, window=DEFAULT_WINDOW):
+    """
+    Streaks of the daily ATM scan results, per symbol and option type.
+
+    The series of a symbol's ATM CE (or PE) follows whichever contract was
+    ATM each day, so it continues across strike changes and expiry
+    rollover: each day's flag is that contract against its own previous
+    day, exactly as in the stored scan. Rolled marks days where the ATM
+    strike or expiry changed. Range_Ratio and Contraction_Streak come from
+    the day's contract (contract_patterns). Needs the 'scans' table.
+    """
+    columns = ['Symbol', 'Option_Type', 'Expiry', 'ATM_Strike', 'Spot_Close', 'Today_Close']
+    scans = store.read_range(start, end, table='scans', columns=columns + [c.name for c in conditions])
+    if scans.empty:
+        return scans
+    names = [c.name for c in conditions if c.name in scans.columns]
+
+    days = np.array(store.days('scans'), dtype='datetime64[D]')
+    scans = scans.assign(
+        Day=np.searchsorted(days, scans['Date'].to_numpy().astype('datetime64[D]')),
+        Symbol=scans['Symbol'].astype(str),
+        Option_Type=scans['Option_Type'].astype(str),
+        Expiry=scans['Expiry'].astype(str),
+    )
+    scans = scans.sort_values(['Symbol', 'Option_Type', 'Day'], kind='stable').reset_index(drop=True)
+
+    symbol = scans['Symbol'].to_numpy()
+    option_type = scans['Option_Type'].to_numpy()
+    day = scans['Day'].to_numpy()
+    same = np.zeros(len(scans), dtype=bool)
+    same[1:] = (symbol[1:] == symbol[:-1]) & (option_type[1:] == option_type[:-1]) & (day[1:] == day[:-1] + 1)
+    start_run = ~same
+
+    expiry = scans['Expiry'].to_numpy()
+    strike = scans['ATM_Strike'].to_numpy()
+    rolled = np.zeros(len(scans), dtype=bool)
+    rolled[1:] = (expiry[1:] != expiry[:-1]) | (strike[1:] != strike[:-1])
+
+    out = scans[['Date', 'Symbol', 'Option_Type', 'Expiry', 'ATM_Strike', 'Spot_Close', 'Today_Close']].copy()
+    out['Rolled'] = same & rolled
+    for name in names:
+        flag = scans[name].to_numpy(dtype=bool)
+        out[name] = flag
+        out[f'{name}_Streak'] = _streaks(flag, start_run)
+
+    # Range history of the contracts that were ATM on some day
+    out['_Expiry'] = CamarillaScanner().parse_expiry_dates(out['Expiry']).to_numpy().astype('datetime64[D]')
+    keys = out[['Symbol', 'ATM_Strike', 'Option_Type', '_Expiry']].drop_duplicates()
+    keys.columns = ['TckrSymb', 'Strike', 'OptnTp', 'Expiry']
+    contracts = contract_patterns(store, start, end, [], window, keys)
+    if not contracts.empty:
+        contracts = pd.DataFrame({
+            'Date': np.asarray(contracts['Date'], dtype='datetime64[ns]'),
+            'Symbol': contracts['TckrSymb'].astype(str),
+            'ATM_Strike': contracts['Strike'],
+            'Option_Type': contracts['OptnTp'].astype(str),
+            '_Expiry': contracts['Expiry'],
+            'Range': contracts['Range'],
+            'Range_Ratio': contracts['Range_Ratio'],
+            'Contraction_Streak': contracts['Contraction_Streak'],
+        })
+        out = out.merge(contracts, on=['Date', 'Symbol', 'ATM_Strike', 'Option_Type', '_Expiry'], how='left')
+    return out.drop(columns='_Expiry')
+
+
+def latest_streaks(patterns, min_streak=3):
+    """Rows of the last day in patterns where any condition streak is at least min_streak."""
+    if patterns.empty:
+        return patterns
+    last = patterns[patterns['Date'] == patterns['Date'].max()]
+    streaks = [c for c in last.columns if c.endswith('_Streak') and c != 'Contraction_Streak']
+    return last[(last[streaks] >= min_streak).any(axis=1)].reset_index(drop=True)
+
+
+def backfill(store, directory, start=None, end=None, scanner=None):
+    """
+    Fills the history store from the bhav copies in directory: the
+    contracts of every day and the ATM scan of every consecutive pair.
+    Days already stored are skipped; yesterday comes from the store, so
+    each file is parsed once.
+    """
+    scanner = scanner or CamarillaScanner(cache_dir=DEFAULT_CACHE_DIR, history=store)
+    files = find_bhav_copies(directory, start, end)
+    for (_, yest), (day, today) in zip(files, files[1:]):
+        if store.is_current(day) and store.is_current(day, 'scans'):
+            continue
+        scanner.process_data(today, yest)
+    return len(files)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-day Camarilla streaks and range contraction from the history store.")
+    parser.add_argument("--history-dir", default=DEFAULT_HISTORY_DIR)
+    parser.add_argument("--start", help="first day (YYYYMMDD)")
+    parser.add_argument("--end", help="last day (YYYYMMDD)")
+    parser.add_argument("--backfill", metavar="DIR", help="first store the bhav copies in this folder")
+    parser.add_argument("--contracts", action="store_true",
+                        help="patterns of every contract instead of the ATM series")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="days in the range average")
+    parser.add_argument("--min-streak", type=int, default=3, help="smallest streak shown for the last day")
+    parser.add_argument("--output", help="write all pattern rows to this CSV")
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(args.history_dir)
+    if args.backfill:
+        backfill(store, args.backfill, args.start, args.end)
+
+    t = time.perf_counter()
+    if args.contracts:
+        patterns = contract_patterns(store, args.start, args.end, window=args.window)
+    else:
+        patterns = atm_patterns(store, args.start, args.end, window=args.window)
+    if patterns.empty:
+        print("Nothing stored for that range")
+        return 1
+    print(f"{len(patterns)} rows over {patterns['Date'].nunique()} days in {time.perf_counter() - t:.2f}s")
+
+    streaks = latest_streaks(patterns, args.min_streak)
+    with pd.option_context('display.width', 200, 'display.max_columns', 30):
+        print(streaks.to_string(index=False) if not streaks.empty
+              else f"No streaks of {args.min_streak}+ days on the last day")
+    if args.output:
+        patterns.to_csv(args.output, index=False)
+        print(f"Saved {len(patterns)} rows to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,113 @@
+import cProfile
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class ScanProfile:
+    """
+    Records wall time, row counts and (optionally) peak memory for each
+    stage of a scan.
+
+    Pass an instance to CamarillaScanner(profile=...) and the scanner
+    records its stages (zip open, csv parse, normalization, yesterday
+    indexing, symbol resolution, level computation, result assembly);
+    front ends add 'report writing' around the report build.
+    on_stage(name, event, record) is called with event 'start' and 'end'
+    so a UI can show live progress.
+
+    track_memory uses tracemalloc, which slows allocation-heavy code
+    noticeably, so it is off by default. cprofile=True runs cProfile while
+    the profile is active (inside `with profile:`) so the hot spots can be
+    dumped with dump_cprofile().
+    """
+
+    def __init__(self, track_memory=False, cprofile=False, on_stage=None):
+        self.track_memory = track_memory
+        self.on_stage = on_stage
+        self.stages = []
+        self.profiler = cProfile.Profile() if cprofile else None
+        self._started_tracemalloc = False
+        self._t0 = None
+        self._t1 = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def start(self):
+        self._t0 = time.perf_counter()
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        self._t1 = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, **info):
+        """
+        Times the enclosed block as one stage. Yields the stage record (a
+        dict); set record['rows'] inside the block to report a row count.
+        Extra keyword arguments (e.g. source='today') are stored as-is.
+        """
+        record = {'stage': name, **info, 'rows': None, 'seconds': None}
+        tracking = self.track_memory and tracemalloc.is_tracing()
+        if tracking:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        if self.on_stage is not None:
+            self.on_stage(name, 'start', record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 6)
+            if tracking:
+                record['peak_mb'] = round((tracemalloc.get_traced_memory()[1] - base) / 2**20, 3)
+            self.stages.append(record)
+            if self.on_stage is not None:
+                self.on_stage(name, 'end', record)
+
+    @property
+    def total_seconds(self):
+        if self._t0 is not None:
+            end = self._t1 if self._t1 is not None else time.perf_counter()
+            return round(end - self._t0, 6)
+        return round(sum(r['seconds'] or 0 for r in self.stages), 6)
+
+    def to_dict(self):
+        return {'total_seconds': self.total_seconds, 'stages': list(self.stages)}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), default=str, **kwargs)
+
+    def summary(self):
+        """Plain-text table of the recorded stages in the order they ran."""
+        width = max([len(str(r.get('source', ''))) for r in self.stages] + [6]) + 2
+        lines = [f"{'stage':<22}{'source':<{width}}{'rows':>10}{'seconds':>10}{'peak MB':>10}"]
+        for r in self.stages:
+            rows = '' if r.get('rows') is None else r['rows']
+            peak = r.get('peak_mb', '')
+            lines.append(f"{r['stage']:<22}{str(r.get('source', '')):<{width}}{rows:>10}"
+                         f"{r['seconds']:>10.3f}{peak:>10}")
+        lines.append(f"{'total':<{width + 32}}{self.total_seconds:>10.3f}")
+        return "\n".join(lines)
+
+    def dump_cprofile(self, path):
+        """Writes the cProfile statistics (pstats format) to path."""
+        if self.profiler is None:
+            raise ValueError("Profile was created without cprofile=True")
+        self.profiler.dump_stats(path)
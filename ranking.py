@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+# Metrics ranked in the Top N report
+RANK_METRICS = ['OpnIntrst', 'ChngInOpnIntrst', 'TtlTradgVol', 'TtlNbOfTxsExctd']
+
+
+def metric_matrix(df, metrics, absolute=()):
+    """
+    Numeric copy of the metric columns as one (rows x metrics) float array.
+    Non-numeric values count as 0, and metrics listed in absolute are
+    ranked by their absolute value. df itself is never modified.
+    """
+    columns = []
+    for m in metrics:
+        values = pd.to_numeric(df[m], errors='coerce').to_numpy(dtype=float)
+        values = np.nan_to_num(values, nan=0.0)
+        if m in absolute:
+            values = np.abs(values)
+        columns.append(values)
+    if not columns:
+        return np.empty((len(df), 0))
+    return np.column_stack(columns)
+
+
+def top_positions(matrix, n):
+    """
+    Row positions of the n largest values in every column of matrix.
+
+    Uses np.partition to find each column's n-th largest value (one
+    partial selection over all columns) instead of sorting. Ties are
+    broken by row position, so the result matches a stable descending
+    sort followed by head(n). Returns a list with one position array per
+    column, ordered from largest to smallest.
+    """
+    rows = matrix.shape[0]
+    n = min(n, rows)
+    if n <= 0:
+        return [np.empty(0, dtype=np.intp) for _ in range(matrix.shape[1])]
+
+    kth = np.partition(matrix, rows - n, axis=0)[rows - n]
+    result = []
+    for j in range(matrix.shape[1]):
+        col = matrix[:, j]
+        above = np.flatnonzero(col > kth[j])
+        tied = np.flatnonzero(col == kth[j])[:n - len(above)]
+        picked = np.concatenate([above, tied])
+        # Largest first; equal values keep row order
+        result.append(picked[np.lexsort((picked, -col[picked]))])
+    return result
+
+
+def rank_top_n(df, n=5, metrics=RANK_METRICS, by=None, absolute=()):
+    """
+    Top n rows of df for every metric, optionally within groups.
+
+    by:       optional column name or list of columns (e.g. 'Option_Type',
+              'Expiry') to rank within each group separately.
+    absolute: metrics to rank by absolute value (e.g. ['ChngInOpnIntrst']).
+
+    Returns a long DataFrame with the group columns first, then 'Metric',
+    'Rank' (1 = largest), 'Value' (the ranked, numeric value) and the other
+    columns of the selected rows. Groups appear in order of first
+    appearance. The input frame is not modified.
+    """
+    if isinstance(by, str):
+        by = [by]
+    by = list(by or [])
+
+    matrix = metric_matrix(df, metrics, absolute)
+    if by:
+        codes, uniques = pd.MultiIndex.from_frame(df[by]).factorize()
+        groups = [np.flatnonzero(codes == g) for g in range(len(uniques))]
+    else:
+        groups = [np.arange(len(df))]
+
+    pieces = []
+    for rows in groups:
+        for j, positions in enumerate(top_positions(matrix[rows], n)):
+            picked = rows[positions]
+            piece = df.iloc[picked].reset_index(drop=True)
+            piece.insert(0, 'Value', matrix[picked, j])
+            piece.insert(0, 'Rank', np.arange(1, len(picked) + 1))
+            piece.insert(0, 'Metric', metrics[j])
+            pieces.append(piece)
+
+    if not pieces:
+        return pd.DataFrame(columns=['Metric', 'Rank', 'Value'] + list(df.columns))
+    result = pd.concat(pieces, ignore_index=True)
+    lead = by + ['Metric', 'Rank', 'Value']
+    return result[lead + [c for c in result.columns if c not in lead]]
@@ -0,0 +1,335 @@
+import importlib.util
+import io
+import json
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from conditions import DEFAULT_CONDITIONS, MAIN_SHEET, SHEET_TITLE_LENGTH, TOP_SHEET, check_conditions
+from ranking import rank_top_n
+
+# Columns shown first on the Main Data sheet
+PRIORITY_COLUMNS = ['Symbol', 'Expiry', 'ATM_Strike', 'Option_Type', 'Spot_Close']
+
+# Columns shown for each side of the CE/PE condition sheets
+SPLIT_COLUMNS = ['Symbol', 'Spot_Close', 'ATM_Strike']
+
+# Columns shown in every Top N block, followed by the metric itself
+TOP_COLUMNS = ['Symbol', 'Option_Type', 'ATM_Strike', 'Spot_Close']
+# Added to the split and Top N columns when the result is a chain scan
+# (CamarillaScanner.scan_chain), where one symbol has many strikes
+CHAIN_COLUMNS = ['Expiry', 'Strike', 'Strike_Offset']
+
+TOP_METRICS = [
+    ('OpnIntrst', 'Open Interest'),
+    ('ChngInOpnIntrst', 'Change in OI'),
+    ('TtlTradgVol', 'Volume'),
+    ('TtlNbOfTxsExctd', 'Transactions'),
+]
+
+# Declarative workbook layout, in sheet order.
+#   main:  the full result with PRIORITY_COLUMNS first
+#   split: rows where `flag` is True, CE and PE side by side under merged titles
+#   top:   one block per TOP_METRICS entry; {n} in the name is the Top N size
+
+
+def condition_sheets(conditions=DEFAULT_CONDITIONS):
+    """
+    Sheet layout with one split sheet per condition (CamarillaScanner.conditions).
+    Raises ValueError when two labels give the same sheet title.
+    """
+    check_conditions(conditions)
+    return ([{'name': MAIN_SHEET, 'kind': 'main'}]
+            + [{'name': c.label, 'kind': 'split', 'flag': c.name} for c in conditions]
+            + [{'name': TOP_SHEET, 'kind': 'top'}])
+
+
+SHEETS = condition_sheets()
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ZIP_MIME = "application/zip"
+JSON_MIME = "application/json"
+PARQUET_MIME = "application/vnd.apache.parquet"
+
+
+def sheet_name(spec, top_n=5):
+    # Excel allows at most 31 characters
+    return spec['name'].format(n=top_n)[:SHEET_TITLE_LENGTH]
+
+
+def main_frame(df):
+    """The scan result with the priority columns first."""
+    cols = list(df.columns)
+    return df[PRIORITY_COLUMNS + [c for c in cols if c not in PRIORITY_COLUMNS]]
+
+
+def with_chain_columns(df, columns):
+    """columns plus CHAIN_COLUMNS when df is a chain scan result."""
+    if 'Strike_Offset' not in df.columns:
+        return list(columns)
+    return list(columns) + [c for c in CHAIN_COLUMNS if c not in columns]
+
+
+def split_frame(df, flag):
+    """Rows where flag is True, with the CE and PE lists side by side."""
+    cols = with_chain_columns(df, SPLIT_COLUMNS)
+    flagged = df[df[flag] == True]
+    ce = flagged[flagged['Option_Type'] == 'CE'][cols].reset_index(drop=True)
+    pe = flagged[flagged['Option_Type'] == 'PE'][cols].reset_index(drop=True)
+    return pd.concat([ce, pe], axis=1)
+
+
+def top_frames(df, top_n=5, by=None, absolute=()):
+    """
+    Returns [(title, frame)] with the top_n rows for each TOP_METRICS entry,
+    one block per metric (and per group when ranking within `by`).
+    See ranking.rank_top_n for by/absolute.
+    """
+    metrics = [m for m, _ in TOP_METRICS]
+    labels = dict(TOP_METRICS)
+    ranked = rank_top_n(df, top_n, metrics, by=by, absolute=absolute)
+
+    by = [by] if isinstance(by, str) else list(by or [])
+    keys = by + ['Metric']
+    blocks = []
+    for key, block in ranked.groupby(keys, sort=False):
+        key = key if isinstance(key, tuple) else (key,)
+        metric = key[-1]
+        label = labels[metric]
+        if metric in absolute:
+            label = f'|{label}|'
+        suffix = ''.join(f' {k}' for k in key[:-1])
+        values = pd.to_numeric(block[metric], errors='coerce').fillna(0)
+        if metric in absolute:
+            values = values.abs()
+        frame = block[with_chain_columns(df, TOP_COLUMNS)].assign(**{metric: values})
+        blocks.append((f'Top {top_n} {label}{suffix}', frame.reset_index(drop=True)))
+    return blocks
+
+
+def column_widths(frame):
+    """
+    Auto-fit widths for every column of frame in one pass: the longest
+    rendered value or header, plus 2.
+    """
+    header = np.array([len(str(c)) for c in frame.columns])
+    if frame.empty:
+        return list(header + 2)
+    lengths = np.char.str_len(frame.to_numpy(dtype=str)).max(axis=0)
+    return list(np.maximum(lengths, header) + 2)
+
+
+def build_excel(df, output=None, top_n=5, sheets=SHEETS, top_by=None, top_absolute=()):
+    """
+    Writes the Camarilla report workbook to output (a path or a binary
+    file object; a new BytesIO when None) and returns output.
+    top_by/top_absolute are passed to the Top N ranking (see top_frames).
+
+    The workbook is written with openpyxl in write-only mode: rows are
+    streamed to the file as they are produced, so memory stays flat even
+    for a full-market Main Data sheet.
+    """
+    from openpyxl import Workbook
+
+    if output is None:
+        output = io.BytesIO()
+
+    wb = Workbook(write_only=True)
+    styles = _Styles()
+    for spec in sheets:
+        ws = wb.create_sheet(sheet_name(spec, top_n))
+        if spec['kind'] == 'main':
+            _write_table(ws, styles, main_frame(df), autofit=False)
+        elif spec['kind'] == 'split':
+            title = spec['name']
+            frame = split_frame(df, spec['flag'])
+            half = frame.shape[1] // 2
+            _write_blocks(ws, styles, [(f'{title} CE', frame.iloc[:, :half]),
+                                       (f'{title} PE', frame.iloc[:, half:])], gap=0)
+        elif spec['kind'] == 'top':
+            _write_blocks(ws, styles, top_frames(df, top_n, top_by, top_absolute), gap=1)
+        else:
+            raise ValueError(f"Unknown sheet kind: {spec['kind']!r}")
+    wb.save(output)
+    return output
+
+
+def sheet_frames(df, top_n=5, sheets=SHEETS, top_by=None, top_absolute=()):
+    """
+    The content of each sheet as one flat frame, for formats without
+    Excel layout: {sheet name: frame}. Condition sheets list the flagged
+    rows with their Option_Type, and Top N is the long ranking table.
+    """
+    frames = {}
+    for spec in sheets:
+        name = sheet_name(spec, top_n)
+        if spec['kind'] == 'main':
+            frames[name] = main_frame(df)
+        elif spec['kind'] == 'split':
+            flagged = df[df[spec['flag']] == True]
+            frames[name] = flagged[['Option_Type'] + with_chain_columns(df, SPLIT_COLUMNS)].reset_index(drop=True)
+        elif spec['kind'] == 'top':
+            ranked = rank_top_n(df, top_n, [m for m, _ in TOP_METRICS], by=top_by, absolute=top_absolute)
+            by = [top_by] if isinstance(top_by, str) else list(top_by or [])
+            lead = by + ['Metric', 'Rank', 'Value']
+            cols = with_chain_columns(df, TOP_COLUMNS)
+            frames[name] = ranked[lead + [c for c in cols if c not in lead]]
+        else:
+            raise ValueError(f"Unknown sheet kind: {spec['kind']!r}")
+    return frames
+
+
+def build_csv_zip(df, output=None, top_n=5, sheets=SHEETS, top_by=None, top_absolute=()):
+    """Writes one CSV per sheet into a ZIP archive and returns output."""
+    if output is None:
+        output = io.BytesIO()
+    frames = sheet_frames(df, top_n, sheets, top_by, top_absolute)
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as z:
+        for name, frame in frames.items():
+            z.writestr(f"{name}.csv", frame.to_csv(index=False))
+    return output
+
+
+def build_json(df, output=None, top_n=5, sheets=SHEETS, top_by=None, top_absolute=()):
+    """Writes {sheet name: [records]} as JSON and returns output."""
+    if output is None:
+        output = io.BytesIO()
+    frames = sheet_frames(df, top_n, sheets, top_by, top_absolute)
+    payload = {name: json.loads(frame.to_json(orient='records', date_format='iso'))
+               for name, frame in frames.items()}
+    output.write(json.dumps(payload).encode('utf-8'))
+    return output
+
+
+def build_parquet(df, output=None, **_):
+    """Writes the full scan result (Main Data) as Parquet; needs pyarrow."""
+    if not parquet_available():
+        raise ImportError("Parquet output needs the optional 'pyarrow' package.")
+    if output is None:
+        output = io.BytesIO()
+    main_frame(df).to_parquet(output, index=False)
+    return output
+
+
+def parquet_available():
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+# Output formats: name -> (label, file extension, mime type, builder).
+# Every builder takes (df, output=None, top_n=..., sheets=..., top_by=...,
+# top_absolute=...) and only runs when that format is requested.
+FORMATS = {
+    'xlsx': ('Excel workbook', 'xlsx', XLSX_MIME, build_excel),
+    'csv': ('CSV per sheet (ZIP)', 'zip', ZIP_MIME, build_csv_zip),
+    'json': ('JSON', 'json', JSON_MIME, build_json),
+    'parquet': ('Parquet (Main Data)', 'parquet', PARQUET_MIME, build_parquet),
+}
+
+
+def available_formats():
+    return [f for f in FORMATS if f != 'parquet' or parquet_available()]
+
+
+def build_report(df, fmt='xlsx', top_n=5, sheets=SHEETS, top_by=None, top_absolute=()):
+    """Builds the report in the requested format and returns its bytes."""
+    builder = FORMATS[fmt][3]
+    output = builder(df, io.BytesIO(), top_n=top_n, sheets=sheets,
+                     top_by=top_by, top_absolute=top_absolute)
+    return output.getvalue()
+
+
+class _Styles:
+    """Cell styles shared by every sheet (created once per workbook)."""
+
+    def __init__(self):
+        from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+        thin = Side(style='thin')
+        # Same look as the header pandas' to_excel writes
+        self.header_font = Font(bold=True)
+        self.header_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        self.header_alignment = Alignment(horizontal='center', vertical='top')
+        # Merged block titles
+        self.title_font = Font(bold=True, color="FFFFFF")
+        self.title_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+        self.title_alignment = Alignment(horizontal='center', vertical='center')
+
+
+def _cell(ws, value, font=None, fill=None, border=None, alignment=None):
+    from openpyxl.cell import WriteOnlyCell
+
+    cell = WriteOnlyCell(ws, value=value)
+    if font is not None:
+        cell.font = font
+    if fill is not None:
+        cell.fill = fill
+    if border is not None:
+        cell.border = border
+    if alignment is not None:
+        cell.alignment = alignment
+    return cell
+
+
+def _header_cells(ws, styles, columns):
+    return [_cell(ws, str(c), styles.header_font, border=styles.header_border,
+                  alignment=styles.header_alignment) for c in columns]
+
+
+def _rows(frame):
+    """Row tuples with NaN turned into empty cells and NumPy scalars unwrapped."""
+    values = frame.astype(object).where(frame.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+def _write_table(ws, styles, frame, autofit=True):
+    if autofit:
+        _set_widths(ws, column_widths(frame))
+    ws.append(_header_cells(ws, styles, frame.columns))
+    for row in _rows(frame):
+        ws.append(row)
+
+
+def _write_blocks(ws, styles, blocks, gap):
+    """
+    Writes tables side by side: a merged, filled title over each block in
+    row 1, headers in row 2 and data below, with `gap` empty columns
+    between blocks.
+    """
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.cell_range import CellRange
+
+    widths, titles, headers, bodies = [], [], [], []
+    col = 1
+    for title, frame in blocks:
+        n = frame.shape[1]
+        widths += column_widths(frame) + [None] * gap
+        titles += [_cell(ws, title, styles.title_font, styles.title_fill, alignment=styles.title_alignment)]
+        titles += [None] * (n - 1 + gap)
+        headers += _header_cells(ws, styles, frame.columns) + [None] * gap
+        bodies.append((list(_rows(frame)), n))
+        ws.merged_cells.add(CellRange(f"{get_column_letter(col)}1:{get_column_letter(col + n - 1)}1"))
+        col += n + gap
+
+    # Drop the trailing gap
+    if gap:
+        widths, titles, headers = widths[:-gap], titles[:-gap], headers[:-gap]
+
+    _set_widths(ws, widths)
+    ws.append(titles)
+    ws.append(headers)
+    height = max((len(rows) for rows, _ in bodies), default=0)
+    for i in range(height):
+        line = []
+        for rows, n in bodies:
+            line += list(rows[i]) if i < len(rows) else [None] * n
+            line += [None] * gap
+        ws.append(line[:len(line) - gap] if gap else line)
+
+
+def _set_widths(ws, widths):
+    from openpyxl.utils import get_column_letter
+
+    for i, width in enumerate(widths, 1):
+        if width is not None:
+            ws.column_dimensions[get_column_letter(i)].width = int(width)
@@ -1,55 +1,457 @@
 
+import contextlib
+import hashlib
+import importlib.util
+import numpy as np
 import pandas as pd
 import zipfile
 import os
-import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from bhav_cache import BhavCache, DEFAULT_CACHE_BYTES, DEFAULT_CACHE_DIR, content_hash
+from conditions import DEFAULT_CONDITIONS, check_conditions, evaluate_conditions
+from history_store import trading_date
+
+
+def arrow_available():
+    """True when pyarrow is installed (the 'arrow' CSV engine)."""
+    return importlib.util.find_spec('pyarrow') is not None
+
 
 class CamarillaScanner:
-    def __init__(self):
-        pass
+    LEVELS = ['H4', 'H3', 'H2', 'H1', 'L1', 'L2', 'L3', 'L4']
+    CONTRACT_KEY = ['TckrSymb', 'Strike_Ticks', 'OptnTp', 'XpryDt']
+
+    # Bump when the normalization in _parse_bhav_copy changes so cached
+    # frames from an older loader are not reused
+    LOADER_VERSION = 'v5'
+
+    # Loader schema: string columns become categoricals, counts integers
+    # (int32 when they fit) and prices floats (see _parse_bhav_copy for the
+    # price dtype). StrkPric is replaced by Strike_Ticks, the strike in
+    # integer ticks of 1/STRIKE_SCALE rupee (NO_STRIKE for futures), so
+    # contracts match and join exactly without float casts.
+    STR_COLUMNS = ['TckrSymb', 'FinInstrmTp', 'XpryDt', 'OptnTp']
+    INT_COLUMNS = ['OpnIntrst', 'ChngInOpnIntrst', 'TtlTradgVol', 'TtlNbOfTxsExctd']
+    PRICE_COLUMNS = ['StrkPric', 'OpnPric', 'HghPric', 'LwPric', 'ClsPric', 'UndrlygPric']
+    STRIKE_SCALE = 100
+    NO_STRIKE = -1
+
+    # Result and condition columns of the ATM and chain scans, and the
+    # columns the Top N ranking and the batch/backtest runs put in front of
+    # them; a condition (which adds a result column) cannot take one of these
+    RESERVED_COLUMNS = (['Symbol', 'Expiry', 'Expiry_Rank', 'Spot_Close', 'ATM_Strike', 'Strike',
+                         'Strike_Offset', 'Moneyness', 'Option_Type'] + INT_COLUMNS
+                        + ['Today_' + k for k in ['Open', 'High', 'Low', 'Close'] + LEVELS]
+                        + ['Yest_' + k for k in ['Open', 'High', 'Low', 'Close'] + LEVELS]
+                        + ['Metric', 'Rank', 'Value', 'Date', 'Prev_Date'])
+
+    # Underlying future type -> option type scanned against it: stock
+    # futures/options and index futures/options
+    UNDERLYING_TYPES = {'STF': 'STO', 'IDF': 'IDO'}
+    FUTURE_TYPES = list(UNDERLYING_TYPES)
+    OPTION_TYPES = list(UNDERLYING_TYPES.values())
+
+    # Underlyings with weekly option expiries: the ATM scan uses their
+    # nearest option expiry rather than the nearest (monthly) future's, and
+    # the index price their options report (UndrlygPric) as the spot, since
+    # the monthly future's close includes carry
+    WEEKLY_TYPES = ['IDF']
+
+    # What a scan actually reads from a bhav copy
+    SCAN_COLUMNS = STR_COLUMNS + PRICE_COLUMNS + INT_COLUMNS
+    SCAN_INSTRUMENTS = FUTURE_TYPES + OPTION_TYPES
+
+    CHUNK_ROWS = 200_000
+
+    # CSV parsers for bhav copies: 'pandas' (chunked, the default) or
+    # 'arrow' (pyarrow.csv, multithreaded, but it holds the whole
+    # decompressed CSV in memory); 'auto' picks arrow when pyarrow is installed
+    CSV_ENGINES = ('pandas', 'arrow', 'auto')
+
+    # Chain scan defaults: strikes on each side of the ATM and expiries per symbol
+    CHAIN_STRIKES = 2
+    CHAIN_EXPIRIES = 3
+
+    # Expiry formats seen in bhav copies: UDiFF (ISO) and the older dd-Mon-yyyy
+    EXPIRY_FORMATS = ['%Y-%m-%d', '%d-%b-%Y']
+
+    def __init__(self, cache_dir=None, cache_max_bytes=DEFAULT_CACHE_BYTES, profile=None, history=None,
+                 conditions=None, csv_engine='pandas'):
+        """
+        cache_dir: optional directory for the parsed bhav copy cache
+        (see bhav_cache.BhavCache). None disables caching.
+        profile:   optional profiling.ScanProfile that records the time,
+        rows and memory of each loading and scanning stage.
+        history:   optional history_store.HistoryStore. process_data then
+        reads yesterday's contracts from it when stored (instead of parsing
+        the previous bhav copy) and records every day it loads.
+        conditions: extra conditions.Condition rules, evaluated after the
+        built-in DEFAULT_CONDITIONS; each adds a boolean result column.
+        csv_engine: one of CSV_ENGINES (see _parse_bhav_copy). Both engines
+        load identical frames; 'arrow' is faster and also loads the two
+        days of a scan concurrently (load_days), at about twice the peak
+        memory.
+        """
+        self.cache = BhavCache(cache_dir, cache_max_bytes) if cache_dir else None
+        self.profile = profile
+        self.history = history
+        self.conditions = list(DEFAULT_CONDITIONS) + list(conditions or [])
+        check_conditions(self.conditions)
+        clashes = sorted({c.name for c in self.conditions} & set(self.RESERVED_COLUMNS))
+        if clashes:
+            raise ValueError(f"Condition names clash with scan columns: {', '.join(clashes)}")
+        if csv_engine not in self.CSV_ENGINES:
+            raise ValueError(f"Unknown CSV engine: {csv_engine!r}")
+        if csv_engine == 'auto':
+            csv_engine = 'arrow' if arrow_available() else 'pandas'
+        elif csv_engine == 'arrow' and not arrow_available():
+            raise ValueError("csv_engine='arrow' needs pyarrow")
+        self.csv_engine = csv_engine
+
+    def _stage(self, name, **info):
+        """Profiling context for one stage; a no-op without a profile."""
+        if self.profile is None:
+            return contextlib.nullcontext({})
+        return self.profile.stage(name, **info)
+
+    @staticmethod
+    def _source_name(src):
+        """Short label for a path or uploaded file, used in profiles."""
+        return os.path.basename(str(getattr(src, 'name', src)))
 
-    def load_bhav_copy(self, zip_path):
-        """Loads the CSV from the ZIP file into a DataFrame."""
+    def load_bhav_copy(self, zip_path, columns=None, instruments=None, price_dtype='float64'):
+        """
+        Loads the CSV from the ZIP file into a DataFrame.
+
+        columns:     optional list of columns to keep (all by default).
+        instruments: optional list of FinInstrmTp values to keep, e.g.
+                     ['STF', 'STO']; other rows are dropped while reading.
+        price_dtype: dtype for price columns. float32 halves their memory
+                     but cannot hold every 2-decimal price above 2**17
+                     exactly, so the scanner keeps float64.
+
+        With a cache configured, a previously parsed copy of the same ZIP
+        contents (and the same options) is returned from disk instead of
+        re-parsing the CSV.
+        """
+        key = None
+        if self.cache is not None:
+            try:
+                options = repr((columns, instruments, price_dtype))
+                version = f"{self.LOADER_VERSION}-{hashlib.sha1(options.encode()).hexdigest()[:10]}"
+                with self._stage('cache lookup', source=self._source_name(zip_path)) as stage:
+                    key = self.cache.key_for(zip_path, version)
+                    df = self.cache.get(key)
+                    stage['rows'] = None if df is None else len(df)
+                if df is not None:
+                    return df
+            except Exception as e:
+                print(f"Bhav copy cache unavailable for {zip_path}: {e}")
+                key = None
+
+        df = self._parse_bhav_copy(zip_path, columns, instruments, price_dtype)
+
+        if df is not None and key is not None:
+            try:
+                self.cache.put(key, df)
+            except Exception as e:
+                print(f"Could not cache {zip_path}: {e}")
+        return df
+
+    def _parse_bhav_copy(self, zip_path, columns=None, instruments=None, price_dtype='float64'):
+        """
+        Reads and normalizes the CSV inside the bhav copy ZIP.
+
+        Only the wanted columns are parsed, with explicit dtypes, and rows
+        are filtered on FinInstrmTp before normalization. With the 'pandas'
+        CSV engine (the default) it is read in chunks of CHUNK_ROWS, each
+        filtered before the next one is read, so the full unfiltered file is
+        never held in memory at once. The 'arrow' engine trades that for
+        speed: the CSV is decompressed into memory once and parsed by pyarrow
+        on all cores (see _read_csv_arrow).
+        """
+        source = self._source_name(zip_path)
+        arrow = self.csv_engine == 'arrow'
         try:
             with zipfile.ZipFile(zip_path, 'r') as z:
-                # Find the first CSV file
-                csv_files = [f for f in z.namelist() if f.lower().endswith('.csv')]
-                if not csv_files:
-                    raise ValueError(f"No CSV found in {zip_path}")
-                
-                # Read CSV
-                # Parse dates manually for XpryDt (format usually dd-MMM-yyyy)
-                df = pd.read_csv(z.open(csv_files[0]))
-                
-                # Standardize columns (strip whitespace)
-                df.columns = df.columns.str.strip()
-                
-                # Strip string columns
-                str_cols = ['TckrSymb', 'FinInstrmTp', 'XpryDt', 'OptnTp']
-                for c in str_cols:
-                    if c in df.columns:
-                        df[c] = df[c].astype(str).str.strip()
-
-                # Convert Expiry to datetime for sorting
-                # XpryDt format example: 2026-01-29 (ISO) or 29-Jan-2026
-                # Using errors='coerce' is good. Mixed format warnings can be silenced by letting pandas guess without dayfirst or specifying format.
-                df['XpryDt_Date'] = pd.to_datetime(df['XpryDt'], errors='coerce')
-                
+                with self._stage('zip open', source=source):
+                    # Find the first CSV file
+                    csv_files = [f for f in z.namelist() if f.lower().endswith('.csv')]
+                    if not csv_files:
+                        raise ValueError(f"No CSV found in {zip_path}")
+
+                    # Map stripped header names to the raw ones in the file
+                    with z.open(csv_files[0]) as f:
+                        raw_cols = pd.read_csv(f, nrows=0).columns
+                by_name = {str(c).strip(): c for c in raw_cols}
+                wanted = [c for c in (columns or by_name) if c in by_name]
+                if instruments is not None and 'FinInstrmTp' not in wanted:
+                    wanted.append('FinInstrmTp')
+
+                dtype = {}
+                for c in wanted:
+                    if c in self.STR_COLUMNS:
+                        dtype[by_name[c]] = str
+                    elif c in self.PRICE_COLUMNS:
+                        dtype[by_name[c]] = price_dtype
+
+                with self._stage('csv parse', source=source, engine=self.csv_engine) as stage:
+                    usecols = [by_name[c] for c in wanted]
+                    if arrow:
+                        df = self._read_csv_arrow(z.read(csv_files[0]), usecols, dtype, instruments)
+                    else:
+                        with z.open(csv_files[0]) as f:
+                            df = self._read_csv_pandas(f, usecols, dtype, instruments)
+                    stage['rows'] = len(df)
+
+                with self._stage('normalization', source=source) as stage:
+                    if columns is not None:
+                        df = df[[c for c in columns if c in df.columns]]
+
+                    # Integer counts, int32 when every value fits; columns
+                    # with gaps come back as float and stay float
+                    for c in self.INT_COLUMNS:
+                        if c not in df.columns:
+                            continue
+                        values = df[c].to_numpy()
+                        if values.dtype.kind == 'f' and not (
+                                np.isfinite(values).all() and (values == np.round(values)).all()):
+                            continue
+                        df[c] = values.astype(self._int_dtype(values))
+
+                    if 'StrkPric' in df.columns:
+                        pos = df.columns.get_loc('StrkPric')
+                        df.insert(pos, 'Strike_Ticks', self.strike_ticks(df.pop('StrkPric')))
+
+                    for c in self.STR_COLUMNS:
+                        if c in df.columns:
+                            df[c] = df[c].astype('category')
+
+                    # Convert Expiry to datetime for sorting
+                    if 'XpryDt' in df.columns:
+                        df['XpryDt_Date'] = self.parse_expiry_dates(df['XpryDt'], source=zip_path)
+                    stage['rows'] = len(df)
+
                 return df
         except Exception as e:
             print(f"Error loading {zip_path}: {e}")
             return None
 
+    def _read_csv_pandas(self, f, usecols, dtype, instruments=None):
+        """
+        The CSV read in chunks with pandas, string columns stripped and rows
+        filtered.
+
+        String columns are parsed as categoricals, so stripping works on each
+        chunk's distinct values rather than every row, and rows are filtered
+        on FinInstrmTp before the other columns are stripped.
+        """
+        dtype = {c: 'category' if t is str else t for c, t in dtype.items()}
+        chunks = []
+        reader = pd.read_csv(f, usecols=usecols, dtype=dtype, chunksize=self.CHUNK_ROWS)
+        for chunk in reader:
+            # Standardize columns (strip whitespace)
+            chunk.columns = chunk.columns.str.strip()
+
+            if instruments is not None:
+                types = pd.Series(self._strip_categorical(chunk['FinInstrmTp']))
+                chunk = chunk[types.isin(instruments).to_numpy()]
+
+            # Strip string columns
+            for c in self.STR_COLUMNS:
+                if c in chunk.columns:
+                    chunk[c] = self._strip_categorical(chunk[c])
+            chunks.append(chunk)
+        return pd.concat(chunks, ignore_index=True)
+
+    @staticmethod
+    def _strip_categorical(values):
+        """
+        values.astype(str).str.strip() for a categorical Series, as an object
+        array: the categories are stripped once and taken by code, with
+        missing values as 'nan'.
+        """
+        categories = values.cat.categories.astype(str).str.strip().to_numpy(dtype=object)
+        return np.append(categories, 'nan')[values.cat.codes.to_numpy()]
+
+    def _read_csv_arrow(self, data, usecols, dtype, instruments=None):
+        """
+        The CSV bytes parsed with pyarrow.csv, giving the same frame as
+        _read_csv_pandas.
+
+        Arrow parses blocks of the buffer on its own thread pool (outside the
+        GIL), and stripping and the FinInstrmTp filter run as Arrow compute
+        kernels before anything is converted. String columns are dictionary
+        encoded so they reach pandas as categoricals instead of one Python
+        string per row, and numeric columns are handed over without a copy
+        where their layout allows it.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.csv as pacsv
+
+        types = {c: pa.string() if t is str else pa.from_numpy_dtype(np.dtype(t)) for c, t in dtype.items()}
+        if not data.endswith(b'\n'):
+            # Arrow cannot parse an unterminated header line (a file without rows)
+            data += b'\n'
+        table = pacsv.read_csv(
+            pa.BufferReader(data),
+            read_options=pacsv.ReadOptions(use_threads=True),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=usecols, column_types=types, strings_can_be_null=True),
+        )
+        table = table.rename_columns([str(c).strip() for c in table.column_names])
+
+        for i, name in enumerate(table.column_names):
+            column = table.column(i)
+            if name in self.STR_COLUMNS:
+                # Stripped, with missing values as 'nan' like astype(str)
+                column = pc.fill_null(pc.utf8_trim_whitespace(column), 'nan')
+            elif pa.types.is_null(column.type):
+                # An empty column, which pandas reads as float NaN (object
+                # when the file has no rows)
+                column = column.cast(pa.float64() if table.num_rows else pa.string())
+            elif pa.types.is_temporal(column.type):
+                # Arrow infers ISO dates (e.g. TradDt), pandas keeps the text
+                column = column.cast(pa.string())
+            else:
+                continue
+            table = table.set_column(i, name, column)
+
+        if instruments is not None:
+            keep = pc.is_in(table.column('FinInstrmTp'), value_set=pa.array(list(instruments), pa.string()))
+            table = table.filter(keep)
+
+        for i, name in enumerate(table.column_names):
+            if name in self.STR_COLUMNS:
+                table = table.set_column(i, name, pc.dictionary_encode(table.column(i)))
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+
+        # Categories in sorted order, as astype('category') gives them
+        for c in df.columns:
+            if isinstance(df[c].dtype, pd.CategoricalDtype):
+                df[c] = df[c].cat.reorder_categories(sorted(df[c].cat.categories))
+        return df
+
+    def load_days(self, today_file, yesterday_file, columns=SCAN_COLUMNS, instruments=SCAN_INSTRUMENTS):
+        """
+        (today, yesterday) frames of load_bhav_copy. yesterday_file may be
+        None to load only today's copy.
+
+        With the 'arrow' engine the two copies are loaded concurrently:
+        decompression and the Arrow CSV parser release the GIL, so they
+        parse in parallel on a multi-core machine. They are loaded one after
+        the other with the 'pandas' engine (whose parser holds the GIL) and
+        when the profile tracks memory, whose per-stage peaks would
+        otherwise mix both loads.
+        """
+        if yesterday_file is None:
+            return self.load_bhav_copy(today_file, columns, instruments), None
+        if self.csv_engine != 'arrow' or (self.profile is not None and self.profile.track_memory):
+            return (self.load_bhav_copy(today_file, columns, instruments),
+                    self.load_bhav_copy(yesterday_file, columns, instruments))
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            today = pool.submit(self.load_bhav_copy, today_file, columns, instruments)
+            yest = pool.submit(self.load_bhav_copy, yesterday_file, columns, instruments)
+            return today.result(), yest.result()
+
+    @staticmethod
+    def python_round(values, decimals=2):
+        """
+        A float Series rounded like Python's round(v, decimals) on each value,
+        which rounds the exact binary value. Series.round scales by
+        10**decimals first and so can land on the other side of a half cent
+        (95.325 -> 95.32 vs 95.33). Only values that close to a half are
+        rounded one by one.
+        """
+        out = values.round(decimals)
+        scaled = values.to_numpy(dtype=float) * 10.0 ** decimals
+        near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+        if near_half.any():
+            out[near_half] = [round(v, decimals) for v in values[near_half].tolist()]
+        return out
+
+    @staticmethod
+    def _int_dtype(values):
+        info = np.iinfo(np.int32)
+        if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+            return np.int32
+        return np.int64
+
+    def strike_ticks(self, strikes):
+        """
+        Strike prices as integer ticks (strike * STRIKE_SCALE, int32 when
+        they fit). Missing strikes (futures rows) become NO_STRIKE.
+        """
+        values = pd.to_numeric(pd.Series(np.asarray(strikes)), errors='coerce').to_numpy(dtype=float)
+        ticks = np.round(values * self.STRIKE_SCALE)
+        ticks[~np.isfinite(ticks)] = self.NO_STRIKE
+        return ticks.astype(self._int_dtype(ticks))
+
+    def strike_values(self, ticks):
+        """Strike prices in rupees from Strike_Ticks (NaN for NO_STRIKE)."""
+        ticks = np.asarray(ticks)
+        return np.where(ticks == self.NO_STRIKE, np.nan, ticks / self.STRIKE_SCALE)
+
+    def parse_expiry_dates(self, expiry, source=None):
+        """
+        Parses XpryDt strings into datetimes.
+
+        A bhav copy has only a handful of distinct expiry strings, so each
+        distinct value is parsed once (trying EXPIRY_FORMATS in order, e.g.
+        2026-01-29 or 29-Jan-2026) and the result is mapped back to the rows
+        through categorical codes. Values in no known format become NaT and
+        are reported.
+        """
+        expiry = pd.Series(expiry)
+        if not isinstance(expiry.dtype, pd.CategoricalDtype):
+            expiry = expiry.astype('category')
+        values = expiry.cat.categories.astype(str)
+
+        parsed = pd.Series(pd.NaT, index=range(len(values)), dtype='datetime64[ns]')
+        for fmt in self.EXPIRY_FORMATS:
+            todo = parsed.isna().to_numpy()
+            if not todo.any():
+                break
+            parsed[todo] = pd.to_datetime(values[todo], format=fmt, errors='coerce')
+
+        unknown = [v for v, ok in zip(values, parsed.notna()) if not ok and v.strip() not in ('', 'nan', '-')]
+        if unknown:
+            where = f" in {source}" if source is not None else ""
+            print(f"Unrecognised expiry format{where}: {', '.join(unknown[:5])}"
+                  f"{' ...' if len(unknown) > 5 else ''} ({len(unknown)} values set to NaT)")
+
+        codes = expiry.cat.codes.to_numpy()
+        dates = parsed.to_numpy()
+        result = np.full(len(codes), np.datetime64('NaT'), dtype='datetime64[ns]')
+        valid = codes >= 0
+        result[valid] = dates[codes[valid]]
+        return pd.Series(result, index=expiry.index, name='XpryDt_Date')
+
     def calculate_camarilla(self, high, low, close):
-        """Calculates Camarilla pivots."""
+        """Calculates Camarilla pivots for a single high/low/close."""
+        levels = self.calculate_camarilla_levels([high], [low], [close])
+        return {k: levels[k].iloc[0] for k in self.LEVELS}
+
+    def calculate_camarilla_levels(self, high, low, close):
+        """
+        Calculates Camarilla pivots for whole columns.
+
+        high, low and close are array-likes or Series of equal length.
+        Returns a DataFrame with columns H4..H1, L1..L4 (indexed like close
+        when it is a Series). Rows where high == low get every level equal
+        to close; rows with missing prices give NaN levels.
+        """
+        index = close.index if isinstance(close, pd.Series) else None
+        high = pd.to_numeric(pd.Series(np.asarray(high)), errors='coerce').to_numpy(dtype=float)
+        low = pd.to_numeric(pd.Series(np.asarray(low)), errors='coerce').to_numpy(dtype=float)
+        close = pd.to_numeric(pd.Series(np.asarray(close)), errors='coerce').to_numpy(dtype=float)
         r = high - low
-        
-        # Avoid zero range division or issues if high==low
-        if r == 0:
-            return {
-                'H4': close, 'H3': close, 'H2': close, 'H1': close,
-                'L1': close, 'L2': close, 'L3': close, 'L4': close
-            }
+
+        # Avoid zero range issues if high == low
+        flat = r == 0
 
         data = {}
         data['H4'] = close + (r * 1.1 / 2)
@@ -60,49 +462,605 @@ class CamarillaScanner:
         data['L2'] = close - (r * 1.1 / 6)
         data['L3'] = close - (r * 1.1 / 4)
         data['L4'] = close - (r * 1.1 / 2)
-        return data
+        for k in data:
+            data[k] = np.where(flat, close, data[k])
+        return pd.DataFrame(data, index=index)
+
+    def camarilla_flags(self, today_levels, yest_levels, has_yest=None, columns=None):
+        """
+        Evaluates the scan conditions (self.conditions) for whole columns,
+        one vectorized pass per condition.
+
+        today_levels and yest_levels are frames from calculate_camarilla_levels;
+        they are available to the conditions as Today_H4..Today_L4 and
+        Yest_H4..Yest_L4. columns optionally maps further names (OHLC, OI)
+        to arrays. has_yest is an optional boolean mask of rows that have
+        yesterday's data; rows without it are False for every condition
+        that uses a Yest_ column.
+        Returns a DataFrame with one boolean column per condition; the
+        built-in ones are
+          Is_Inside_Camarilla  Today H4 < Yest H3 and Today L4 > Yest L3
+          Is_Inside_H4_L4      Today H4 < Yest H4 and Today L4 > Yest L4
+          Is_Higher_Value      Today L4 > Yest H4
+          Is_Lower_Value       Today H4 < Yest L4
+        """
+        namespace = dict(columns or {})
+        for k in self.LEVELS:
+            namespace[f'Today_{k}'] = today_levels[k].to_numpy()
+            namespace[f'Yest_{k}'] = yest_levels[k].to_numpy()
+
+        if has_yest is None:
+            has_yest = ~np.isnan(namespace['Yest_H4'])
+        has_yest = np.asarray(has_yest, dtype=bool)
+
+        flags = evaluate_conditions(self.conditions, namespace, len(today_levels), has_yest)
+        return pd.DataFrame(flags, index=today_levels.index)
 
     def get_atm_strike(self, spot_price, available_strikes):
-        """Returns the strike price closest to the spot price."""
+        """
+        Returns the strike price closest to the spot price.
+        When the spot is exactly half-way between two strikes the lower
+        strike is returned (same rule as resolve_atm_strikes).
+        """
         if len(available_strikes) == 0:
             return None
-        # Find strike with minimum absolute difference
-        return min(available_strikes, key=lambda x: abs(x - spot_price))
+        # Find strike with minimum absolute difference; min() keeps the first
+        # of equal keys, so sorting first makes ties go to the lower strike
+        return min(sorted(available_strikes), key=lambda x: abs(x - spot_price))
+
+    def resolve_atm_strikes(self, strikes, spots, keys, k=0):
+        """
+        Finds the ATM strike for every group at once by binary search.
+
+        strikes: DataFrame with the key columns and a float 'Strike' column
+                 (one row per listed contract; duplicates are fine).
+        spots:   DataFrame with the key columns and 'Spot_Close', one row per
+                 group to resolve. Extra columns are carried through.
+        keys:    the grouping columns, e.g. ['TckrSymb', 'XpryDt'].
+        k:       number of neighbouring strikes to return on each side.
+
+        Strikes are de-duplicated and sorted per group, and each spot is
+        located with one np.searchsorted call over all groups. The nearest of
+        the two bracketing strikes is the ATM strike; on an exact tie the
+        lower strike wins. Returns one row per spot row and offset in
+        -k..k that exists in the chain, in spot row order then offset, with
+        columns from spots plus 'ATM_Strike', 'Strike_Offset' and 'Strike'.
+        """
+        spots = spots[spots['Spot_Close'].notna()].reset_index(drop=True)
+        out_cols = list(spots.columns) + ['ATM_Strike', 'Strike_Offset', 'Strike']
+        if spots.empty:
+            return pd.DataFrame(columns=out_cols)
+
+        # Sorted, unique strikes per group, with groups numbered in spot order
+        group = spots[keys].drop_duplicates().reset_index(drop=True)
+        group['_g'] = np.arange(len(group))
+        listed = strikes[keys + ['Strike']].dropna(subset=['Strike']).drop_duplicates()
+        listed = listed.merge(group, on=keys, how='inner')
+        g = listed['_g'].to_numpy()
+        strike = listed['Strike'].to_numpy(dtype=float)
+        order = np.lexsort((strike, g))
+        g = g[order]
+        strike = strike[order]
+
+        n_groups = len(group)
+        starts = np.searchsorted(g, np.arange(n_groups), side='left')
+        ends = np.searchsorted(g, np.arange(n_groups), side='right')
+
+        spot_g = spots[keys].merge(group, on=keys, how='left')['_g'].to_numpy()
+        spot = spots['Spot_Close'].to_numpy(dtype=float)
+
+        # One search over every group: shift each group into its own band of
+        # the number line so a single sorted array covers all of them
+        lo = min(strike.min(), spot.min()) if len(strike) else spot.min()
+        hi = max(strike.max(), spot.max()) if len(strike) else spot.max()
+        band = (hi - lo) * 2 + 1
+        pos = np.searchsorted(g * band + (strike - lo), spot_g * band + (spot - lo))
 
-    def process_data(self, today_file, yesterday_file):
+        first = starts[spot_g]
+        last = ends[spot_g]
+        has_chain = last > first
+        pos = np.clip(pos, first, np.maximum(last - 1, first))
+        left = np.maximum(pos - 1, first)
+        if len(strike):
+            d_left = np.abs(strike[np.minimum(left, len(strike) - 1)] - spot)
+            d_pos = np.abs(strike[np.minimum(pos, len(strike) - 1)] - spot)
+        else:
+            d_left = d_pos = np.zeros(len(spot))
+        atm_pos = np.where(d_pos < d_left, pos, left)
+
+        # Neighbours -k..k around the ATM position, kept inside each group
+        offsets = np.arange(-k, k + 1)
+        rows = np.repeat(np.flatnonzero(has_chain), len(offsets))
+        offs = np.tile(offsets, int(has_chain.sum()))
+        idx = atm_pos[rows] + offs
+        valid = (idx >= first[rows]) & (idx < last[rows])
+        rows, offs, idx = rows[valid], offs[valid], idx[valid]
+
+        result = spots.iloc[rows].reset_index(drop=True)
+        result['ATM_Strike'] = strike[atm_pos[rows]]
+        result['Strike_Offset'] = offs
+        result['Strike'] = strike[idx]
+        return result[out_cols]
+
+    def process_data(self, today_file, yesterday_file, engine='vectorized'):
+        """
+        Scans today's ATM options against yesterday's Camarilla levels.
+
+        engine='vectorized' (default) runs the groupby/merge scan over stock
+        and index derivatives.
+        engine='loop' runs the original per-symbol loop; it is kept as a
+        reference implementation so the two outputs can be diffed. It only
+        covers stock futures and options.
+        """
         print(f"Processing Today: {today_file}")
         print(f"Processing Yesterday: {yesterday_file}")
 
-        df_today = self.load_bhav_copy(today_file)
-        df_yest = self.load_bhav_copy(yesterday_file)
+        yest_lookup = self._history_lookup(yesterday_file) if engine == 'vectorized' else None
+        df_today, df_yest = self.load_days(today_file, yesterday_file if yest_lookup is None else None)
+
+        if df_today is None or (df_yest is None and yest_lookup is None):
+            return None
+
+        result = self.scan_frames(df_today, df_yest, engine=engine, yest_lookup=yest_lookup)
+        if df_yest is not None:
+            self._record_history(yesterday_file, df_yest)
+        self._record_history(today_file, df_today, result)
+        return result
+
+    def process_chain(self, today_file, yesterday_file, strikes=CHAIN_STRIKES, expiries=CHAIN_EXPIRIES):
+        """
+        Chain scan: the four conditions for ATM-strikes..ATM+strikes on the
+        nearest `expiries` option expiries of every symbol (see scan_chain).
+        """
+        print(f"Processing Today: {today_file}")
+        print(f"Processing Yesterday: {yesterday_file}")
+
+        df_today, df_yest = self.load_days(today_file, yesterday_file)
 
         if df_today is None or df_yest is None:
             return None
 
-        # 1. Processing Yesterday's Data for Lookups
-        yest_opts = df_yest[df_yest['FinInstrmTp'] == 'STO'].copy()
-        
-        # Create a dictionary for fast lookup: (Symbol, Strike, OptType) -> Data
-        # Key by (Symbol, Strike, OptType, ExpiryDateString)
-        
-        print("Indexing Yesterday's data...")
-        yest_lookup = {}
-        for idx, row in yest_opts.iterrows():
-            key = (row['TckrSymb'], float(row['StrkPric']), row['OptnTp'], row['XpryDt'])
-            yest_lookup[key] = {
-                'Open': row['OpnPric'],
-                'High': row['HghPric'],
-                'Low': row['LwPric'],
-                'Close': row['ClsPric']
+        return self.scan_chain(df_today, df_yest, strikes, expiries)
+
+    def scan_frames(self, df_today, df_yest, engine='vectorized', yest_lookup=None):
+        """
+        Runs the scan on two already loaded bhav copy frames. With the
+        vectorized engine, yesterday can instead be given as yest_lookup
+        (HistoryStore.ohlc_lookup), in which case df_yest may be None.
+        """
+        if engine == 'vectorized':
+            return self._scan_vectorized(df_today, df_yest, yest_lookup)
+        if engine == 'loop':
+            return self._scan_loop(df_today, df_yest)
+        raise ValueError(f"Unknown engine: {engine!r}")
+
+    def diff_engines(self, today_file, yesterday_file):
+        """
+        Runs both engines on the same pair of files and returns the cells
+        that differ as a DataFrame (Row, Column, Loop, Vectorized).
+        An empty frame means the outputs match. Only stock derivatives and
+        the built-in conditions are compared, since the loop engine does not
+        scan index chains or evaluate extra conditions.
+        """
+        stocks = ['STF', 'STO']
+        df_today, df_yest = self.load_days(today_file, yesterday_file)
+        if df_today is None or df_yest is None:
+            return None
+        df_today = df_today[df_today['FinInstrmTp'].isin(stocks)]
+        df_yest = df_yest[df_yest['FinInstrmTp'].isin(stocks)]
+
+        ref = self._scan_loop(df_today, df_yest)
+        vec = self._scan_vectorized(df_today, df_yest)
+        extra = [c.name for c in self.conditions[len(DEFAULT_CONDITIONS):]]
+        vec = vec.drop(columns=extra)
+
+        diffs = []
+        if list(ref.columns) != list(vec.columns):
+            diffs.append({'Row': None, 'Column': '<columns>',
+                          'Loop': list(ref.columns), 'Vectorized': list(vec.columns)})
+        if len(ref) != len(vec):
+            diffs.append({'Row': None, 'Column': '<rows>',
+                          'Loop': len(ref), 'Vectorized': len(vec)})
+        if diffs:
+            return pd.DataFrame(diffs)
+
+        for col in ref.columns:
+            a = ref[col].to_numpy()
+            b = vec[col].to_numpy()
+            if ref[col].dtype.kind == 'f' and vec[col].dtype.kind == 'f':
+                same = np.isclose(a, b, rtol=0, atol=1e-9, equal_nan=True)
+            else:
+                same = (a == b) | (pd.isna(a) & pd.isna(b))
+            for i in np.flatnonzero(~same):
+                diffs.append({'Row': int(i), 'Column': col, 'Loop': a[i], 'Vectorized': b[i]})
+        return pd.DataFrame(diffs, columns=['Row', 'Column', 'Loop', 'Vectorized'])
+
+    def _scan_vectorized(self, df_today, df_yest, yest_lookup=None):
+        """
+        Whole-market scan in a few groupby/merge passes:
+        nearest-expiry future per symbol, option chain join on
+        symbol+expiry, ATM pick, CE/PE selection and yesterday join.
+        For stock derivatives it produces the same rows, order and columns
+        as _scan_loop. Index options are scanned on their nearest (weekly)
+        expiry, with the index price of their option rows as the spot (see
+        _index_spot).
+        """
+        with self._stage('symbol resolution') as stage:
+            today_futs = df_today[df_today['FinInstrmTp'].isin(self.FUTURE_TYPES)]
+            today_opts = df_today[df_today['FinInstrmTp'].isin(self.OPTION_TYPES)]
+            print(f"Found {today_futs['TckrSymb'].nunique()} underlyings in Futures.")
+
+            # 1. Nearest expiry future per symbol, and the option expiry to
+            #    scan (the nearest weekly one for index options)
+            nearest = self._nearest_futures(today_futs)
+            if nearest.empty or today_opts.empty:
+                return pd.DataFrame()
+            nearest = self._weekly_option_expiry(nearest, today_opts)
+            nearest = self._index_spot(nearest, today_opts)
+
+            # 2. Option chain for the same symbol and expiry
+            opt_cols = ['TckrSymb', 'XpryDt', 'Strike_Ticks', 'OptnTp',
+                        'OpnPric', 'HghPric', 'LwPric', 'ClsPric',
+                        'OpnIntrst', 'ChngInOpnIntrst', 'TtlTradgVol', 'TtlNbOfTxsExctd']
+            chain = today_opts[opt_cols].merge(nearest, on=['TckrSymb', 'XpryDt'], how='inner')
+            if chain.empty:
+                return pd.DataFrame()
+            chain['Strike'] = self.strike_values(chain['Strike_Ticks'])
+
+            # 3. ATM strike per symbol by binary search over the sorted chain
+            atm = self.resolve_atm_strikes(chain, nearest, ['TckrSymb', 'XpryDt'])
+            chain = chain.merge(atm[['_sym_order', 'ATM_Strike']], on='_sym_order', how='inner')
+
+            # 4. CE and PE rows at the ATM strike, first one per symbol/type
+            picked = chain[(chain['Strike'] == chain['ATM_Strike']) &
+                           chain['OptnTp'].isin(['CE', 'PE'])]
+            picked = picked.drop_duplicates(subset=['_sym_order', 'OptnTp'], keep='first')
+            picked = picked.assign(_type_order=(picked['OptnTp'] == 'PE').astype(int))
+            picked = picked.sort_values(['_sym_order', '_type_order'], kind='stable')
+            picked = picked.reset_index(drop=True)
+            stage['rows'] = len(picked)
+        if picked.empty:
+            return pd.DataFrame()
+
+        # 5. Yesterday's levels for the same contracts and the conditions
+        today_levels, yest_levels, flags, has_yest = self._levels_against_yesterday(picked, df_yest, yest_lookup)
+
+        # 6. Output
+        with self._stage('result assembly') as stage:
+            out = pd.DataFrame({
+                'Symbol': picked['TckrSymb'].astype(object),
+                'Expiry': picked['XpryDt'].astype(object),
+                'Spot_Close': picked['Spot_Close'],
+                'ATM_Strike': picked['ATM_Strike'],
+                'Option_Type': picked['OptnTp'].astype(object),
+                'Today_Open': picked['OpnPric'],
+                'Today_High': picked['HghPric'],
+                'Today_Low': picked['LwPric'],
+                'Today_Close': picked['ClsPric'],
+                **{name: flags[name] for name in flags.columns},
+                'OpnIntrst': picked['OpnIntrst'],
+                'ChngInOpnIntrst': picked['ChngInOpnIntrst'],
+                'TtlTradgVol': picked['TtlTradgVol'],
+                'TtlNbOfTxsExctd': picked['TtlNbOfTxsExctd'],
+            })
+            for k in self.LEVELS:
+                out[f'Today_{k}'] = today_levels[k].round(2)
+            if has_yest.any():
+                for k in self.LEVELS:
+                    # Python's round(), as the original engine rounded
+                    # yesterday's levels
+                    out[f'Yest_{k}'] = self.python_round(yest_levels[k].where(has_yest), 2)
+            stage['rows'] = len(out)
+        return out
+
+    def scan_chain(self, df_today, df_yest, strikes=CHAIN_STRIKES, expiries=CHAIN_EXPIRIES, yest_lookup=None):
+        """
+        Scans a band of strikes on several expiries instead of the ATM only.
+
+        For every symbol the spot is the close of its nearest-expiry future,
+        or for index underlyings the index price (as in the ATM scan). Its option expiries are ranked by date
+        (Expiry_Rank 1 = nearest) and the first `expiries` are kept; on
+        each, the ATM strike is resolved against that expiry's own chain and
+        the `strikes` listed strikes on either side are scanned too.
+
+        Returns one row per contract with the ATM scan columns plus
+        Expiry_Rank, Strike, Strike_Offset (listed strikes away from the
+        ATM, negative below it) and Moneyness (ATM, ITM or OTM for that
+        option type). Rows are ordered by symbol, expiry rank, offset and
+        CE before PE. yest_lookup works as in scan_frames.
+        """
+        with self._stage('symbol resolution') as stage:
+            today_futs = df_today[df_today['FinInstrmTp'].isin(self.FUTURE_TYPES)]
+            today_opts = df_today[df_today['FinInstrmTp'].isin(self.OPTION_TYPES)]
+            print(f"Found {today_futs['TckrSymb'].nunique()} underlyings in Futures.")
+
+            nearest = self._nearest_futures(today_futs)
+            if nearest.empty or today_opts.empty:
+                return pd.DataFrame()
+            nearest = self._index_spot(nearest, today_opts)
+
+            # Option expiries per symbol, ranked by date
+            opt_cols = ['TckrSymb', 'XpryDt', 'XpryDt_Date', 'Strike_Ticks', 'OptnTp',
+                        'OpnPric', 'HghPric', 'LwPric', 'ClsPric',
+                        'OpnIntrst', 'ChngInOpnIntrst', 'TtlTradgVol', 'TtlNbOfTxsExctd']
+            opts = today_opts[opt_cols].dropna(subset=['XpryDt_Date'])
+            listed = opts[['TckrSymb', 'XpryDt', 'XpryDt_Date']].drop_duplicates()
+            listed = listed.merge(nearest[['TckrSymb', 'Spot_Close', '_sym_order']], on='TckrSymb', how='inner')
+            listed = listed.sort_values(['_sym_order', 'XpryDt_Date'], kind='stable')
+            listed['Expiry_Rank'] = listed.groupby('_sym_order').cumcount() + 1
+            listed = listed[listed['Expiry_Rank'] <= expiries]
+
+            # Strike band around the ATM of each (symbol, expiry) chain
+            chain = opts.merge(listed[['TckrSymb', 'XpryDt']], on=['TckrSymb', 'XpryDt'], how='inner')
+            chain['Strike'] = self.strike_values(chain['Strike_Ticks'])
+            band = self.resolve_atm_strikes(
+                chain, listed[['TckrSymb', 'XpryDt', 'Spot_Close', '_sym_order', 'Expiry_Rank']],
+                ['TckrSymb', 'XpryDt'], k=strikes,
+            )
+
+            # CE and PE contracts at every strike in the band
+            picked = chain[chain['OptnTp'].isin(['CE', 'PE'])].drop(columns=['XpryDt_Date'])
+            picked = picked.merge(band, on=['TckrSymb', 'XpryDt', 'Strike'], how='inner')
+            picked = picked.drop_duplicates(subset=['_sym_order', 'Expiry_Rank', 'Strike_Offset', 'OptnTp'],
+                                            keep='first')
+            picked = picked.assign(_type_order=(picked['OptnTp'] == 'PE').astype(int))
+            picked = picked.sort_values(['_sym_order', 'Expiry_Rank', 'Strike_Offset', '_type_order'],
+                                        kind='stable')
+            picked = picked.reset_index(drop=True)
+            stage['rows'] = len(picked)
+        if picked.empty:
+            return pd.DataFrame()
+
+        today_levels, yest_levels, flags, has_yest = self._levels_against_yesterday(picked, df_yest, yest_lookup)
+
+        with self._stage('result assembly') as stage:
+            is_call = (picked['OptnTp'] == 'CE').to_numpy()
+            below = (picked['Strike'] < picked['Spot_Close']).to_numpy()
+            moneyness = np.where(picked['Strike_Offset'].to_numpy() == 0, 'ATM',
+                                 np.where(is_call == below, 'ITM', 'OTM'))
+            out = pd.DataFrame({
+                'Symbol': picked['TckrSymb'].astype(object),
+                'Expiry': picked['XpryDt'].astype(object),
+                'Expiry_Rank': picked['Expiry_Rank'],
+                'Spot_Close': picked['Spot_Close'],
+                'ATM_Strike': picked['ATM_Strike'],
+                'Strike': picked['Strike'],
+                'Strike_Offset': picked['Strike_Offset'],
+                'Moneyness': moneyness,
+                'Option_Type': picked['OptnTp'].astype(object),
+                'Today_Open': picked['OpnPric'],
+                'Today_High': picked['HghPric'],
+                'Today_Low': picked['LwPric'],
+                'Today_Close': picked['ClsPric'],
+                **{name: flags[name] for name in flags.columns},
+                'OpnIntrst': picked['OpnIntrst'],
+                'ChngInOpnIntrst': picked['ChngInOpnIntrst'],
+                'TtlTradgVol': picked['TtlTradgVol'],
+                'TtlNbOfTxsExctd': picked['TtlNbOfTxsExctd'],
+            })
+            for k in self.LEVELS:
+                out[f'Today_{k}'] = today_levels[k].round(2)
+            if has_yest.any():
+                for k in self.LEVELS:
+                    # Python's round(), as the original engine rounded
+                    # yesterday's levels
+                    out[f'Yest_{k}'] = self.python_round(yest_levels[k].where(has_yest), 2)
+            stage['rows'] = len(out)
+        return out
+
+    def _nearest_futures(self, futs):
+        """
+        The nearest-expiry future of every symbol (the first row at its
+        minimum expiry), symbols in order of first appearance. Returns
+        FinInstrmTp, TckrSymb, XpryDt, Spot_Close (the future's close) and
+        _sym_order.
+        """
+        futs = futs.dropna(subset=['XpryDt_Date'])
+        if futs.empty:
+            return pd.DataFrame(columns=['FinInstrmTp', 'TckrSymb', 'XpryDt', 'Spot_Close', '_sym_order'])
+        nearest_idx = futs.groupby('TckrSymb', sort=False, observed=True)['XpryDt_Date'].idxmin()
+        nearest = futs.loc[nearest_idx.to_numpy(), ['FinInstrmTp', 'TckrSymb', 'XpryDt', 'ClsPric']]
+        nearest = nearest.rename(columns={'ClsPric': 'Spot_Close'})
+        nearest['_sym_order'] = np.arange(len(nearest))
+        return nearest
+
+    def _weekly_option_expiry(self, nearest, opts):
+        """
+        For underlyings in WEEKLY_TYPES, replaces the nearest future's
+        expiry with the nearest expiry listed in their option chain (index
+        futures are monthly, their options also weekly). Other rows are
+        returned unchanged.
+        """
+        weekly = nearest['FinInstrmTp'].isin(self.WEEKLY_TYPES).to_numpy()
+        if not weekly.any():
+            return nearest
+        opts = opts[opts['TckrSymb'].isin(nearest['TckrSymb'][weekly])].dropna(subset=['XpryDt_Date'])
+        if opts.empty:
+            return nearest
+        first_idx = opts.groupby('TckrSymb', sort=False, observed=True)['XpryDt_Date'].idxmin()
+        first = opts.loc[first_idx.to_numpy(), ['TckrSymb', 'XpryDt']]
+        first = first.rename(columns={'XpryDt': '_opt_xpry'})
+
+        nearest = nearest.merge(first, on='TckrSymb', how='left')
+        use = weekly & nearest['_opt_xpry'].notna().to_numpy()
+        nearest['XpryDt'] = nearest['XpryDt'].where(~use, nearest['_opt_xpry'])
+        return nearest.drop(columns=['_opt_xpry'])
+
+    def _index_spot(self, nearest, opts):
+        """
+        For underlyings in WEEKLY_TYPES, replaces Spot_Close (the monthly
+        future's close, which includes carry and can put the ATM a strike or
+        two off on a weekly chain) with the underlying price reported on
+        their option rows (UndrlygPric). Rows without one, and bhav copies
+        without the column, keep the future's close.
+        """
+        weekly = nearest['FinInstrmTp'].isin(self.WEEKLY_TYPES).to_numpy()
+        if not weekly.any() or 'UndrlygPric' not in opts.columns:
+            return nearest
+        opts = opts[opts['TckrSymb'].isin(nearest['TckrSymb'][weekly]) & (opts['UndrlygPric'] > 0)]
+        if opts.empty:
+            return nearest
+        spots = opts.groupby('TckrSymb', sort=False, observed=True)['UndrlygPric'].first()
+        spots = spots.rename('_spot').reset_index()
+
+        nearest = nearest.merge(spots, on='TckrSymb', how='left')
+        use = weekly & nearest['_spot'].notna().to_numpy()
+        nearest['Spot_Close'] = nearest['Spot_Close'].where(~use, nearest['_spot'])
+        return nearest.drop(columns=['_spot'])
+
+    def _levels_against_yesterday(self, picked, df_yest, yest_lookup=None):
+        """
+        Looks up yesterday's OHLC for the picked contracts (keyed join on
+        CONTRACT_KEY) and evaluates the
+        conditions. yest_lookup is an already indexed yesterday (as from
+        _index_yesterday); otherwise it is built from df_yest.
+        Returns (today_levels, yest_levels, flags, has_yest).
+        """
+        with self._stage('yesterday indexing') as stage:
+            if yest_lookup is None:
+                yest_lookup = self._index_yesterday(
+                    df_yest, picked['TckrSymb'].unique(), picked['XpryDt'].unique()
+                )
+            wanted = pd.MultiIndex.from_frame(picked[self.CONTRACT_KEY])
+            yest = yest_lookup.reindex(wanted)
+            has_yest = wanted.isin(yest_lookup.index)
+            stage['rows'] = len(yest_lookup)
+
+        with self._stage('level computation') as stage:
+            today_levels = self.calculate_camarilla_levels(picked['HghPric'], picked['LwPric'], picked['ClsPric'])
+            yest_levels = self.calculate_camarilla_levels(
+                yest['High'].to_numpy(), yest['Low'].to_numpy(), yest['Close'].to_numpy()
+            )
+            columns = {
+                'Spot_Close': picked['Spot_Close'].to_numpy(),
+                'ATM_Strike': picked['ATM_Strike'].to_numpy(),
+                'Today_Open': picked['OpnPric'].to_numpy(),
+                'Today_High': picked['HghPric'].to_numpy(),
+                'Today_Low': picked['LwPric'].to_numpy(),
+                'Today_Close': picked['ClsPric'].to_numpy(),
+                'Yest_Open': yest['Open'].to_numpy(),
+                'Yest_High': yest['High'].to_numpy(),
+                'Yest_Low': yest['Low'].to_numpy(),
+                'Yest_Close': yest['Close'].to_numpy(),
             }
+            for c in ['OpnIntrst', 'ChngInOpnIntrst', 'TtlTradgVol', 'TtlNbOfTxsExctd']:
+                columns[c] = picked[c].to_numpy()
+            flags = self.camarilla_flags(today_levels, yest_levels, has_yest, columns)
+            stage['rows'] = len(picked)
+        return today_levels, yest_levels, flags, has_yest
 
-        # 2. Process Today's Data
-        # Filter FUTSTK for Underlying Close
-        # 2. Process Today's Data
+    def contract_history(self, df):
+        """
+        Per-contract rows of a loaded bhav copy for the history store: every
+        option contract with its OHLC, OI and volume and its Camarilla
+        levels, keyed on CONTRACT_KEY (duplicate keys keep the last row).
+        """
+        opts = df[df['FinInstrmTp'].isin(self.OPTION_TYPES)]
+        out = pd.DataFrame({
+            'FinInstrmTp': opts['FinInstrmTp'].to_numpy(),
+            'TckrSymb': opts['TckrSymb'].to_numpy(),
+            'Strike': self.strike_values(opts['Strike_Ticks']),
+            'Strike_Ticks': opts['Strike_Ticks'].to_numpy(),
+            'OptnTp': opts['OptnTp'].to_numpy(),
+            'XpryDt': opts['XpryDt'].to_numpy(),
+            'XpryDt_Date': opts['XpryDt_Date'].to_numpy(),
+            'Open': opts['OpnPric'].to_numpy(),
+            'High': opts['HghPric'].to_numpy(),
+            'Low': opts['LwPric'].to_numpy(),
+            'Close': opts['ClsPric'].to_numpy(),
+            'OpnIntrst': opts['OpnIntrst'].to_numpy(),
+            'ChngInOpnIntrst': opts['ChngInOpnIntrst'].to_numpy(),
+            'TtlTradgVol': opts['TtlTradgVol'].to_numpy(),
+            'TtlNbOfTxsExctd': opts['TtlNbOfTxsExctd'].to_numpy(),
+        })
+        for c in ['FinInstrmTp', 'TckrSymb', 'OptnTp', 'XpryDt']:
+            out[c] = out[c].astype('category')
+        out = out[~out.duplicated(subset=self.CONTRACT_KEY, keep='last')].reset_index(drop=True)
+        levels = self.calculate_camarilla_levels(out['High'], out['Low'], out['Close'])
+        for k in self.LEVELS:
+            out[k] = levels[k].to_numpy()
+        return out
+
+    def _history_lookup(self, bhav_file):
+        """
+        Yesterday's indexed OHLC from the history store, or None unless the
+        day is stored in the current version from this same bhav copy.
+        """
+        if self.history is None:
+            return None
+
+        day = trading_date(bhav_file)
+        if day is None or not self.history.is_current(day, source=content_hash(bhav_file)):
+            return None
+        with self._stage('history lookup', source=f"{day:%Y%m%d}") as stage:
+            lookup = self.history.ohlc_lookup(day)
+            stage['rows'] = None if lookup is None else len(lookup)
+        return lookup
+
+    def _record_history(self, bhav_file, df, result=None):
+        """Adds a loaded day (and its scan result) to the history store if missing."""
+        if self.history is None:
+            return
+
+        day = trading_date(bhav_file)
+        if day is None:
+            return
+        try:
+            with self._stage('history write', source=f"{day:%Y%m%d}"):
+                source = content_hash(bhav_file)
+                # Partitions of an older version are rebuilt; a current one
+                # from another bhav copy of the same date is left alone
+                if not self.history.is_current(day):
+                    self.history.write_contracts(day, self.contract_history(df), overwrite=True, source=source)
+                elif not self.history.is_current(day, source=source):
+                    print(f"History for {day} was stored from a different bhav copy than "
+                          f"{self._source_name(bhav_file)}; not replaced")
+                if result is not None and not result.empty and not self.history.is_current(day, 'scans'):
+                    self.history.write_scan(day, result, overwrite=True, source=source)
+        except Exception as e:
+            print(f"Could not store history for {day}: {e}")
+
+    def _index_yesterday(self, df_yest, symbols, expiries):
+        """
+        Returns yesterday's option OHLC indexed on
+        CONTRACT_KEY (TckrSymb, Strike_Ticks, OptnTp, XpryDt), keeping only rows for the given
+        symbols and expiries. Duplicate keys keep the last row.
+        """
+        yest = df_yest[df_yest['FinInstrmTp'].isin(self.OPTION_TYPES) &
+                       df_yest['TckrSymb'].isin(symbols) &
+                       df_yest['XpryDt'].isin(expiries)]
+        index = pd.MultiIndex.from_arrays(
+            [yest['TckrSymb'], yest['Strike_Ticks'], yest['OptnTp'], yest['XpryDt']],
+            names=self.CONTRACT_KEY,
+        )
+        ohlc = pd.DataFrame({
+            'Open': yest['OpnPric'].to_numpy(),
+            'High': yest['HghPric'].to_numpy(),
+            'Low': yest['LwPric'].to_numpy(),
+            'Close': yest['ClsPric'].to_numpy(),
+        }, index=index)
+        return ohlc[~ohlc.index.duplicated(keep='last')]
+
+    def _scan_loop(self, df_today, df_yest):
+        """
+        Original per-symbol scan, kept as the reference engine. It covers
+        stock futures and options only; index chains are only scanned by
+        the vectorized engine.
+        """
+        # 1. Today's futures and options
         # Filter FUTSTK for Underlying Close
         today_futs = df_today[df_today['FinInstrmTp'] == 'STF'].copy()
         today_opts = df_today[df_today['FinInstrmTp'] == 'STO'].copy()
 
+        # 2. Index yesterday's option OHLC, restricted to today's futures
+        #    symbols and expiries (the only keys the loop can ask for)
+        print("Indexing Yesterday's data...")
+        with self._stage('yesterday indexing') as stage:
+            yest_lookup = self._index_yesterday(
+                df_yest, today_futs['TckrSymb'].unique(), today_futs['XpryDt'].unique()
+            )
+            stage['rows'] = len(yest_lookup)
+
         results = []
 
         # Get unique symbols
@@ -134,8 +1092,9 @@ class CamarillaScanner:
                 continue
 
             # 3. Find ATM Strike
-            # Ensure strikes are float
-            available_strikes = opts_sym['StrkPric'].astype(float).unique()
+            # Strikes in rupees from the integer ticks
+            strikes = self.strike_values(opts_sym['Strike_Ticks'])
+            available_strikes = pd.unique(strikes)
             atm_strike = self.get_atm_strike(spot_close, available_strikes)
             
             if atm_strike is None:
@@ -144,7 +1103,7 @@ class CamarillaScanner:
             # 4. Get CE and PE for ATM
             for opt_type in ['CE', 'PE']:
                 opt_row = opts_sym[
-                    (opts_sym['StrkPric'].astype(float) == atm_strike) & 
+                    (strikes == atm_strike) & 
                     (opts_sym['OptnTp'] == opt_type)
                 ]
                 
@@ -155,15 +1114,19 @@ class CamarillaScanner:
                 row = opt_row.iloc[0]
                 
                 # Lookup Yesterday
-                yest_key = (symbol, float(atm_strike), opt_type, expiry_str)
-                yest_data = yest_lookup.get(yest_key)
+                yest_key = (symbol, int(round(atm_strike * self.STRIKE_SCALE)), opt_type, expiry_str)
+                yest_data = None
+                if yest_key in yest_lookup.index:
+                    yest_data = yest_lookup.loc[yest_key]
                 
                 yest_levels = {}
-                if yest_data:
-                    # Calculate Yesterday's Camarilla Levels
-                    yest_levels = self.calculate_camarilla(
+                if yest_data is not None:
+                    # Calculate Yesterday's Camarilla Levels, as Python
+                    # floats like the original dict lookup gave, so round()
+                    # below rounds them exactly (today's stay np.float64)
+                    yest_levels = {k: float(v) for k, v in self.calculate_camarilla(
                         yest_data['High'], yest_data['Low'], yest_data['Close']
-                    )
+                    ).items()}
                 today_levels = self.calculate_camarilla(
                     row['HghPric'], row['LwPric'], row['ClsPric']
                 )
@@ -247,7 +1210,7 @@ if __name__ == "__main__":
     import glob
     files = sorted(glob.glob("BhavCopy*.zip"))
     if len(files) >= 2:
-        scanner = CamarillaScanner()
+        scanner = CamarillaScanner(cache_dir=DEFAULT_CACHE_DIR)
         df = scanner.process_data(files[-1], files[-2]) # Last is today, 2nd last is yesterday
         if df is not None:
             print(df.head())
@@ -1,11 +1,12 @@
 
 import streamlit as st
 import pandas as pd
-import io
-import os
 import re
 from scanner import CamarillaScanner
-from openpyxl.styles import Alignment, Font, PatternFill
+from bhav_cache import FrameLRU, content_hash
+from profiling import ScanProfile
+from conditions import parse_conditions
+from report import FORMATS, available_formats, build_report, condition_sheets, sheet_name
 
 # Page configuration
 st.set_page_config(
@@ -37,236 +38,50 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-def generate_excel(df, today_filename, top_n=5):
+# Memory budget for parsed bhav copies and scan results shared by all sessions
+SHARED_CACHE_BYTES = 1024 * 1024 * 1024
+
+
+@st.cache_resource
+def shared_cache():
+    """One in-memory LRU per server process, shared by every session."""
+    return FrameLRU(max_bytes=SHARED_CACHE_BYTES)
+
+
+def run_scan(today_file, yest_file, profile=None, chain=None, rules=''):
     """
-    Generates the Excel report in memory and returns the BytesIO object.
-    Preserves the formatting logic from the desktop app.
+    Scans two uploaded bhav copies, reusing earlier work from any session.
+
+    Parsed bhav frames are cached by file content hash and scan results by
+    the pair of hashes, so the same two daily files uploaded by several
+    analysts are parsed and scanned once.
+    profile is an optional ScanProfile; stages served from the cache are
+    not recorded in it. chain=(strikes, expiries) runs the chain scan
+    instead of the ATM scan. rules are extra conditions as text (see
+    conditions.parse_conditions). Returns (result, scan_key, conditions).
     """
-    output = io.BytesIO()
-    
-    # Reorder columns
-    cols = list(df.columns)
-    priority = ['Symbol', 'Expiry', 'ATM_Strike', 'Option_Type', 'Spot_Close']
-    final_cols = priority + [c for c in cols if c not in priority]
-    df_final = df[final_cols]
-    
-    # Filter for Sheet 2
-    df_inside_full = df[df['Is_Inside_Camarilla'] == True].copy()
-    
-    # Split CE and PE
-    cols_to_show = ['Symbol', 'Spot_Close', 'ATM_Strike']
-    
-    df_ce = df_inside_full[df_inside_full['Option_Type'] == 'CE'][cols_to_show].copy()
-    df_pe = df_inside_full[df_inside_full['Option_Type'] == 'PE'][cols_to_show].copy()
-    
-    df_ce.reset_index(drop=True, inplace=True)
-    df_pe.reset_index(drop=True, inplace=True)
-    
-    df_combined = pd.concat([df_ce, df_pe], axis=1)
-    
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Sheet 1: Main Data
-        df_final.to_excel(writer, sheet_name='Main Data', index=False)
-        
-        # Sheet 2: Inside Camarilla
-        sheet_name = 'Narrow Camarilla'
-        df_combined.to_excel(writer, sheet_name=sheet_name, index=False, startrow=1)
-        
-        workbook = writer.book
-        worksheet = writer.sheets[sheet_name]
-        
-        # Header Styles
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-        center = Alignment(horizontal='center', vertical='center')
-        
-        # Merge and Write CE Header
-        worksheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=3)
-        cell_ce = worksheet.cell(row=1, column=1)
-        cell_ce.value = "Narrow Camarilla CE"
-        cell_ce.font = header_font
-        cell_ce.fill = header_fill
-        cell_ce.alignment = center
-        
-        # Merge and Write PE Header
-        worksheet.merge_cells(start_row=1, start_column=4, end_row=1, end_column=6)
-        cell_pe = worksheet.cell(row=1, column=4)
-        cell_pe.value = "Narrow Camarilla PE"
-        cell_pe.font = header_font
-        cell_pe.fill = header_fill
-        cell_pe.alignment = center
-        
-        # Formatting columns width
-        for i, col in enumerate(df_combined.columns):
-            col_idx = i + 1 
-            series = df_combined.iloc[:, i]
-            max_len = max((series.apply(str).map(len).max() if not series.empty else 0), len(str(col))) + 2
-            column_letter = worksheet.cell(row=2, column=col_idx).column_letter
-            worksheet.column_dimensions[column_letter].width = max_len
-
-        # Sheet 3: Inside Camarilla (H4/L4 Logic)
-        df_h4_l4_full = df[df['Is_Inside_H4_L4'] == True].copy()
-        
-        df_ce_h4 = df_h4_l4_full[df_h4_l4_full['Option_Type'] == 'CE'][cols_to_show].copy()
-        df_pe_h4 = df_h4_l4_full[df_h4_l4_full['Option_Type'] == 'PE'][cols_to_show].copy()
-        
-        df_ce_h4.reset_index(drop=True, inplace=True)
-        df_pe_h4.reset_index(drop=True, inplace=True)
-        
-        df_combined_h4 = pd.concat([df_ce_h4, df_pe_h4], axis=1)
-        
-        sheet_name_h4 = 'Inside Camarilla'
-        df_combined_h4.to_excel(writer, sheet_name=sheet_name_h4, index=False, startrow=1)
-        
-        worksheet_h4 = writer.sheets[sheet_name_h4]
-        
-        # Headers for Sheet 3
-        worksheet_h4.merge_cells(start_row=1, start_column=1, end_row=1, end_column=3)
-        cell_ce_h4 = worksheet_h4.cell(row=1, column=1)
-        cell_ce_h4.value = "Inside Camarilla CE"
-        cell_ce_h4.font = header_font
-        cell_ce_h4.fill = header_fill
-        cell_ce_h4.alignment = center
-        
-        worksheet_h4.merge_cells(start_row=1, start_column=4, end_row=1, end_column=6)
-        cell_pe_h4 = worksheet_h4.cell(row=1, column=4)
-        cell_pe_h4.value = "Inside Camarilla PE"
-        cell_pe_h4.font = header_font
-        cell_pe_h4.fill = header_fill
-        cell_pe_h4.alignment = center
-        
-        # Formatting columns for Sheet 3
-        for i, col in enumerate(df_combined_h4.columns):
-            col_idx = i + 1
-            series = df_combined_h4.iloc[:, i]
-            max_len = max((series.apply(str).map(len).max() if not series.empty else 0), len(str(col))) + 2
-            column_letter = worksheet_h4.cell(row=2, column=col_idx).column_letter
-            worksheet_h4.column_dimensions[column_letter].width = max_len
-
-        # Sheet 4: Higher Value Camarilla
-        df_higher_full = df[df['Is_Higher_Value'] == True].copy()
-        
-        df_ce_higher = df_higher_full[df_higher_full['Option_Type'] == 'CE'][cols_to_show].copy()
-        df_pe_higher = df_higher_full[df_higher_full['Option_Type'] == 'PE'][cols_to_show].copy()
-        
-        df_ce_higher.reset_index(drop=True, inplace=True)
-        df_pe_higher.reset_index(drop=True, inplace=True)
-        
-        df_combined_higher = pd.concat([df_ce_higher, df_pe_higher], axis=1)
-        
-        sheet_name_higher = 'Higher Value Camarilla'
-        df_combined_higher.to_excel(writer, sheet_name=sheet_name_higher, index=False, startrow=1)
-        
-        worksheet_higher = writer.sheets[sheet_name_higher]
-        
-        # Headers
-        worksheet_higher.merge_cells(start_row=1, start_column=1, end_row=1, end_column=3)
-        cell_ce_h = worksheet_higher.cell(row=1, column=1)
-        cell_ce_h.value = "Higher Value Camarilla CE"
-        cell_ce_h.font = header_font
-        cell_ce_h.fill = header_fill
-        cell_ce_h.alignment = center
-        
-        worksheet_higher.merge_cells(start_row=1, start_column=4, end_row=1, end_column=6)
-        cell_pe_h = worksheet_higher.cell(row=1, column=4)
-        cell_pe_h.value = "Higher Value Camarilla PE"
-        cell_pe_h.font = header_font
-        cell_pe_h.fill = header_fill
-        cell_pe_h.alignment = center
-        
-        # Formatting
-        for i, col in enumerate(df_combined_higher.columns):
-            col_idx = i + 1
-            series = df_combined_higher.iloc[:, i]
-            max_len = max((series.apply(str).map(len).max() if not series.empty else 0), len(str(col))) + 2
-            column_letter = worksheet_higher.cell(row=2, column=col_idx).column_letter
-            worksheet_higher.column_dimensions[column_letter].width = max_len
-
-        # Sheet 5: Lower Value Camarilla
-        df_lower_full = df[df['Is_Lower_Value'] == True].copy()
-        
-        df_ce_lower = df_lower_full[df_lower_full['Option_Type'] == 'CE'][cols_to_show].copy()
-        df_pe_lower = df_lower_full[df_lower_full['Option_Type'] == 'PE'][cols_to_show].copy()
-        
-        df_ce_lower.reset_index(drop=True, inplace=True)
-        df_pe_lower.reset_index(drop=True, inplace=True)
-        
-        df_combined_lower = pd.concat([df_ce_lower, df_pe_lower], axis=1)
-        
-        sheet_name_lower = 'Lower Value Camarilla'
-        df_combined_lower.to_excel(writer, sheet_name=sheet_name_lower, index=False, startrow=1)
-        
-        worksheet_lower = writer.sheets[sheet_name_lower]
-        
-        # Headers
-        worksheet_lower.merge_cells(start_row=1, start_column=1, end_row=1, end_column=3)
-        cell_ce_l = worksheet_lower.cell(row=1, column=1)
-        cell_ce_l.value = "Lower Value Camarilla CE"
-        cell_ce_l.font = header_font
-        cell_ce_l.fill = header_fill
-        cell_ce_l.alignment = center
-        
-        worksheet_lower.merge_cells(start_row=1, start_column=4, end_row=1, end_column=6)
-        cell_pe_l = worksheet_lower.cell(row=1, column=4)
-        cell_pe_l.value = "Lower Value Camarilla PE"
-        cell_pe_l.font = header_font
-        cell_pe_l.fill = header_fill
-        cell_pe_l.alignment = center
-        
-        # Formatting
-        for i, col in enumerate(df_combined_lower.columns):
-            col_idx = i + 1
-            series = df_combined_lower.iloc[:, i]
-            max_len = max((series.apply(str).map(len).max() if not series.empty else 0), len(str(col))) + 2
-            column_letter = worksheet_lower.cell(row=2, column=col_idx).column_letter
-            worksheet_lower.column_dimensions[column_letter].width = max_len
-
-        # Sheet 6: Top N Output
-        metrics = [
-            ('OpnIntrst', f'Top {top_n} Open Interest'),
-            ('ChngInOpnIntrst', f'Top {top_n} Change in OI'),
-            ('TtlTradgVol', f'Top {top_n} Volume'),
-            ('TtlNbOfTxsExctd', f'Top {top_n} Transactions')
-        ]
-        
-        sheet_name_top5 = f'Top {top_n} Output'
-        workbook.create_sheet(sheet_name_top5)
-        worksheet_top5 = workbook[sheet_name_top5]
-        
-        start_row = 1
-        current_col = 0
-        
-        for metric, title in metrics:
-            df[metric] = pd.to_numeric(df[metric], errors='coerce').fillna(0)
-            
-            top5_df = df.sort_values(by=metric, ascending=False).head(top_n).copy()
-            
-            cols_top5 = ['Symbol', 'Option_Type', 'ATM_Strike', 'Spot_Close', metric]
-            top5_display = top5_df[cols_top5].copy()
-
-            
-            top5_display.to_excel(writer, sheet_name=sheet_name_top5, index=False, startrow=start_row, startcol=current_col)
-            
-            op_col_start = current_col + 1
-            op_col_end = current_col + len(cols_top5)
-            
-            worksheet_top5.merge_cells(start_row=1, start_column=op_col_start, end_row=1, end_column=op_col_end)
-            cell_title = worksheet_top5.cell(row=1, column=op_col_start)
-            cell_title.value = title
-            cell_title.font = header_font
-            cell_title.fill = header_fill
-            cell_title.alignment = center
-            
-            for i, col in enumerate(top5_display.columns):
-                col_idx = op_col_start + i
-                series = top5_display.iloc[:, i]
-                max_len = max((series.apply(str).map(len).max() if not series.empty else 0), len(str(col))) + 2
-                column_letter = worksheet_top5.cell(row=2, column=col_idx).column_letter
-                worksheet_top5.column_dimensions[column_letter].width = max_len
-
-            current_col += len(cols_top5) + 1
-            
-    return output.getvalue()
+    cache = shared_cache()
+    scanner = CamarillaScanner(profile=profile, conditions=parse_conditions(rules))
+    today_hash = content_hash(today_file)
+    yest_hash = content_hash(yest_file)
+    scan_key = ('scan', today_hash, yest_hash, chain, rules.strip())
+
+    def load(upload, digest):
+        return cache.get_or_create(
+            ('bhav', digest, scanner.LOADER_VERSION),
+            lambda: scanner.load_bhav_copy(upload, scanner.SCAN_COLUMNS, scanner.SCAN_INSTRUMENTS),
+        )
+
+    def scan():
+        df_today = load(today_file, today_hash)
+        df_yest = load(yest_file, yest_hash)
+        if df_today is None or df_yest is None:
+            return None
+        if chain is not None:
+            return scanner.scan_chain(df_today, df_yest, *chain)
+        return scanner.scan_frames(df_today, df_yest)
+
+    return cache.get_or_create(scan_key, scan), scan_key, scanner.conditions
 
 # Header
 st.title("Camarilla Option Scanner")
@@ -282,75 +97,178 @@ with col2:
     st.subheader("Yesterday's Data")
     yest_file = st.file_uploader("Upload Yesterday's Bhav Copy (ZIP)", type=['zip'], key='yest')
 
+st.markdown("### Scan Settings")
+chain_mode = st.checkbox(
+    "Scan a strike band on several expiries (chain scan)",
+    value=False,
+    help="Also scan the strikes around the ATM and the next expiries, "
+         "tagged with Strike_Offset, Moneyness and Expiry_Rank."
+)
+chain = None
+if chain_mode:
+    band_col, exp_col = st.columns(2)
+    with band_col:
+        chain_strikes = int(st.number_input("Strikes on each side of ATM:", min_value=0, max_value=20,
+                                            value=CamarillaScanner.CHAIN_STRIKES, step=1))
+    with exp_col:
+        chain_expiries = int(st.number_input("Expiries per symbol:", min_value=1, max_value=6,
+                                             value=CamarillaScanner.CHAIN_EXPIRIES, step=1))
+    chain = (chain_strikes, chain_expiries)
+
+with st.expander("Extra conditions"):
+    rules = st.text_area(
+        "One condition per line, as 'Name: expression' or 'Name [Sheet title]: expression':",
+        value="",
+        placeholder="Is_Gap_Up [Gap Up]: Today_Open > Yest_H4 and TtlTradgVol > 1000",
+        help="Expressions compare Today_/Yest_ levels (H4..L4), Today_/Yest_ Open/High/Low/Close, "
+             "Spot_Close, ATM_Strike and the OI/volume columns. Each condition adds a "
+             "result column and a report sheet."
+    )
+
 # Option for Top N Results
 st.markdown("### Report Settings")
-top_n_choice = st.radio(
-    "Select Number of Top Results to Display:",
-    options=[5, 10],
+top_n_choice = int(st.number_input(
+    "Number of Top Results to Display:",
+    min_value=1,
+    max_value=500,
+    value=5,
+    step=1,
+    help="How many rows each Top N block in the generated Excel report shows."
+))
+
+rank_within_options = {
+    "Whole market": None,
+    "Each option type (CE / PE)": 'Option_Type',
+    "Each expiry": 'Expiry',
+}
+rank_within = st.radio(
+    "Rank Top N within:",
+    options=list(rank_within_options),
     index=0,
     horizontal=True,
-    help="Choose whether to see Top 5 or Top 10 results in the generated Excel report."
+)
+rank_abs_oi = st.checkbox(
+    "Rank Change in OI by absolute value",
+    value=False,
+    help="Largest moves in open interest regardless of direction."
 )
 
 if st.button("SCAN & GENERATE REPORT"):
     if today_file is not None and yest_file is not None:
         try:
-            with st.spinner('Processing... This may take a moment.'):
-                # Save uploaded files temporarily because the scanner library expects paths
-                # Or modify scanner to accept file objects. 
-                # Since scanner.py uses zipfile.ZipFile(path), we can pass the file-like object directly if it supports seek!
-                # Streamlit UploadedFile supports seek.
-                
-                # However, scanner.py prints filenames, so let's verify if it needs paths or objects.
-                # scanner.py: with zipfile.ZipFile(zip_path, 'r') as z:
-                # ZipFile accepts path or file-like object. So passing the UploadedFile should work!
-                
-                scanner = CamarillaScanner()
-                df = scanner.process_data(today_file, yest_file)
-                
-                if df is not None and not df.empty:
-                    # Generate Output Filename
-                    # Try to get date from filename
-                    today_filename = today_file.name
-                    match = re.search(r"(\d{8})", today_filename)
-                    if match:
-                        date_str = match.group(1)
+            with st.status('Processing... This may take a moment.') as status:
+                def show_stage(name, event, record):
+                    if event == 'start':
+                        status.update(label=f"{name.capitalize()}...")
                     else:
-                        date_str = "Report"
-                    
-                    output_filename = f"Camarilla Scanner {date_str}.xlsx"
-                    
-                    # Generate Excel
-                    excel_data = generate_excel(df, today_filename, top_n_choice)
-                    
-                    st.success(f"Scan Complete! Found {len(df)} records.")
-                    
-                    # Preview Data
-                    with st.expander("Preview Generated Data"):
-                        st.dataframe(df.head())
-                    
-                    # Download Button
-                    st.download_button(
-                        label="Download Excel Report",
-                        data=excel_data,
-                        file_name=output_filename,
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
-                    
-                else:
-                    st.error("No results found or processing failed.")
-                    
+                        status.write(f"{name.capitalize()}: {record['seconds']:.2f}s")
+
+                # ZipFile accepts path or file-like object, so the UploadedFile
+                # objects are passed straight to the scanner (they support seek).
+                # Results are shared across sessions by upload content.
+                profile = ScanProfile(on_stage=show_stage)
+                with profile:
+                    df, scan_key, conditions = run_scan(today_file, yest_file, profile, chain, rules)
+                status.update(label=f"Processed in {profile.total_seconds:.2f}s", state='complete')
+
+            if df is not None and not df.empty:
+                st.session_state['scan'] = {
+                    'key': scan_key,
+                    'df': df,
+                    'today_filename': today_file.name,
+                    'timings': profile.stages,
+                    'conditions': conditions,
+                }
+            else:
+                st.session_state.pop('scan', None)
+                st.error("No results found or processing failed.")
+
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
             st.exception(e)
     else:
         st.warning("Please upload both ZIP files.")
 
+# The report is rebuilt from the stored scan whenever the settings change,
+# without scanning again
+scan = st.session_state.get('scan')
+if scan is not None:
+    df = scan['df']
+    today_filename = scan['today_filename']
+
+    st.success(f"Scan Complete! Found {len(df)} records.")
+
+    # Preview Data
+    with st.expander("Preview Generated Data"):
+        st.dataframe(df.head())
+
+    if scan['timings']:
+        with st.expander("Stage Timings"):
+            st.dataframe(pd.DataFrame(scan['timings']))
+
+    # Reports are only built when a format is requested
+    st.markdown("### Download")
+    formats = available_formats()
+    fmt = st.radio(
+        "Format:",
+        options=formats,
+        format_func=lambda f: FORMATS[f][0],
+        horizontal=True,
+    )
+    all_sheets = {sheet_name(spec, top_n_choice): spec for spec in condition_sheets(scan['conditions'])}
+    chosen = st.multiselect(
+        "Sheets:",
+        options=list(all_sheets),
+        default=list(all_sheets),
+        help="Leave out Main Data for a much smaller, faster report "
+             "(e.g. only 'Inside Camarilla')."
+    )
+
+    # Generate Output Filename
+    # Try to get date from filename
+    match = re.search(r"(\d{8})", today_filename)
+    if match:
+        date_str = match.group(1)
+    else:
+        date_str = "Report"
+
+    _, ext, mime, _ = FORMATS[fmt]
+    output_filename = f"Camarilla Scanner {date_str}.{ext}"
+
+    top_by = rank_within_options[rank_within]
+    top_absolute = ('ChngInOpnIntrst',) if rank_abs_oi else ()
+    report_key = (scan['key'], fmt, tuple(chosen), top_n_choice, top_by, top_absolute)
+
+    if not chosen:
+        st.info("Select at least one sheet.")
+    elif st.session_state.get('report', {}).get('key') != report_key:
+        if st.button(f"Prepare {FORMATS[fmt][0]}"):
+            profile = ScanProfile()
+            with st.spinner('Building report...'), profile.stage('report writing') as stage:
+                data = build_report(
+                    df, fmt, top_n=top_n_choice,
+                    sheets=[all_sheets[name] for name in chosen],
+                    top_by=top_by, top_absolute=top_absolute,
+                )
+                stage['rows'] = len(df)
+            st.session_state['report'] = {'key': report_key, 'data': data,
+                                          'seconds': stage['seconds']}
+            st.rerun()
+    else:
+        # Download Button
+        st.download_button(
+            label=f"Download {FORMATS[fmt][0]}",
+            data=st.session_state['report']['data'],
+            file_name=output_filename,
+            mime=mime
+        )
+        st.caption(f"Report built in {st.session_state['report']['seconds']:.2f}s")
+
 # Instructions
 with st.expander("How to use"):
     st.markdown("""
     1. Download the Bhav Copy ZIP files from NSE website for Today and Yesterday.
     2. Upload them in the respective fields above.
     3. Click 'SCAN & GENERATE REPORT'.
-    4. Download the generated Excel file.
+    4. Pick a format and the sheets you need, click 'Prepare', then download the file.
     """)
@@ -0,0 +1,269 @@
+import argparse
+import datetime
+import io
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+# Column layout of the NSE UDiFF F&O bhav copy
+BHAV_COLUMNS = [
+    'TradDt', 'BizDt', 'Sgmt', 'Src', 'FinInstrmTp', 'FinInstrmId', 'ISIN', 'TckrSymb',
+    'SctySrs', 'XpryDt', 'FininstrmActlXpryDt', 'StrkPric', 'OptnTp', 'FinInstrmNm',
+    'OpnPric', 'HghPric', 'LwPric', 'ClsPric', 'LastPric', 'PrvsClsgPric', 'UndrlygPric',
+    'SttlmPric', 'OpnIntrst', 'ChngInOpnIntrst', 'TtlTradgVol', 'TtlTrfVal',
+    'TtlNbOfTxsExctd', 'SsnId', 'NewBrdLotQty', 'Rmks', 'Rsvd1', 'Rsvd2', 'Rsvd3', 'Rsvd4',
+]
+
+# Roughly one day of the real stock F&O segment
+MARKET_SYMBOLS = 200
+MARKET_STRIKES = 40
+MARKET_EXPIRIES = 3
+
+# Index underlyings: (symbol, level, strike step). Index options list weekly
+# expiries as well as the monthlies, with much deeper chains
+INDEX_UNDERLYINGS = [
+    ('NIFTY', 24000.0, 50.0),
+    ('BANKNIFTY', 52000.0, 100.0),
+    ('FINNIFTY', 23500.0, 50.0),
+    ('MIDCPNIFTY', 12500.0, 25.0),
+]
+INDEX_STRIKES = 200
+INDEX_WEEKLIES = 4
+
+
+def bhav_filename(day):
+    """File name NSE uses for the F&O bhav copy of a trading day."""
+    return f"BhavCopy_NSE_FO_0_0_0_{day:%Y%m%d}_F_0000.csv.zip"
+
+
+def trading_days(start, count):
+    """count weekdays from start (inclusive), as datetime.date objects."""
+    days = []
+    day = pd.Timestamp(start).date()
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day += datetime.timedelta(days=1)
+    return days
+
+
+def monthly_expiries(day, count):
+    """The next count monthly expiries (last Thursday of the month) on or after day."""
+    expiries = []
+    month = pd.Timestamp(day).to_period('M')
+    while len(expiries) < count:
+        last = month.to_timestamp(how='end').normalize()
+        last -= pd.Timedelta(days=(last.weekday() - 3) % 7)
+        if last.date() >= day:
+            expiries.append(last.date())
+        month += 1
+    return expiries
+
+
+def weekly_expiries(day, count):
+    """The next count Thursdays on or after day."""
+    first = day + datetime.timedelta(days=(3 - day.weekday()) % 7)
+    return [first + datetime.timedelta(weeks=i) for i in range(count)]
+
+
+def _tick(values, tick=0.05):
+    return np.round(np.round(values / tick) * tick, 2)
+
+
+def generate_bhav_frame(day, symbols=MARKET_SYMBOLS, strikes=MARKET_STRIKES,
+                        expiries=MARKET_EXPIRIES, seed=0, start=None,
+                        expiry_format='%Y-%m-%d', indices=0):
+    """
+    Builds one synthetic F&O bhav copy as a DataFrame in the UDiFF layout.
+
+    day:       trading date of the file.
+    symbols:   number of stock underlyings (SYM0000, SYM0001, ...).
+    strikes:   strikes per option chain, listed for every expiry.
+    expiries:  monthly expiries listed per symbol (futures and options).
+    seed:      the output depends only on (seed, day, start), so the same
+               arguments always give the same file.
+    start:     first day of the price history (defaults to day). Spot prices
+               follow a random walk from start, so consecutive days have
+               related prices and the scan conditions fire at realistic
+               rates.
+    indices:   number of INDEX_UNDERLYINGS to add as IDF/IDO rows, with
+               INDEX_STRIKES strikes on INDEX_WEEKLIES weekly expiries plus
+               the monthlies.
+
+    Strike grids are fixed per symbol from its starting price, and option
+    prices are intrinsic value plus a time value that decays with distance
+    from the spot, rounded to the 0.05 tick.
+    """
+    day = pd.Timestamp(day).date()
+    start = pd.Timestamp(start).date() if start is not None else day
+    setup = np.random.default_rng([seed, 0])
+    base = setup.uniform(50, 5000, symbols)
+    step = np.maximum(_tick(base / 40, 0.5), 0.5)
+    lot = setup.choice([250, 500, 1000, 1500], symbols)
+
+    # Random walk of the spot from start to day (one step per weekday)
+    spot = base.copy()
+    n_days = len(pd.bdate_range(start, day)) - 1
+    for d in range(1, n_days + 1):
+        spot *= 1 + np.random.default_rng([seed, d]).normal(0, 0.015, symbols)
+    rng = np.random.default_rng([seed, n_days, 1])
+
+    monthly = monthly_expiries(day, expiries)
+    names = np.array([f"SYM{i:04d}" for i in range(symbols)])
+    frames = _segment(rng, day, names, base, step, spot, lot, monthly, monthly,
+                      strikes, 'STF', 'STO', expiry_format)
+
+    if indices:
+        idx = INDEX_UNDERLYINGS[:indices]
+        idx_base = np.array([level for _, level, _ in idx])
+        idx_spot = idx_base.copy()
+        for d in range(1, n_days + 1):
+            idx_spot *= 1 + np.random.default_rng([seed, d, 2]).normal(0, 0.008, len(idx))
+        weekly = sorted(set(weekly_expiries(day, INDEX_WEEKLIES)) | set(monthly))
+        frames += _segment(np.random.default_rng([seed, n_days, 2]), day,
+                           np.array([name for name, _, _ in idx]), idx_base,
+                           np.array([st for _, _, st in idx]), idx_spot,
+                           np.full(len(idx), 75), monthly, weekly, INDEX_STRIKES,
+                           'IDF', 'IDO', expiry_format)
+
+    df = pd.concat(frames, ignore_index=True)
+    rows = len(df)
+    df['TradDt'] = df['BizDt'] = day.isoformat()
+    df['Sgmt'] = 'FO'
+    df['Src'] = 'NSE'
+    df['FinInstrmId'] = np.arange(100000, 100000 + rows)
+    df['SctySrs'] = np.nan
+    df['FinInstrmNm'] = (df['TckrSymb'] + np.where(df['FinInstrmTp'].isin(['STF', 'IDF']), ' FUT', ' OPT'))
+    df['LastPric'] = df['ClsPric']
+    df['PrvsClsgPric'] = _tick(df['ClsPric'].to_numpy() * (1 + rng.normal(0, 0.02, rows)))
+    df['SttlmPric'] = df['ClsPric']
+    df['OpnIntrst'] = rng.integers(0, 2_000_000, rows)
+    df['ChngInOpnIntrst'] = rng.integers(-50_000, 50_000, rows)
+    df['TtlTradgVol'] = rng.integers(0, 500_000, rows)
+    df['TtlTrfVal'] = np.round(df['TtlTradgVol'] * df['ClsPric'], 2)
+    df['TtlNbOfTxsExctd'] = rng.integers(0, 20_000, rows)
+    df['SsnId'] = 'F1'
+    for c in ['ISIN', 'Rmks', 'Rsvd1', 'Rsvd2', 'Rsvd3', 'Rsvd4']:
+        df[c] = np.nan
+    return df[BHAV_COLUMNS]
+
+
+def _segment(rng, day, names, base, step, spot, lot, fut_expiries, opt_expiries,
+             strikes, fut_type, opt_type, expiry_format):
+    """Futures and option chain rows for one group of underlyings: [futures, options]."""
+    symbols = len(names)
+
+    def expiry_arrays(xpry):
+        days_left = np.array([max((x - day).days, 1) for x in xpry], dtype=float)
+        return (days_left, np.array([x.strftime(expiry_format) for x in xpry]),
+                np.array([x.isoformat() for x in xpry]))
+
+    # Futures: one row per symbol and expiry
+    expiries = len(fut_expiries)
+    days_left, xpry_str, xpry_iso = expiry_arrays(fut_expiries)
+    f_sym = np.repeat(np.arange(symbols), expiries)
+    f_exp = np.tile(np.arange(expiries), symbols)
+    f_close = _tick(spot[f_sym] * (1 + 0.005 * days_left[f_exp] / 30))
+    f_open = _tick(f_close * (1 + rng.normal(0, 0.006, len(f_sym))))
+    f_high = np.maximum(f_open, f_close) * (1 + np.abs(rng.normal(0, 0.008, len(f_sym))))
+    f_low = np.minimum(f_open, f_close) * (1 - np.abs(rng.normal(0, 0.008, len(f_sym))))
+    futures = pd.DataFrame({
+        'FinInstrmTp': fut_type,
+        'TckrSymb': names[f_sym],
+        'XpryDt': xpry_str[f_exp],
+        'FininstrmActlXpryDt': xpry_iso[f_exp],
+        'StrkPric': np.nan,
+        'OptnTp': np.nan,
+        'OpnPric': f_open, 'HghPric': _tick(f_high), 'LwPric': _tick(f_low), 'ClsPric': f_close,
+        'UndrlygPric': _tick(spot[f_sym]),
+        'NewBrdLotQty': lot[f_sym],
+    })
+
+    # Options: symbol x expiry x strike x (CE, PE)
+    expiries = len(opt_expiries)
+    days_left, xpry_str, xpry_iso = expiry_arrays(opt_expiries)
+    per_sym = expiries * strikes * 2
+    o_sym = np.repeat(np.arange(symbols), per_sym)
+    o_exp = np.tile(np.repeat(np.arange(expiries), strikes * 2), symbols)
+    o_k = np.tile(np.repeat(np.arange(strikes), 2), symbols * expiries)
+    is_call = np.tile([True, False], symbols * expiries * strikes)
+    first = _tick(base - step * (strikes // 2), 0.5)
+    strike = first[o_sym] + step[o_sym] * o_k
+    s = spot[o_sym]
+    intrinsic = np.where(is_call, np.maximum(s - strike, 0), np.maximum(strike - s, 0))
+    time_value = s * 0.02 * np.sqrt(days_left[o_exp] / 30) * np.exp(-np.abs(strike - s) / (s * 0.05))
+    n = len(o_sym)
+    o_close = np.maximum(_tick(intrinsic + time_value * (1 + rng.normal(0, 0.05, n))), 0.05)
+    o_open = np.maximum(_tick(o_close * (1 + rng.normal(0, 0.08, n))), 0.05)
+    o_high = _tick(np.maximum(o_open, o_close) * (1 + np.abs(rng.normal(0, 0.1, n))))
+    o_low = np.maximum(_tick(np.minimum(o_open, o_close) * (1 - np.abs(rng.normal(0, 0.1, n)))), 0.05)
+    options = pd.DataFrame({
+        'FinInstrmTp': opt_type,
+        'TckrSymb': names[o_sym],
+        'XpryDt': xpry_str[o_exp],
+        'FininstrmActlXpryDt': xpry_iso[o_exp],
+        'StrkPric': strike,
+        'OptnTp': np.where(is_call, 'CE', 'PE'),
+        'OpnPric': o_open, 'HghPric': o_high, 'LwPric': o_low, 'ClsPric': o_close,
+        'UndrlygPric': _tick(s),
+        'NewBrdLotQty': lot[o_sym],
+    })
+    return [futures, options]
+
+
+def write_bhav_copy(df, path):
+    """Writes df as a bhav copy ZIP holding a single CSV."""
+    buf = io.StringIO()
+    df.to_csv(buf, index=False)
+    csv_name = os.path.basename(path)[:-len('.zip')] if path.endswith('.zip') else 'bhav.csv'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr(csv_name, buf.getvalue())
+    return path
+
+
+def generate_days(directory, days=2, start='2026-01-12', symbols=MARKET_SYMBOLS,
+                  strikes=MARKET_STRIKES, expiries=MARKET_EXPIRIES, seed=0,
+                  expiry_format='%Y-%m-%d', indices=0):
+    """
+    Writes bhav copies for `days` consecutive trading days into directory
+    and returns their paths in date order. Existing files are overwritten.
+    """
+    os.makedirs(directory, exist_ok=True)
+    dates = trading_days(start, days)
+    paths = []
+    for day in dates:
+        df = generate_bhav_frame(day, symbols, strikes, expiries, seed, start=dates[0],
+                                 expiry_format=expiry_format, indices=indices)
+        paths.append(write_bhav_copy(df, os.path.join(directory, bhav_filename(day))))
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write deterministic synthetic F&O bhav copies.")
+    parser.add_argument("directory", help="output folder")
+    parser.add_argument("--days", type=int, default=2, help="consecutive trading days to write")
+    parser.add_argument("--start", default='2026-01-12', help="first trading day (YYYY-MM-DD)")
+    parser.add_argument("--scale", type=float, default=1,
+                        help=f"market size multiplier ({MARKET_SYMBOLS} symbols at 1x)")
+    parser.add_argument("--symbols", type=int, help="number of symbols (overrides --scale)")
+    parser.add_argument("--strikes", type=int, default=MARKET_STRIKES, help="strikes per chain")
+    parser.add_argument("--expiries", type=int, default=MARKET_EXPIRIES, help="monthly expiries per symbol")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--expiry-format", default='%Y-%m-%d',
+                        help="XpryDt format, e.g. %%d-%%b-%%Y for the older layout")
+    parser.add_argument("--indices", type=int, default=0,
+                        help=f"index underlyings to add (0-{len(INDEX_UNDERLYINGS)}), e.g. 2 for NIFTY and BANKNIFTY")
+    args = parser.parse_args(argv)
+
+    symbols = args.symbols or max(1, int(round(MARKET_SYMBOLS * args.scale)))
+    paths = generate_days(args.directory, args.days, args.start, symbols, args.strikes,
+                          args.expiries, args.seed, args.expiry_format, args.indices)
+    for path in paths:
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,128 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from conditions import Condition, DEFAULT_CONDITIONS, evaluate_conditions, parse_conditions
+from report import build_report, condition_sheets
+from scanner import CamarillaScanner
+
+
+def expect_error(what, func, *args, **kwargs):
+    try:
+        func(*args, **kwargs)
+    except ValueError as e:
+        print(f"  rejected {what}: {e}")
+        return str(e)
+    raise AssertionError(f"{what} was accepted")
+
+
+def verify_rejected_syntax():
+    print("Rejected expressions:")
+    for expression in ["Today_H4 >", "__import__('os')", "Today_H4.real > 1", "Today_H4 ** 2 > 1",
+                       "Today_H4 // 2 > 1", "Today_H4 if Yest_H4 else 1", "'a' < Today_H4",
+                       "Today_H4 in (1, 2)", "Today_H4 is None", "abs(Today_H4, Yest_H4) > 0",
+                       "min(Today_H4) > 0", "max(Today_H4, key=Yest_H4) > 0", "round(Today_H4) > 0",
+                       "Today_H4[0] > 1", "(lambda: 1)()", "[Today_H4] > 1", "~Today_H4"]:
+        expect_error(repr(expression), Condition, 'Rule', expression)
+
+    print("Rejected names and labels:")
+    expect_error("a name that is not an identifier", Condition, 'My Rule', 'Today_H4 > 1')
+    for label in ['A:B', 'A/B', 'A[1]', 'Why?', 'Main Data', 'MAIN DATA', 'Top 5 Output', 'top 10 output']:
+        expect_error(f"label {label!r}", Condition, 'Rule', 'Today_H4 > 1', label)
+    assert 'cannot contain' in expect_error("':' in a rules file label", parse_conditions, "A [B: C]: Today_H4 > 1")
+    assert "missing ']'" in expect_error("an unclosed label", parse_conditions, "A [B: Today_H4 > 1")
+    assert 'expected' in expect_error("a line without an expression", parse_conditions, "A:")
+
+
+def verify_unknown_columns():
+    print("Unknown columns:")
+    condition = Condition('Rule', 'Today_H4 > Spot_Price and Yest_L4 < 1')
+    columns = {'Today_H4': np.array([1.0]), 'Yest_L4': np.array([0.0])}
+    message = expect_error("evaluate()", condition.evaluate, columns, 1)
+    assert 'Spot_Price' in message and 'Today_H4' not in message
+    message = expect_error("evaluate_row()", condition.evaluate_row, {'Today_H4': 1.0, 'Yest_L4': 0.0})
+    assert 'Spot_Price' in message
+
+
+def verify_scalar_matches_vectorized():
+    # Small integers so ties and zero divisors come up, plus NaN and inf
+    rng = np.random.default_rng(0)
+    rows = 2000
+    names = [f'{when}_{k}' for when in ('Today', 'Yest') for k in ('H4', 'L4', 'H3', 'L3')]
+    columns = {}
+    for name in names:
+        values = rng.integers(-3, 4, rows).astype(float)
+        values[rng.random(rows) < 0.1] = np.nan
+        values[rng.random(rows) < 0.02] = np.inf
+        values[rng.random(rows) < 0.02] = -np.inf
+        columns[name] = values
+
+    expressions = [c.expression for c in DEFAULT_CONDITIONS] + [
+        "Today_H4 <= Yest_H4 < Today_L4 != Yest_L4",
+        "Today_H4 / Yest_H4 > 1 or not Today_L4 / Yest_L4 >= -1",
+        "abs(Today_H4 - Yest_H4) == min(Today_L4, Yest_L4, 2)",
+        "max(Today_H4, Yest_H4) - -Yest_L4 * 2.5 >= +Today_L4",
+        "Today_H4 / Yest_H4",
+        "(Today_H4 > 0 and Yest_H4 > 0) or (Today_L4 < 0 and not Yest_L4 < 0)",
+        "Today_H4 > 1 and Yest_H4 > 1 and Today_L4 > 1",
+        "True and Today_H4 == 0",
+    ]
+    frame = pd.DataFrame(columns)
+    for expression in expressions:
+        condition = Condition('Rule', expression)
+        vector = condition.evaluate(columns, rows)
+        from_frame = condition.evaluate(frame, rows)
+        scalar = np.array([condition.evaluate_row({n: columns[n][i] for n in names}) for i in range(rows)])
+        mismatches = np.flatnonzero(vector != scalar)
+        print(f"{expression}: {vector.sum()} of {rows} True, {len(mismatches)} mismatch(es)")
+        assert not len(mismatches), {n: columns[n][mismatches[0]] for n in names}
+        assert (from_frame == vector).all()
+
+    # Conditions on yesterday are False where there is no yesterday
+    has_yest = rng.random(rows) < 0.5
+    flags = evaluate_conditions(DEFAULT_CONDITIONS, columns, rows, has_yest)
+    assert not any(flags[c.name][~has_yest].any() for c in DEFAULT_CONDITIONS)
+
+
+def verify_collisions():
+    print("Collisions:")
+    # Scan columns, and the columns Top N and batch/backtest runs add
+    for name in ['Spot_Close', 'Yest_H4', 'Rank', 'Value', 'Metric', 'Date', 'Prev_Date']:
+        expect_error(f"condition name {name!r}", CamarillaScanner,
+                     conditions=[Condition(name, 'Today_H4 > 1', 'Extra')])
+    expect_error("a duplicate name", CamarillaScanner, conditions=[Condition('Is_Higher_Value', 'Today_H4 > 1', 'X')])
+    expect_error("a built-in label", parse_conditions, "Narrow [narrow camarilla]: Today_H4 > 1")
+    expect_error("a repeated label", parse_conditions, "A [Wide]: Today_H4 > 1\nB [Wide]: Today_L4 > 1")
+    long = 'Camarilla range wider than yesterday'
+    expect_error("labels equal after 31 characters", parse_conditions,
+                 f"A [{long} H4]: Today_H4 > 1\nB [{long} L4]: Today_L4 > 1")
+    expect_error("a repeated label in condition_sheets", condition_sheets,
+                 DEFAULT_CONDITIONS + [Condition('Extra', 'Today_H4 > 1', 'Inside Camarilla')])
+
+    # An extra condition gets its own sheet next to Main Data and Top N
+    extra = parse_conditions("Wide_Range [Wide Range]: Today_H4 - Today_L4 > 2 * (Yest_H4 - Yest_L4)")
+    scanner = CamarillaScanner(conditions=extra)
+    rows = 8
+    df = pd.DataFrame({
+        'Symbol': [f'S{i // 2}' for i in range(rows)], 'Expiry': '2026-01-29',
+        'ATM_Strike': 100.0, 'Option_Type': ['CE', 'PE'] * (rows // 2), 'Spot_Close': 101.0,
+        **{c: np.arange(rows) for c in ['OpnIntrst', 'ChngInOpnIntrst', 'TtlTradgVol', 'TtlNbOfTxsExctd']},
+        **{c.name: np.arange(rows) % 2 == 0 for c in scanner.conditions},
+    })
+    sheets = condition_sheets(scanner.conditions)
+    payload = json.loads(build_report(df, 'json', top_n=3, sheets=sheets))
+    print(f"  report sheets: {list(payload)}")
+    assert list(payload) == ['Main Data'] + [c.label for c in scanner.conditions] + ['Top 3 Output']
+    assert len(payload['Main Data']) == rows and len(payload['Wide Range']) == rows // 2
+
+
+if __name__ == "__main__":
+    try:
+        verify_rejected_syntax()
+        verify_unknown_columns()
+        verify_scalar_matches_vectorized()
+        verify_collisions()
+        print("\nAll condition tests passed!")
+    except AssertionError as e:
+        print(f"\nTest Failed: {e}")
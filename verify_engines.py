@@ -0,0 +1,63 @@
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import synthetic
+from scanner import CamarillaScanner
+
+INDICES = 2
+
+
+def verify_engines(expiry_format):
+    folder = tempfile.mkdtemp()
+    try:
+        yest, today = synthetic.generate_days(folder, days=2, symbols=30, expiry_format=expiry_format,
+                                              indices=INDICES)
+        scanner = CamarillaScanner()
+        df_today, df_yest = scanner.load_days(today, yest)
+
+        # Stock rows: the loop reference and the vectorized engine agree
+        # exactly (the loop engine does not scan index chains)
+        diffs = scanner.diff_engines(today, yest)
+        print(f"{expiry_format}: {len(diffs)} cell(s) differ between the engines")
+        assert diffs.empty, diffs.head()
+
+        stocks = ['STF', 'STO']
+        ref = scanner.scan_frames(df_today[df_today['FinInstrmTp'].isin(stocks)],
+                                  df_yest[df_yest['FinInstrmTp'].isin(stocks)], engine='loop')
+        vec = scanner.scan_frames(df_today, df_yest)
+        indices = [name for name, _, _ in synthetic.INDEX_UNDERLYINGS[:INDICES]]
+        is_index = vec['Symbol'].isin(indices).to_numpy()
+        pd.testing.assert_frame_equal(ref, vec[~is_index].reset_index(drop=True))
+        print(f"{expiry_format}: {len(ref)} stock rows equal")
+
+        # Index rows: CE and PE on the nearest weekly expiry, at the strike
+        # nearest the index price, compared against yesterday
+        index_rows = vec[is_index]
+        assert sorted(index_rows['Symbol'].unique()) == sorted(indices)
+        opts = df_today[df_today['FinInstrmTp'] == 'IDO']
+        for symbol, rows in index_rows.groupby('Symbol'):
+            chain = opts[opts['TckrSymb'] == symbol]
+            nearest = chain[chain['XpryDt_Date'] == chain['XpryDt_Date'].min()]
+            spot = nearest['UndrlygPric'].iloc[0]
+            strikes = np.unique(scanner.strike_values(nearest['Strike_Ticks']))
+            atm = strikes[np.abs(strikes - spot).argmin()]
+            print(f"{expiry_format}: {symbol} {rows['Expiry'].iloc[0]} spot {spot} ATM {rows['ATM_Strike'].iloc[0]}")
+            assert list(rows['Option_Type']) == ['CE', 'PE']
+            assert (rows['Expiry'] == nearest['XpryDt'].iloc[0]).all()
+            assert (rows['Spot_Close'] == spot).all()
+            assert (rows['ATM_Strike'] == atm).all()
+            assert rows['Yest_H4'].notna().all()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    try:
+        for expiry_format in ['%Y-%m-%d', '%d-%b-%Y']:
+            verify_engines(expiry_format)
+        print("\nBoth engines agree!")
+    except AssertionError as e:
+        print(f"\nTest Failed: {e}")
@@ -0,0 +1,39 @@
+import shutil
+import tempfile
+
+import synthetic
+from watcher import BhavWatcher
+
+
+def verify_previous_day_reuse():
+    staging = tempfile.mkdtemp()
+    folder = tempfile.mkdtemp()
+    try:
+        paths = synthetic.generate_days(staging, days=3, symbols=20)
+
+        # Day 1 is already in the folder when the watcher starts
+        shutil.move(paths[0], folder)
+        watcher = BhavWatcher(folder, fmt='csv', cache_dir=None)
+        watcher.prime()
+        print(f"Primed: {watcher.loads} load(s)")
+        assert watcher.loads == 1
+
+        # Each new day is scanned against the frame held from the day before
+        for n, path in enumerate(paths[1:], 2):
+            path = shutil.move(path, folder)
+            loads = watcher.loads
+            output = watcher.process(path)
+            print(f"Day {n}: {watcher.loads - loads} load(s) -> {output}")
+            assert output is not None
+            assert watcher.loads - loads == 1
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    try:
+        verify_previous_day_reuse()
+        print("\nWatcher reuses the previous day's frame!")
+    except AssertionError as e:
+        print(f"\nTest Failed: {e}")
@@ -0,0 +1,250 @@
+import argparse
+import fnmatch
+import os
+import queue
+import threading
+import time
+import zipfile
+
+from scanner import CamarillaScanner
+from bhav_cache import DEFAULT_CACHE_DIR
+from batch import find_bhav_copies
+from history_store import trading_date
+from profiling import ScanProfile
+from report import FORMATS, build_report
+
+
+class BhavWatcher:
+    """
+    Watches a drop folder and scans every new bhav copy against the
+    previous trading day as soon as it has been fully written.
+
+    New files are picked up from watchdog events and only queued once
+    their size has stayed the same for `debounce` seconds and they open as
+    a ZIP, so a download or copy in progress is never read half way. The
+    work queue holds at most `queue_size` files; when it is full, stable
+    files simply wait in the pending list. One worker thread scans files
+    in arrival order.
+
+    The most recent day's parsed frame is kept in memory, so a normal
+    daily run parses only the new file. Reports are written to output_dir
+    as 'Camarilla Scanner YYYYMMDD.<ext>' in the chosen FORMATS entry.
+    """
+
+    POLL_SECONDS = 0.5
+
+    def __init__(self, folder, output_dir=None, pattern="BhavCopy*.zip", fmt='xlsx', top_n=5,
+                 debounce=2.0, queue_size=8, cache_dir=DEFAULT_CACHE_DIR):
+        self.folder = folder
+        self.output_dir = output_dir or folder
+        self.pattern = pattern
+        self.fmt = fmt
+        self.top_n = top_n
+        self.debounce = debounce
+        self.scanner = CamarillaScanner(cache_dir=cache_dir)
+
+        self._pending = {}  # path -> (size, time the size was last seen changing)
+        self._pending_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._threads = []
+        self._observer = None
+        self._latest = None  # (date, path, frame) of the newest day loaded
+        self.loads = 0  # bhav copies parsed (or read from the cache) so far
+
+    # File events
+
+    def matches(self, path):
+        return fnmatch.fnmatch(os.path.basename(path), self.pattern)
+
+    def notify(self, path):
+        """Records that path was created or changed (called from watchdog events)."""
+        if not self.matches(path):
+            return
+        with self._pending_lock:
+            self._pending[path] = (None, time.monotonic())
+
+    def _ready_files(self):
+        """Pending files whose size has not changed for `debounce` seconds."""
+        now = time.monotonic()
+        ready = []
+        with self._pending_lock:
+            for path, (size, since) in list(self._pending.items()):
+                try:
+                    current = os.path.getsize(path)
+                except OSError:
+                    # Deleted or renamed before it settled
+                    del self._pending[path]
+                    continue
+                if current != size:
+                    self._pending[path] = (current, now)
+                elif now - since >= self.debounce:
+                    ready.append(path)
+        return ready
+
+    def _debounce_loop(self):
+        while not self._stop.is_set():
+            for path in self._ready_files():
+                if not zipfile.is_zipfile(path):
+                    # Size stalled but the archive is not complete yet
+                    with self._pending_lock:
+                        self._pending[path] = (None, time.monotonic())
+                    continue
+                try:
+                    self._queue.put(path, timeout=self.POLL_SECONDS)
+                except queue.Full:
+                    print(f"Work queue full, {os.path.basename(path)} waits")
+                    continue
+                with self._pending_lock:
+                    self._pending.pop(path, None)
+            self._stop.wait(self.POLL_SECONDS)
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                path = self._queue.get(timeout=self.POLL_SECONDS)
+            except queue.Empty:
+                continue
+            try:
+                self.process(path)
+            except Exception as e:
+                print(f"Error scanning {path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    # Scanning
+
+    def _load(self, path):
+        self.loads += 1
+        return self.scanner.load_bhav_copy(path, self.scanner.SCAN_COLUMNS, self.scanner.SCAN_INSTRUMENTS)
+
+    def _previous_frame(self, day):
+        """(path, parsed frame) of the last trading day before day, or (None, None)."""
+        previous = [f for f in find_bhav_copies(self.folder, pattern=self.pattern) if f[0] < day]
+        if not previous:
+            return None, None
+        prev_day, path = previous[-1]
+        if self._latest is not None and self._latest[0] == prev_day:
+            return self._latest[1], self._latest[2]
+        return path, self._load(path)
+
+    def prime(self):
+        """Loads the newest bhav copy already in the folder as 'yesterday'."""
+        files = find_bhav_copies(self.folder, pattern=self.pattern)
+        if files:
+            day, path = files[-1]
+            df = self._load(path)
+            if df is not None:
+                self._latest = (day, path, df)
+                print(f"Holding {os.path.basename(path)} as the previous day")
+
+    def process(self, path):
+        """Scans path against the previous trading day and writes the report; returns its path."""
+        day = trading_date(path)
+        if day is None:
+            print(f"Skipping {path}: no date in file name")
+            return None
+
+        profile = ScanProfile()
+        with profile:
+            df_today = self._load(path)
+            if df_today is None:
+                return None
+
+            # Before today replaces it, _latest may hold yesterday's frame
+            yest_path, df_yest = self._previous_frame(day)
+            if self._latest is None or day >= self._latest[0]:
+                self._latest = (day, path, df_today)
+            if df_yest is None:
+                print(f"No earlier bhav copy for {os.path.basename(path)}; keeping it for the next day")
+                return None
+
+            result = self.scanner.scan_frames(df_today, df_yest)
+            if result is None or result.empty:
+                print(f"No results for {os.path.basename(path)}")
+                return None
+
+            _, ext, _, _ = FORMATS[self.fmt]
+            output = os.path.join(self.output_dir, f"Camarilla Scanner {day:%Y%m%d}.{ext}")
+            with profile.stage('report writing'):
+                data = build_report(result, self.fmt, top_n=self.top_n)
+            with open(output, 'wb') as f:
+                f.write(data)
+
+        print(f"{os.path.basename(path)} vs {os.path.basename(yest_path)}: "
+              f"{len(result)} rows -> {output} in {profile.total_seconds:.2f}s")
+        return output
+
+    # Service control
+
+    def start(self):
+        """Starts the watchdog observer and the debounce and worker threads."""
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_created(self, event):
+                if not event.is_directory:
+                    watcher.notify(event.src_path)
+
+            def on_modified(self, event):
+                if not event.is_directory:
+                    watcher.notify(event.src_path)
+
+            def on_moved(self, event):
+                if not event.is_directory:
+                    watcher.notify(event.dest_path)
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._stop.clear()
+        self.prime()
+        self._observer = Observer()
+        self._observer.schedule(Handler(), self.folder, recursive=False)
+        self._observer.start()
+        self._threads = [threading.Thread(target=self._debounce_loop, daemon=True),
+                         threading.Thread(target=self._worker_loop, daemon=True)]
+        for t in self._threads:
+            t.start()
+        print(f"Watching {self.folder} for {self.pattern}")
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan new bhav copies as they arrive in a folder.")
+    parser.add_argument("folder", help="drop folder to watch")
+    parser.add_argument("--output-dir", help="where reports are written (default: the watched folder)")
+    parser.add_argument("--format", choices=list(FORMATS), default='xlsx', help="report format")
+    parser.add_argument("--top-n", type=int, default=5, help="rows per Top N block")
+    parser.add_argument("--debounce", type=float, default=2.0,
+                        help="seconds a new file's size must stay unchanged before it is scanned")
+    parser.add_argument("--queue-size", type=int, default=8, help="files waiting to be scanned at most")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the parsed bhav copy cache")
+    args = parser.parse_args(argv)
+
+    watcher = BhavWatcher(args.folder, args.output_dir, fmt=args.format, top_n=args.top_n,
+                          debounce=args.debounce, queue_size=args.queue_size,
+                          cache_dir=None if args.no_cache else DEFAULT_CACHE_DIR)
+    watcher.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping...")
+    finally:
+        watcher.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())